@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch segmentation + 3D reconstruction over many DICOM series.
+
+Usage:
+    python batch_segment.py manifest.json --checkpoint backfill.ckpt --workers 8
+
+The manifest is either a JSON list of objects or a CSV file with a header row.
+Each entry describes one series:
+    input_folder   (required) folder with the source .dcm files
+    lower_hu       (required) lower HU threshold
+    upper_hu       (required) upper HU threshold
+    output_folder  (optional) defaults to "<input_folder>_segmented"
+    stl            (optional) STL path; when given the series is also reconstructed
+    iso_level      (optional) marching cubes level, defaults to 0.5
+
+Completed series are appended to the checkpoint file (one JSON line each), so
+an interrupted run can be restarted with the same command and will skip them.
+matplotlib is never imported.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def load_manifest(path):
+    """
+    Reads a JSON or CSV manifest into a list of normalized job dicts.
+    """
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = list(csv.DictReader(f))
+
+    jobs = []
+    for n, entry in enumerate(entries, start=1):
+        try:
+            input_folder = entry["input_folder"]
+            lower_hu = int(entry["lower_hu"])
+            upper_hu = int(entry["upper_hu"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Manifest entry {n} is missing input_folder/lower_hu/upper_hu")
+        jobs.append({
+            "input_folder": input_folder,
+            "output_folder": entry.get("output_folder") or f"{input_folder.rstrip(os.sep)}_segmented",
+            "lower_hu": lower_hu,
+            "upper_hu": upper_hu,
+            "stl": entry.get("stl") or None,
+            "iso_level": float(entry.get("iso_level") or 0.5),
+        })
+    return jobs
+
+
+def job_key(job):
+    """
+    Identifies a job in the checkpoint file: same inputs and parameters = same work.
+    """
+    return "|".join(str(job[k]) for k in ("input_folder", "output_folder", "lower_hu", "upper_hu", "stl", "iso_level"))
+
+
+def load_checkpoint(path):
+    done = set()
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    done.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    # A partially written last line from an interrupted run.
+                    continue
+    return done
+
+
+def run_job(job):
+    """
+    Segments (and optionally reconstructs) one series. Runs in a worker process.
+    """
+    from segment_and_export import process_and_save_slices
+
+    start = time.perf_counter()
+    num_slices, num_voxels = process_and_save_slices(
+        job["input_folder"], job["output_folder"], job["lower_hu"], job["upper_hu"])
+    result = {
+        "key": job_key(job),
+        "input_folder": job["input_folder"],
+        "output_folder": job["output_folder"],
+        "slices": num_slices,
+        "voxels": num_voxels,
+    }
+    if job["stl"]:
+        from generate_3d_Mesh import reconstruct_3d
+
+        stl_dir = os.path.dirname(job["stl"])
+        if stl_dir:
+            os.makedirs(stl_dir, exist_ok=True)
+        num_verts, num_faces = reconstruct_3d(job["output_folder"], iso_level=job["iso_level"], save_stl=job["stl"])
+        result.update({"stl": job["stl"], "vertices": num_verts, "faces": num_faces})
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def format_rate(count, seconds):
+    return f"{count / seconds:,.1f}" if seconds > 0 else "inf"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch bone segmentation and 3D reconstruction.")
+    parser.add_argument("manifest", help="JSON or CSV manifest of series to process")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default: <manifest>.ckpt)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of series processed in parallel")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or f"{args.manifest}.ckpt"
+    jobs = load_manifest(args.manifest)
+    done = load_checkpoint(checkpoint)
+    pending = [job for job in jobs if job_key(job) not in done]
+    print(f"{len(jobs)} series in manifest, {len(jobs) - len(pending)} already done, {len(pending)} to process")
+
+    total_slices = 0
+    total_voxels = 0
+    failures = 0
+    start = time.perf_counter()
+    with open(checkpoint, "a") as ckpt, ProcessPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        futures = {pool.submit(run_job, job): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {job['input_folder']}: {e}", file=sys.stderr)
+                continue
+            ckpt.write(json.dumps(result) + "\n")
+            ckpt.flush()
+            total_slices += result["slices"]
+            total_voxels += result["voxels"]
+            print(f"done {result['input_folder']}: {result['slices']} slices in {result['seconds']:.2f}s "
+                  f"({format_rate(result['slices'], result['seconds'])} slices/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(pending) - failures} series ({failures} failed) in {elapsed:.1f}s: "
+          f"{format_rate(total_slices, elapsed)} slices/s, {format_rate(total_voxels, elapsed)} voxels/s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Memory estimates of admission.py against measured peaks.
+
+For phantom series of several sizes it runs every segmentation and
+reconstruction mode admission.py can choose, measures each run's peak
+traced allocation (tracemalloc sees numpy's buffers) and compares it with
+the header-only estimate. Every estimate must cover the measured peak.
+It also checks that the streaming modes give the same result as the
+in-memory ones: the same threshold suggestion, and an STL with the same
+face count, area and volume.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_admission.py --sizes 32x128 64x256 128x384 --output admission.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb  # noqa: E402
+from phantoms import make_phantom_series  # noqa: E402
+
+from boneServer.admission import reconstruction_options, segmentation_options  # noqa: E402
+from boneServer.auto_threshold import suggest_for_series  # noqa: E402
+from boneServer.imaging import segment_folder  # noqa: E402
+from boneServer.reconstruction import (do_3d_reconstruction, do_per_bone_reconstruction,  # noqa: E402
+                                       do_streaming_reconstruction, parse_bone_options, parse_mesh_options)
+from boneServer.volume_cache import _load_hu_volume  # noqa: E402
+
+LOWER_HU = 300
+UPPER_HU = 2000
+MESH_CASES = {
+    "default": {},
+    "no_smoothing": {"smoothing": "none"},
+    "sdf": {"smoothing": "sdf"},
+    "surface_nets": {"algorithm": "surface_nets"},
+    "large_closing": {"closing_radius": 3.0},
+}
+MB = 1024 * 1024
+
+
+def measured_peak(fn):
+    """
+    (result, peak bytes allocated by fn above what was allocated before).
+    """
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = fn()
+    return result, tracemalloc.get_traced_memory()[1] - base
+
+
+def row(operation, case, mode, estimate, peak):
+    return {"operation": operation, "case": case, "mode": mode, "estimate_mb": round(estimate / MB, 2),
+            "measured_mb": round(peak / MB, 2), "ratio": round(estimate / max(peak, 1), 2),
+            "covered": estimate >= peak}
+
+
+def stl_summary(path):
+    import trimesh
+    mesh = trimesh.load(path)
+    return len(mesh.faces), float(mesh.area), float(mesh.volume)
+
+
+def same_mesh(a, b):
+    return a[0] == b[0] and abs(a[1] - b[1]) <= 1e-6 * abs(a[1]) and abs(a[2] - b[2]) <= 1e-6 * abs(a[2])
+
+
+def bench_size(work, slices, size, rows, mismatches):
+    series = os.path.join(work, "series")
+    make_phantom_series(series, slices=slices, rows=size, cols=size)
+    case = f"{slices}x{size}x{size}"
+
+    options = dict(segmentation_options(series, auto=True))
+    output = os.path.join(work, "output")
+    os.makedirs(output)
+    _, peak = measured_peak(lambda: segment_folder(series, output, LOWER_HU, UPPER_HU,
+                                                   source_chunks=os.path.join(work, "source.chunks")))
+    rows.append(row("segmentation", case, "streaming", dict(segmentation_options(series))["streaming"], peak))
+
+    def auto_in_memory():
+        suggestion = suggest_for_series(series)
+        segment_folder(series, os.path.join(work, "auto_in_memory"), LOWER_HU, UPPER_HU,
+                       hu_volume=_load_hu_volume(os.path.abspath(series), os.path.getmtime(series)))
+        return suggestion
+
+    def auto_streaming():
+        suggestion = suggest_for_series(series, streaming=True)
+        segment_folder(series, os.path.join(work, "auto_streaming"), LOWER_HU, UPPER_HU)
+        return suggestion
+
+    for name, run in (("in_memory", auto_in_memory), ("streaming", auto_streaming)):
+        os.makedirs(os.path.join(work, f"auto_{name}"))
+        _load_hu_volume.cache_clear()
+        suggestion, peak = measured_peak(run)
+        rows.append(row("segmentation_auto", case, name, options[name], peak))
+        if name == "in_memory":
+            expected = suggestion
+        elif suggestion != expected:
+            mismatches.append({"case": case, "check": "suggestion", "in_memory": expected, "streaming": suggestion})
+    _load_hu_volume.cache_clear()
+
+    for name, payload in MESH_CASES.items():
+        iso_level, mesh_options = parse_mesh_options(payload)
+        options = dict(reconstruction_options(output, mesh_options))
+        stl = os.path.join(work, f"{name}.stl")
+        (ok, message), peak = measured_peak(lambda: do_3d_reconstruction(output, iso_level, stl, **mesh_options))
+        if not ok:
+            mismatches.append({"case": case, "check": name, "error": message})
+            continue
+        rows.append(row("reconstruction", f"{case} {name}", "in_memory", options["in_memory"], peak))
+        if "streaming" not in options:
+            continue
+        streamed = os.path.join(work, f"{name}_streaming.stl")
+        (ok, message), peak = measured_peak(
+            lambda: do_streaming_reconstruction(output, iso_level, streamed, **mesh_options))
+        if not ok:
+            mismatches.append({"case": case, "check": f"{name} streaming", "error": message})
+            continue
+        rows.append(row("reconstruction", f"{case} {name}", "streaming", options["streaming"], peak))
+        expected, actual = stl_summary(stl), stl_summary(streamed)
+        if not same_mesh(expected, actual):
+            mismatches.append({"case": case, "check": f"{name} streaming STL", "in_memory": expected,
+                               "streaming": actual})
+
+    iso_level, mesh_options = parse_mesh_options({})
+    bone_options = parse_bone_options({"workers": 1})
+    options = dict(reconstruction_options(output, mesh_options, bone_options))
+    (ok, _), peak = measured_peak(lambda: do_per_bone_reconstruction(
+        output, iso_level, os.path.join(work, "bones.stl"), os.path.join(work, "bones"),
+        **mesh_options, **bone_options))
+    if ok:
+        rows.append(row("per_bone_reconstruction", case, "in_memory", options["in_memory"], peak))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Admission control memory estimate benchmark")
+    parser.add_argument("--sizes", nargs="+", default=["32x128", "64x256", "128x384"],
+                        help="phantom sizes as <slices>x<rows/cols>")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    rows, mismatches = [], []
+    tracemalloc.start()
+    for spec in args.sizes:
+        slices, size = (int(v) for v in spec.split("x"))
+        work = tempfile.mkdtemp(prefix="bench_admission_")
+        try:
+            bench_size(work, slices, size, rows, mismatches)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+    tracemalloc.stop()
+
+    underestimated = [r for r in rows if not r["covered"]]
+    emit({
+        "benchmark": "admission",
+        "runs": rows,
+        "underestimated": underestimated,
+        "equivalent": not mismatches,
+        "mismatches": mismatches,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0 if not mismatches and not underestimated else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
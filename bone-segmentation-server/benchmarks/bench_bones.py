@@ -0,0 +1,78 @@
+"""
+Per-bone meshing: many separate bones in one study.
+
+Places a grid of separate ellipsoidal "bones" on an anisotropic CT grid and
+times mesh_bones serially and across worker processes, next to meshing
+each bone by re-running the single-mesh pipeline on its own mask.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_bones.py --per-axis 3 --workers 4 --output bones.json
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, timed  # noqa: E402
+
+from boneServer.labeling import label_bones  # noqa: E402
+from boneServer.reconstruction import mesh_bones, mesh_from_mask  # noqa: E402
+
+SPACING = (1.0, 0.5, 0.5)
+CELL = (24, 48, 48)
+
+
+def bones_volume(per_axis):
+    """
+    per_axis³ ellipsoids, one per grid cell; returns (mask, ellipsoid count).
+    """
+    shape = tuple(c * per_axis for c in CELL)
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    mask = np.zeros(shape, dtype=bool)
+    for iz in range(per_axis):
+        for iy in range(per_axis):
+            for ix in range(per_axis):
+                centre = [(i + 0.5) * c for i, c in zip((iz, iy, ix), CELL)]
+                semi = [0.35 * c for c in CELL]
+                mask |= sum(((a - c) / s) ** 2 for a, c, s in zip((z, y, x), centre, semi)) < 1.0
+    return mask, per_axis ** 3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-bone meshing benchmark")
+    parser.add_argument("--per-axis", type=int, default=3, help="bones per axis (bones = per_axis³)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    mask, count = bones_volume(args.per_axis)
+    options = {"min_bone_voxels": 1}
+    labels, found = label_bones(mask, SPACING)
+
+    def rerun_pipeline_per_bone():
+        for bone in range(1, found + 1):
+            mesh_from_mask(labels == bone, SPACING)
+
+    emit({
+        "benchmark": "per_bone_meshing",
+        "grid": list(mask.shape),
+        "spacing_mm": SPACING,
+        "bones": count,
+        "labels_found": found,
+        "meshes": len(mesh_bones(mask, SPACING, workers=1, **options)),
+        "rerun_pipeline_per_bone": timed(rerun_pipeline_per_bone, repeat=args.repeat, warmup=0),
+        "mesh_bones_serial": timed(lambda: mesh_bones(mask, SPACING, workers=1, **options),
+                                   repeat=args.repeat, warmup=0),
+        f"mesh_bones_{args.workers}_workers": timed(lambda: mesh_bones(mask, SPACING, workers=args.workers, **options),
+                                                    repeat=args.repeat, warmup=0),
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
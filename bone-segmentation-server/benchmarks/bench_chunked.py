@@ -0,0 +1,141 @@
+"""
+Chunked volume layout (chunked_volume.py) vs. the per-slice DICOM series.
+
+Segments a phantom series with segment_folder, which also writes the
+segmented and source volumes in 64³ chunks. It first checks that both
+chunked volumes read back exactly like the decoded DICOM series, whole
+and in random sub-boxes. Then it reports the cost of also writing the
+source chunks, the storage size and the read time of non-axial access: a
+coronal plane, a 64³ ROI and the bone mask. Chunked reads are timed cold
+(empty chunk cache) and warm; the DICOM baseline decodes the series, as any
+non-axial read of it must.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_chunked.py --slices 128 --size 256 --output chunked.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, timed  # noqa: E402
+from phantoms import make_phantom_series  # noqa: E402
+
+from boneServer.chunked_volume import VOLUME_CHUNKS_DIRNAME, ChunkedVolume, _decode_chunk  # noqa: E402
+from boneServer.imaging import segment_folder  # noqa: E402
+from boneServer.volume_cache import _decode_hu_volume  # noqa: E402
+
+LOWER_HU = 300
+UPPER_HU = 2000
+
+
+def folder_bytes(folder, suffix=None):
+    total = 0
+    for root, _, files in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files
+                     if suffix is None or name.lower().endswith(suffix))
+    return total
+
+
+def cold(fn):
+    def run():
+        _decode_chunk.cache_clear()
+        fn()
+    return run
+
+
+def check_equivalence(chunked, reference, rng):
+    mismatches = []
+    if not np.array_equal(chunked.read(), reference):
+        mismatches.append({"volume": chunked.path, "box": "whole"})
+    for _ in range(50):
+        box = tuple(slice(*sorted(int(v) for v in rng.integers(0, n + 1, 2))) for n in reference.shape)
+        if not np.array_equal(chunked[box], reference[box]):
+            mismatches.append({"volume": chunked.path, "box": [[s.start, s.stop] for s in box]})
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked volume layout benchmark")
+    parser.add_argument("--slices", type=int, default=128)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_chunked_")
+    try:
+        series = os.path.join(work, "series")
+        make_phantom_series(series, slices=args.slices, rows=args.size, cols=args.size)
+
+        plain = os.path.join(work, "plain")
+        os.makedirs(plain)
+        start = time.perf_counter()
+        segment_folder(series, plain, LOWER_HU, UPPER_HU)
+        segment_ms = (time.perf_counter() - start) * 1000
+
+        output = os.path.join(work, "output")
+        source_chunks = os.path.join(work, "source.chunks")
+        os.makedirs(output)
+        start = time.perf_counter()
+        segment_folder(series, output, LOWER_HU, UPPER_HU, source_chunks=source_chunks)
+        segment_with_source_ms = (time.perf_counter() - start) * 1000
+
+        segmented = ChunkedVolume(os.path.join(output, VOLUME_CHUNKS_DIRNAME))
+        source = ChunkedVolume(source_chunks)
+        source_ref, _, _ = _decode_hu_volume(series)
+        segmented_ref, _, _ = _decode_hu_volume(output)
+        rng = np.random.default_rng(0)
+        mismatches = check_equivalence(source, source_ref, rng) + check_equivalence(segmented, segmented_ref, rng)
+
+        row = args.size // 2
+        roi = (slice(args.slices // 4, args.slices // 4 + 64), slice(row - 32, row + 32), slice(row - 32, row + 32))
+
+        def mask_from_chunks():
+            mask = np.zeros(segmented.shape, dtype=bool)
+            box = segmented.stored_box()
+            if box is not None:
+                mask[box] = segmented.read(box) != 0
+
+        results = {
+            "dicom_decode_source": timed(lambda: _decode_hu_volume(series), repeat=args.repeat),
+            "dicom_decode_segmented": timed(lambda: _decode_hu_volume(output), repeat=args.repeat),
+            "coronal_cold": timed(cold(lambda: source[:, row, :]), repeat=args.repeat),
+            "coronal_warm": timed(lambda: source[:, row, :], repeat=args.repeat),
+            "roi_64_cold": timed(cold(lambda: source[roi]), repeat=args.repeat),
+            "axial_slice_cold": timed(cold(lambda: source[args.slices // 2]), repeat=args.repeat),
+            "bone_mask_cold": timed(cold(mask_from_chunks), repeat=args.repeat),
+            "source_whole_cold": timed(cold(source.read), repeat=args.repeat),
+        }
+
+        emit({
+            "benchmark": "chunked_volume",
+            "volume_shape": list(source.shape),
+            "chunks": list(source.chunks),
+            "segment_folder_ms": round(segment_ms, 3),
+            "segment_folder_with_source_chunks_ms": round(segment_with_source_ms, 3),
+            "bytes": {
+                "source_dicom": folder_bytes(series, ".dcm"),
+                "source_chunks": folder_bytes(source_chunks),
+                "segmented_dicom": folder_bytes(output, ".dcm"),
+                "segmented_chunks": folder_bytes(segmented.path),
+            },
+            "stored_chunks": {"source": len(source._stored), "segmented": len(segmented._stored)},
+            "timings": results,
+            "equivalent": not mismatches,
+            "mismatches": mismatches[:20],
+            "peak_rss_mb": peak_rss_mb(),
+        }, args.output)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Segmented-slice write throughput: ds.save_as vs. SeriesWriter.
+
+Reads a synthetic phantom series, thresholds every slice as segment_folder
+does, then writes the whole series with each writer (datasets are already
+in memory, so only the write is timed). Every SeriesWriter file is compared
+byte-for-byte with the save_as output.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_dicom_writer.py --slices 200 --size 512 --output writer.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import pydicom
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, timed  # noqa: E402
+from phantoms import make_phantom_series  # noqa: E402
+
+from boneServer.dicom_writer import SeriesWriter  # noqa: E402
+from boneServer.imaging import convert_to_hu, hu_to_original_scale, segment_bone_hu  # noqa: E402
+
+
+def segmented_datasets(folder):
+    datasets = []
+    for name in sorted(os.listdir(folder)):
+        ds = pydicom.dcmread(os.path.join(folder, name))
+        ds.PixelData = hu_to_original_scale(segment_bone_hu(convert_to_hu(ds)), ds).tobytes()
+        datasets.append((name, ds))
+    return datasets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DICOM series writer benchmark")
+    parser.add_argument("--slices", type=int, default=128)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, reference, fast = (os.path.join(tmp, d) for d in ("source", "save_as", "series_writer"))
+        make_phantom_series(source, slices=args.slices, rows=args.size, cols=args.size)
+        os.makedirs(reference)
+        os.makedirs(fast)
+        datasets = segmented_datasets(source)
+        total_mb = sum(len(ds.PixelData) for _, ds in datasets) / 2 ** 20
+
+        def write_save_as():
+            for name, ds in datasets:
+                ds.save_as(os.path.join(reference, name))
+
+        writer = SeriesWriter()
+
+        def write_series_writer():
+            for name, ds in datasets:
+                writer.write(ds, os.path.join(fast, name))
+
+        save_as = timed(write_save_as, repeat=args.repeat)
+        series_writer = timed(write_series_writer, repeat=args.repeat)
+        identical = all(
+            open(os.path.join(reference, name), "rb").read() == open(os.path.join(fast, name), "rb").read()
+            for name, _ in datasets
+        )
+
+    emit({
+        "benchmark": "dicom_series_writer",
+        "slices": args.slices,
+        "slice_shape": [args.size, args.size],
+        "save_as": dict(save_as, slices_per_s=round(args.slices / save_as["median_ms"] * 1000, 1),
+                        mb_per_s=round(total_mb / save_as["median_ms"] * 1000, 1)),
+        "series_writer": dict(series_writer, slices_per_s=round(args.slices / series_writer["median_ms"] * 1000, 1),
+                              mb_per_s=round(total_mb / series_writer["median_ms"] * 1000, 1)),
+        "fast_writes": writer.fast_writes,
+        "fallback_writes": writer.fallback_writes,
+        "byte_identical": identical,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
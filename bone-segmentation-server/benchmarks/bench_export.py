@@ -0,0 +1,97 @@
+"""
+Streaming ZIP export: time to first byte, throughput and peak Python heap
+while streaming a synthetic study, against building the same archive in a
+BytesIO first.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_export.py --files 400 --size-kb 512 --output export.json
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb  # noqa: E402
+
+from boneServer.export import COMPRESSION, DEFLATE_LEVEL, stream_zip  # noqa: E402
+
+
+def make_files(folder, count, size):
+    # Mostly zeros with some noise, like a segmented slice.
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        data = np.zeros(size, dtype=np.uint8)
+        data[rng.integers(0, size, size // 8)] = rng.integers(0, 255, size // 8, dtype=np.uint8)
+        path = os.path.join(folder, f"slice_{i:04d}.dcm")
+        data.tofile(path)
+        paths.append((f"dicom/{os.path.basename(path)}", path))
+    return paths
+
+
+def measure(make_chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for chunk in make_chunks():
+        if first is None and chunk:
+            first = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "first_byte_ms": round(first * 1000, 2),
+        "total_ms": round(elapsed * 1000, 1),
+        "archive_mb": round(total / 2 ** 20, 1),
+        "mb_per_s": round(total / 2 ** 20 / elapsed, 1),
+        "peak_heap_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def in_memory_zip(entries, compression):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=COMPRESSION[compression],
+                         compresslevel=DEFLATE_LEVEL if compression == "deflate" else None) as archive:
+        for arcname, path in entries:
+            archive.write(path, arcname)
+    yield buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming ZIP export benchmark")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder:
+        entries = make_files(folder, args.files, args.size_kb * 1024)
+        results = {}
+        for compression in COMPRESSION:
+            results[compression] = {
+                "stream_zip": measure(lambda: stream_zip(entries, compression)),
+                "in_memory_zip": measure(lambda: in_memory_zip(entries, compression)),
+            }
+
+    emit({
+        "benchmark": "zip_export",
+        "files": args.files,
+        "study_mb": round(args.files * args.size_kb / 1024, 1),
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Marching cubes vs. Surface Nets on voxelized analytic shapes.
+
+Reports extraction time, face count (triangles; for Surface Nets also the
+quads and the triangles before flat-region decimation), sliver fraction (triangles with a minimum angle below 10 degrees)
+and deviation from the true surface, both on the raw binary mask and on
+the Gaussian-smoothed field.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_extractors.py --size 160 --output extractors.json
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_smoothing import SPACING, grid, shapes  # noqa: E402
+from common import emit, peak_rss_mb  # noqa: E402
+
+from boneServer.smoothing import smooth_mask  # noqa: E402
+from boneServer.reconstruction import SURFACE_ALGORITHMS, extract_surface  # noqa: E402
+from boneServer.surface_nets import surface_nets  # noqa: E402
+
+SLIVER_DEGREES = 10.0
+
+
+def min_angles(verts, faces):
+    tri = verts[faces]
+    angles = []
+    for i in range(3):
+        a = tri[:, (i + 1) % 3] - tri[:, i]
+        b = tri[:, (i + 2) % 3] - tri[:, i]
+        cos = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+        angles.append(np.degrees(np.arccos(np.clip(cos, -1.0, 1.0))))
+    return np.min(angles, axis=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surface extractor comparison")
+    parser.add_argument("--size", type=int, default=128, help="voxels per axis")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    _, axes = grid(args.size)
+    origin = np.array([a[0] for a in axes])
+    results = {}
+    for shape_name, (mask, distance) in shapes(args.size).items():
+        results[shape_name] = {}
+        for smoothing in ("none", "gaussian"):
+            field, level = smooth_mask(mask, SPACING, method=smoothing)
+            for algorithm in SURFACE_ALGORITHMS:
+                start = time.perf_counter()
+                verts, faces, _ = extract_surface(field, level, SPACING, algorithm=algorithm)
+                elapsed = (time.perf_counter() - start) * 1000
+                deviation = distance(np.asarray(verts) + origin)
+                entry = {
+                    "ms": round(elapsed, 2),
+                    "vertices": int(len(verts)),
+                    "triangles": int(len(faces)),
+                    "sliver_fraction": round(float((min_angles(verts, faces) < SLIVER_DEGREES).mean()), 4),
+                    "mean_deviation_mm": round(float(deviation.mean()), 4),
+                    "max_deviation_mm": round(float(deviation.max()), 4),
+                }
+                if algorithm == "surface_nets":
+                    entry["quads"] = int(len(surface_nets(field, level, SPACING, triangulate=False)[1]))
+                    start = time.perf_counter()
+                    raw_faces = surface_nets(field, level, SPACING, flat_tolerance=0)[1]
+                    entry["undecimated_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                    entry["undecimated_triangles"] = int(len(raw_faces))
+                results[shape_name][f"{algorithm}/{smoothing}"] = entry
+
+    emit({
+        "benchmark": "surface_extractors",
+        "grid": [args.size] * 3,
+        "spacing_mm": SPACING,
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
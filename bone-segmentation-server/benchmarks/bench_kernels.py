@@ -0,0 +1,74 @@
+"""
+Per-slice segmentation kernel: imaging.py reference steps vs. kernels.py
+engines (numpy, and numba when installed), timed on a stack of slices.
+That the engines are bit-for-bit identical to the reference is checked by
+boneServer/tests/test_kernels.py.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_kernels.py --slices 64 --size 512 --output kernels.json
+"""
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, timed  # noqa: E402
+
+from boneServer.imaging import convert_to_hu, hu_to_original_scale, segment_bone_hu  # noqa: E402
+from boneServer.kernels import ENGINES, segment_slice  # noqa: E402
+
+
+def reference(ds, lower, upper):
+    image_hu = convert_to_hu(ds)
+    return image_hu, hu_to_original_scale(segment_bone_hu(image_hu, lower_hu=lower, upper_hu=upper), ds)
+
+
+def random_slice(dtype, size, rng):
+    info = np.iinfo(dtype)
+    low = max(info.min, -3000)
+    return rng.integers(low, min(info.max, 5000), size=(size, size), endpoint=True).astype(dtype)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fused segmentation kernel benchmark")
+    parser.add_argument("--slices", type=int, default=64)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+
+    stack = [random_slice(np.uint16, args.size, rng) for _ in range(args.slices)]
+    slope, intercept = 1.0, -1024.0
+    datasets = [SimpleNamespace(pixel_array=p, RescaleSlope=slope, RescaleIntercept=intercept) for p in stack]
+
+    def run_reference():
+        for ds in datasets:
+            reference(ds, 300, 2000)
+
+    results = {"reference": timed(run_reference, repeat=args.repeat)}
+    for engine in ENGINES:
+        def run_engine(engine=engine):
+            for pixels in stack:
+                segment_slice(pixels, slope, intercept, 300, 2000, slope, intercept, engine=engine)
+        results[engine] = timed(run_engine, repeat=args.repeat)
+
+    base = results["reference"]["median_ms"]
+    emit({
+        "benchmark": "segmentation_kernel",
+        "slices": args.slices,
+        "slice_shape": [args.size, args.size],
+        "engines": list(ENGINES),
+        "timings": {name: dict(stats, speedup=round(base / stats["median_ms"], 2)) for name, stats in results.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Multi-planar reformat (mpr.py) on a CT-sized volume.
+
+First checks the sampler: orthogonal planes must equal the voxels they
+cross exactly, and oblique planes must match scipy's trilinear
+map_coordinates (order=1) to within rounding (1 HU). Then it times
+coronal, sagittal and oblique planes, on an in-memory volume and on the
+same volume memory-mapped from a .npy file as the shared cache serves it.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_mpr.py --slices 300 --size 512 --output mpr.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, timed  # noqa: E402
+
+from boneServer.mpr import orthogonal_plane, plane_axes, reformat, volume_center  # noqa: E402
+
+SPACING = (1.25, 0.7, 0.7)
+OBLIQUE_NORMALS = {"oblique_45": (1, 1, 0), "oblique_111": (1, 1, 1), "oblique_shallow": (0.3, 0.2, 1)}
+
+
+def check_equivalence(rng):
+    from scipy.ndimage import map_coordinates
+
+    volume = rng.integers(-1000, 2000, size=(40, 64, 48)).astype(np.int16)
+    mismatches = []
+    for plane, axis in (("axial", 0), ("coronal", 1), ("sagittal", 2)):
+        index = volume.shape[axis] // 3
+        center, normal = orthogonal_plane(plane, index, volume.shape, SPACING)
+        image, _ = reformat(volume, SPACING, center, normal, pixel_mm=min(SPACING), fill=-1024)
+        expected = np.take(volume, index, axis=axis)
+        # Rows along z are resampled from 1.25 mm to 0.7 mm: compare the
+        # pixels that fall on a slice.
+        if plane != "axial":
+            rows = np.arange(image.shape[0]) * min(SPACING) / SPACING[0]
+            on_slice = np.isclose(rows, np.round(rows))
+            image, expected = image[on_slice], expected[np.round(rows[on_slice]).astype(int)]
+        if not np.array_equal(image, expected):
+            mismatches.append({"plane": plane})
+
+    for name, normal in OBLIQUE_NORMALS.items():
+        center = volume_center(volume.shape, SPACING) + rng.normal(0, 3, 3)
+        image, geometry = reformat(volume, SPACING, center, normal, fill=-1024)
+        rows_dir, cols_dir = plane_axes(normal)
+        pixel = geometry["pixel_spacing_mm"][0]
+        r = np.arange(image.shape[0])[:, None] * pixel
+        c = np.arange(image.shape[1])[None, :] * pixel
+        origin = np.asarray(geometry["origin_mm"])
+        coords = [(origin[a] + r * rows_dir[a] + c * cols_dir[a]) / SPACING[a] for a in range(3)]
+        inside = np.all([(coords[a] >= 0) & (coords[a] <= volume.shape[a] - 1) for a in range(3)], axis=0)
+        expected = np.rint(map_coordinates(volume.astype(np.float64), coords, order=1))
+        if np.abs(image[inside] - expected[inside]).max() > 1 or np.any(image[~inside] != -1024):
+            mismatches.append({"plane": name})
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MPR resampling benchmark")
+    parser.add_argument("--slices", type=int, default=300)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    mismatches = check_equivalence(rng)
+
+    volume = rng.integers(-1000, 2000, size=(args.slices, args.size, args.size)).astype(np.int16)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "volume.npy")
+        np.save(path, volume)
+        mapped = np.load(path, mmap_mode="r")
+
+        planes = {"coronal": orthogonal_plane("coronal", args.size // 2, volume.shape, SPACING),
+                  "sagittal": orthogonal_plane("sagittal", args.size // 2, volume.shape, SPACING)}
+        center = volume_center(volume.shape, SPACING)
+        planes.update({name: (center, normal) for name, normal in OBLIQUE_NORMALS.items()})
+
+        results = {}
+        for name, (plane_center, normal) in planes.items():
+            image, _ = reformat(volume, SPACING, plane_center, normal)
+            results[name] = {
+                "image_shape": list(image.shape),
+                "in_memory": timed(lambda: reformat(volume, SPACING, plane_center, normal), repeat=args.repeat),
+                "memory_mapped": timed(lambda: reformat(mapped, SPACING, plane_center, normal), repeat=args.repeat),
+            }
+        del mapped
+
+    emit({
+        "benchmark": "mpr",
+        "volume_shape": list(volume.shape),
+        "spacing_mm": list(SPACING),
+        "timings": results,
+        "equivalent": not mismatches,
+        "mismatches": mismatches,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Benchmarks for the segmentation and reconstruction hot paths on a synthetic
+phantom series.
+
+Times the per-slice kernels (convert_to_hu, segment_bone_hu,
+hu_to_original_scale), the segment-images view end to end,
+do_3d_reconstruction, and the slice-serving endpoints, and records peak RSS.
+Results are JSON so runs on different deployments can be compared.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_pipeline.py --slices 64 --size 256 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb, physician_headers, setup_django, timed  # noqa: E402
+from phantoms import make_phantom_series  # noqa: E402
+
+LOWER_HU = 300
+UPPER_HU = 2000
+
+
+def bench_kernels(folder, repeat):
+    import pydicom
+    from boneServer.imaging import convert_to_hu, hu_to_original_scale, segment_bone_hu
+
+    files = sorted(os.listdir(folder))
+    ds = pydicom.dcmread(os.path.join(folder, files[len(files) // 2]))
+    ds.pixel_array  # decode once so the kernels are timed, not pydicom
+    image_hu = convert_to_hu(ds)
+    segmented = segment_bone_hu(image_hu, LOWER_HU, UPPER_HU)
+    return {
+        "convert_to_hu": timed(lambda: convert_to_hu(ds), repeat=repeat),
+        "segment_bone_hu": timed(lambda: segment_bone_hu(image_hu, LOWER_HU, UPPER_HU), repeat=repeat),
+        "hu_to_original_scale": timed(lambda: hu_to_original_scale(segmented, ds), repeat=repeat),
+    }
+
+
+def bench_views(client, headers, folder, media_root, repeat):
+    results = {}
+    payload = json.dumps({
+        "folder_path": folder,
+        "lower_threshold": LOWER_HU,
+        "upper_threshold": UPPER_HU,
+        "patient_email": "phantom@example.com",
+    })
+
+    start = time.perf_counter()
+    response = client.post("/segment-images/", payload, content_type="application/json", **headers)
+    results["segment_images"] = {"ms": round((time.perf_counter() - start) * 1000, 3),
+                                 "status": response.status_code}
+    seg_id = response.json()["segmentation_id"]
+
+    from boneServer.models import SegmentationRecord
+    from boneServer.reconstruction import do_3d_reconstruction
+
+    output_folder = SegmentationRecord.objects.get(id=seg_id).output_folder_path
+    stl_path = os.path.join(media_root, "bench.stl")
+    start = time.perf_counter()
+    ok, msg = do_3d_reconstruction(output_folder, 0.5, stl_path)
+    results["do_3d_reconstruction"] = {"ms": round((time.perf_counter() - start) * 1000, 3),
+                                       "ok": ok, "message": msg}
+
+    files = client.get(f"/get-dicom-files/{seg_id}/", **headers).json()["dicom_files"]
+    filename = sorted(files)[len(files) // 2]
+
+    def fetch(url, **params):
+        def run():
+            response = client.get(url, params, **headers)
+            # Drain streaming responses so file reads are included.
+            b"".join(response) if response.streaming else response.content
+        return run
+
+    results["get_dicom_files"] = timed(fetch(f"/get-dicom-files/{seg_id}/"), repeat=repeat)
+    results["serve_dicom_file"] = timed(fetch(f"/dicoms/{seg_id}/{filename}/"), repeat=repeat)
+    results["wado_rs_frame"] = timed(fetch(f"/dicoms/{seg_id}/{filename}/frames/1/"), repeat=repeat)
+    results["threshold_stats"] = timed(
+        fetch(f"/threshold-stats/{seg_id}/", lower_threshold=LOWER_HU, upper_threshold=UPPER_HU), repeat=repeat)
+    results["preview_slice"] = timed(
+        fetch(f"/preview-slice/{seg_id}/", slice_index=len(files) // 2,
+              lower_threshold=LOWER_HU, upper_threshold=UPPER_HU), repeat=repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Segmentation/reconstruction hot-path benchmarks")
+    parser.add_argument("--slices", type=int, default=64)
+    parser.add_argument("--size", type=int, default=256, help="rows and columns per slice")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary phantom/output files")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bonebench_")
+    try:
+        folder = os.path.join(workdir, "phantom")
+        media_root = os.path.join(workdir, "media")
+        os.makedirs(media_root)
+        start = time.perf_counter()
+        make_phantom_series(folder, slices=args.slices, rows=args.size, cols=args.size)
+        phantom_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        client = setup_django(media_root)
+        headers = physician_headers(client)
+
+        result = {
+            "benchmark": "pipeline",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "phantom": {"slices": args.slices, "rows": args.size, "cols": args.size,
+                        "write_ms": phantom_ms},
+            "kernels": bench_kernels(folder, args.repeat),
+            "views": bench_views(client, headers, folder, media_root, args.repeat),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    emit(result, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
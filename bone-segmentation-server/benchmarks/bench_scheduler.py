@@ -0,0 +1,160 @@
+"""
+Interactive latency under batch load, with and without scheduler.py.
+
+Several threads segment a phantom series over and over (batch work) while
+one thread renders coronal MPR planes with a short pause between requests
+(interactive work). The interactive latency (median, p99) is measured
+when idle, under unscheduled batch load and under scheduled load
+(batch tasks in BATCH slots, yielding at their per-slice checkpoints),
+together with the batch throughput in each case. The segmented output
+must be identical whether or not its task yielded.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_scheduler.py --slices 96 --size 256 --batch-threads 4 --output scheduler.json
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb  # noqa: E402
+from phantoms import make_phantom_series  # noqa: E402
+
+from boneServer import scheduler  # noqa: E402
+from boneServer.imaging import segment_folder  # noqa: E402
+from boneServer.mpr import orthogonal_plane, reformat  # noqa: E402
+from boneServer.volume_cache import _decode_hu_volume  # noqa: E402
+
+LOWER_HU = 300
+UPPER_HU = 2000
+
+
+def latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "median_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def run(series, work, volume, spacing, batch_threads, duration, think_ms, sched):
+    scheduler._scheduler = sched
+    stop = threading.Event()
+    completed = []
+
+    def task(priority, user):
+        return sched.task(priority, user) if sched is not None else nullcontext()
+
+    def batch(worker):
+        runs = 0
+        while not stop.is_set():
+            output = os.path.join(work, f"batch_{worker}_{runs}")
+            os.makedirs(output)
+            with task(scheduler.BATCH, f"physician_{worker}"):
+                segment_folder(series, output, LOWER_HU, UPPER_HU)
+            shutil.rmtree(output)
+            runs += 1
+        completed.append(runs)
+
+    threads = [threading.Thread(target=batch, args=(i,)) for i in range(batch_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2 if batch_threads else 0)
+
+    latencies = []
+    row = volume.shape[1] // 2
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with task(scheduler.INTERACTIVE, "viewer"):
+            center, normal = orthogonal_plane("coronal", row, volume.shape, spacing)
+            reformat(volume, spacing, center, normal)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(think_ms / 1000)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    scheduler._scheduler = None
+    result = {"interactive": latency_stats(latencies),
+              "batch_segmentations_per_s": round(sum(completed) / duration, 3)}
+    if sched is not None:
+        result["scheduler"] = sched.stats()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scheduler interactive latency benchmark")
+    parser.add_argument("--slices", type=int, default=96)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--batch-threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--think-ms", type=float, default=50.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_scheduler_")
+    try:
+        series = os.path.join(work, "series")
+        make_phantom_series(series, slices=args.slices, rows=args.size, cols=args.size)
+        volume, _, spacing = _decode_hu_volume(series)
+
+        # Equivalence: a batch task that yields at every checkpoint writes the same output.
+        plain = os.path.join(work, "plain")
+        yielded = os.path.join(work, "yielded")
+        os.makedirs(plain)
+        os.makedirs(yielded)
+        segment_folder(series, plain, LOWER_HU, UPPER_HU)
+        sched = scheduler.Scheduler(max_yield_ms=1)
+        scheduler._scheduler = sched
+
+        def segment_yielding():
+            with sched.task(scheduler.BATCH, "physician"):
+                segment_folder(series, yielded, LOWER_HU, UPPER_HU)
+
+        # An interactive task stays open, so every checkpoint yields.
+        with sched.task(scheduler.INTERACTIVE, "viewer"):
+            worker = threading.Thread(target=segment_yielding)
+            worker.start()
+            worker.join()
+        scheduler._scheduler = None
+        equivalent = np.array_equal(_decode_hu_volume(plain)[0], _decode_hu_volume(yielded)[0])
+        shutil.rmtree(plain)
+        shutil.rmtree(yielded)
+
+        common = dict(series=series, work=work, volume=volume, spacing=spacing,
+                      duration=args.duration, think_ms=args.think_ms)
+        results = {
+            "idle": run(batch_threads=0, sched=None, **common),
+            "unscheduled": run(batch_threads=args.batch_threads, sched=None, **common),
+            "scheduled": run(batch_threads=args.batch_threads, sched=scheduler.Scheduler(), **common),
+        }
+
+        emit({
+            "benchmark": "scheduler",
+            "volume_shape": list(volume.shape),
+            "batch_threads": args.batch_threads,
+            "duration_s": args.duration,
+            "results": results,
+            "equivalent": bool(equivalent),
+            "yields_in_equivalence_run": sched.stats()[scheduler.BATCH]["yields"],
+            "peak_rss_mb": peak_rss_mb(),
+        }, args.output)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return 0 if equivalent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
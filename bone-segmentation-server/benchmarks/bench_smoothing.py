@@ -0,0 +1,103 @@
+"""
+Surface quality vs. wall time for the reconstruction smoothing options.
+
+Voxelizes analytic shapes (a sphere and an ellipsoid) on an anisotropic CT
+grid, reconstructs them with each smoothing configuration and measures the
+distance of every mesh vertex from the true surface. The legacy path is the
+old default: raw 0/1 marching cubes + 10 Taubin passes.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/bench_smoothing.py --size 160 --output smoothing.json
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import emit, peak_rss_mb  # noqa: E402
+from boneServer.reconstruction import mesh_from_mask  # noqa: E402
+
+SPACING = (1.0, 0.5, 0.5)
+
+# Mask cleanup is switched off so only the smoothing differs between configs.
+NO_CLEANUP = {"closing_radius": 0, "fill_holes": False, "min_speck_voxels": 0}
+
+CONFIGS = {
+    "legacy_none_taubin10": {"smoothing": "none", "taubin_iterations": 10, **NO_CLEANUP},
+    "none": {"smoothing": "none", "taubin_iterations": 0, **NO_CLEANUP},
+    "gaussian": {"smoothing": "gaussian", "taubin_iterations": 0, **NO_CLEANUP},
+    "sdf": {"smoothing": "sdf", "taubin_iterations": 0, **NO_CLEANUP},
+    "gaussian_taubin3": {"smoothing": "gaussian", "taubin_iterations": 3, **NO_CLEANUP},
+}
+
+
+def grid(size):
+    """
+    Physical voxel-centre coordinates (mm) of a size³-voxel grid, centred at 0.
+    """
+    axes = [(np.arange(size, dtype=np.float32) - (size - 1) / 2.0) * s for s in SPACING]
+    return np.meshgrid(*axes, indexing="ij", sparse=True), axes
+
+
+def shapes(size):
+    (z, y, x), _ = grid(size)
+    extent = size * min(SPACING)
+    radius = 0.3 * extent
+    semi = np.array([0.35, 0.25, 0.15]) * extent
+
+    def sphere_distance(v):
+        return np.abs(np.linalg.norm(v, axis=1) - radius)
+
+    def ellipsoid_distance(v):
+        # First-order distance to the level set f(v) = 1.
+        f = ((v / semi) ** 2).sum(axis=1)
+        grad = 2.0 * np.linalg.norm(v / semi ** 2, axis=1)
+        return np.abs(f - 1.0) / np.maximum(grad, 1e-9)
+
+    return {
+        "sphere": (z ** 2 + y ** 2 + x ** 2 < radius ** 2, sphere_distance),
+        "ellipsoid": ((z / semi[0]) ** 2 + (y / semi[1]) ** 2 + (x / semi[2]) ** 2 < 1.0, ellipsoid_distance),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruction smoothing quality/time benchmark")
+    parser.add_argument("--size", type=int, default=128, help="voxels per axis")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    _, axes = grid(args.size)
+    origin = np.array([a[0] for a in axes])
+    results = {}
+    for shape_name, (mask, distance) in shapes(args.size).items():
+        results[shape_name] = {}
+        for config_name, config in CONFIGS.items():
+            start = time.perf_counter()
+            mesh = mesh_from_mask(mask, SPACING, **config)
+            elapsed = (time.perf_counter() - start) * 1000
+            deviation = distance(np.asarray(mesh.vertices) + origin)
+            results[shape_name][config_name] = {
+                "ms": round(elapsed, 2),
+                "vertices": int(len(mesh.vertices)),
+                "faces": int(len(mesh.faces)),
+                "mean_deviation_mm": round(float(deviation.mean()), 4),
+                "p95_deviation_mm": round(float(np.percentile(deviation, 95)), 4),
+                "max_deviation_mm": round(float(deviation.max()), 4),
+            }
+
+    emit({
+        "benchmark": "reconstruction_smoothing",
+        "grid": [args.size] * 3,
+        "spacing_mm": SPACING,
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Shared helpers for the benchmark scripts: timing, peak RSS and an isolated
+Django environment (in-memory test database, temporary MEDIA_ROOT).
+"""
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "boneServer")
+# Make `import boneServer...` work for every benchmark script.
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+
+def timed(fn, repeat=5, warmup=1):
+    """
+    Runs fn() warmup + repeat times and returns timing stats in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far (MB).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def setup_django(media_root):
+    """
+    Boots Django against an in-memory test database with MEDIA_ROOT pointed
+    at 'media_root'. Returns a test Client.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "boneServer.settings")
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    settings.MEDIA_ROOT = media_root
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    return Client()
+
+
+def physician_headers(client, username="bench_physician", password="bench-password"):
+    """
+    Creates a physician account and returns request kwargs carrying its JWT.
+    """
+    from django.contrib.auth.models import User
+    from boneServer.models import UserProfile
+
+    if not User.objects.filter(username=username).exists():
+        user = User.objects.create_user(username=username, password=password)
+        UserProfile.objects.create(user=user, role="physician")
+    response = client.post("/login/", json.dumps({"username": username, "password": password}),
+                           content_type="application/json")
+    return {"HTTP_AUTHORIZATION": f"Bearer {response.json()['access_token']}"}
+
+
+def emit(result, output=None):
+    """
+    Writes the JSON result to 'output' (or stdout).
+    """
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,97 @@
+"""
+Worker cold-start import benchmark.
+
+Boots Django and imports the URLconf (what a gunicorn/uvicorn worker does
+before serving its first request) in a fresh interpreter under
+`python -X importtime`, then reports total import time, the slowest
+imports and whether any scientific-stack module got loaded.
+
+Usage (from bone-segmentation-server/):
+    python benchmarks/importtime.py --runs 5 --output importtime.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "boneServer")
+
+# Modules that must not be imported by a worker that has not served an imaging request yet.
+HEAVY_MODULES = ("numpy", "cv2", "pydicom", "scipy", "skimage", "trimesh", "matplotlib")
+
+COLD_START_SNIPPET = (
+    "import django; django.setup(); "
+    "import boneServer.urls, boneServer.wsgi"
+)
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into {module: (self_us, cumulative_us, depth)}.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run_once(snippet):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="boneServer.settings", PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return parse_importtime(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports (first two nesting levels) to report")
+    parser.add_argument("--output", default=None, help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    totals = []
+    modules = {}
+    for _ in range(max(args.runs, 1)):
+        modules = run_once(COLD_START_SNIPPET)
+        totals.append(sum(self_us for self_us, _, _ in modules.values()))
+
+    slowest = sorted(
+        ((name, cum) for name, (_, cum, depth) in modules.items() if depth <= 1),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    heavy_loaded = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+
+    result = {
+        "benchmark": "worker_cold_start_imports",
+        "python": sys.version.split()[0],
+        "runs": len(totals),
+        "total_import_ms": {
+            "median": round(statistics.median(totals) / 1000, 2),
+            "min": round(min(totals) / 1000, 2),
+            "max": round(max(totals) / 1000, 2),
+        },
+        "modules_imported": len(modules),
+        "heavy_modules_loaded": heavy_loaded,
+        "slowest_imports_ms": {name: round(cum / 1000, 2) for name, cum in slowest},
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if heavy_loaded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
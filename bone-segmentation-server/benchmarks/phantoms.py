@@ -0,0 +1,119 @@
+"""
+Synthetic CT phantoms for benchmarks (no patient data).
+
+A phantom is a soft-tissue ellipse in air holding two long-bone cylinders
+(cortical shell around a marrow core) and an ellipsoidal "tarsal" bone, with
+Gaussian noise on top. It can be written as a regular single-frame CT
+DICOM series so the server code reads it exactly like a real study.
+"""
+import os
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+AIR_HU = -1000
+SOFT_TISSUE_HU = 40
+MARROW_HU = 350
+CORTICAL_HU = 1500
+TARSAL_HU = 800
+
+
+def phantom_volume(slices=64, rows=256, cols=256, noise_hu=20.0, seed=0):
+    """
+    Returns an int16 HU volume (slices, rows, cols).
+    """
+    z = np.arange(slices, dtype=np.float32)[:, None, None] / max(slices - 1, 1)
+    y = np.arange(rows, dtype=np.float32)[None, :, None] / max(rows - 1, 1)
+    x = np.arange(cols, dtype=np.float32)[None, None, :] / max(cols - 1, 1)
+
+    volume = np.full((slices, rows, cols), AIR_HU, dtype=np.float32)
+    body = ((y - 0.5) / 0.45) ** 2 + ((x - 0.5) / 0.42) ** 2 < 1.0
+    volume[np.broadcast_to(body, volume.shape)] = SOFT_TISSUE_HU
+
+    # Two cylinders along z (tibia/fibula-like), spanning most of the stack.
+    in_z = (z > 0.05) & (z < 0.95)
+    for cy, cx, radius in ((0.42, 0.40, 0.12), (0.45, 0.68, 0.06)):
+        r2 = (y - cy) ** 2 + (x - cx) ** 2
+        volume[np.broadcast_to((r2 < radius ** 2) & in_z, volume.shape)] = CORTICAL_HU
+        volume[np.broadcast_to((r2 < (radius * 0.6) ** 2) & in_z, volume.shape)] = MARROW_HU
+
+    # An ellipsoid below the cylinders, separated from them by soft tissue.
+    tarsal = ((z - 0.5) / 0.3) ** 2 + ((y - 0.72) / 0.1) ** 2 + ((x - 0.5) / 0.2) ** 2 < 1.0
+    volume[tarsal] = TARSAL_HU
+
+    if noise_hu:
+        rng = np.random.default_rng(seed)
+        volume += rng.normal(0.0, noise_hu, size=volume.shape).astype(np.float32)
+    return np.clip(volume, -1024, 3071).astype(np.int16)
+
+
+def write_dicom_series(folder, volume_hu, spacing=(1.0, 0.5, 0.5),
+                       rescale_intercept=0.0, rescale_slope=1.0):
+    """
+    Writes 'volume_hu' as one CT DICOM file per slice with the given rescale.
+    Stored values are signed 16-bit when the rescale can produce negative
+    values (the default intercept of 0), unsigned otherwise.
+    Returns the list of written paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    dz, dy, dx = spacing
+    study_uid, series_uid, frame_uid = generate_uid(), generate_uid(), generate_uid()
+    stored = np.round((volume_hu.astype(np.float64) - rescale_intercept) / rescale_slope)
+    signed = bool(stored.min() < 0)
+    if signed:
+        stored = np.clip(stored, -32768, 32767).astype(np.int16)
+    else:
+        stored = np.clip(stored, 0, 65535).astype(np.uint16)
+
+    paths = []
+    for i in range(volume_hu.shape[0]):
+        sop_uid = generate_uid()
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = sop_uid
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = sop_uid
+        ds.Modality = "CT"
+        ds.PatientName = "PHANTOM^SYNTHETIC"
+        ds.PatientID = "PHANTOM"
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.FrameOfReferenceUID = frame_uid
+        ds.SeriesDescription = "Synthetic bone phantom"
+        ds.ImageType = ["ORIGINAL", "PRIMARY", "AXIAL"]
+        ds.InstanceNumber = i + 1
+        ds.ImagePositionPatient = [0.0, 0.0, round(i * dz, 4)]
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.SliceLocation = round(i * dz, 4)
+        ds.SliceThickness = dz
+        ds.PixelSpacing = [dy, dx]
+        ds.Rows, ds.Columns = volume_hu.shape[1], volume_hu.shape[2]
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1 if signed else 0
+        ds.RescaleIntercept = rescale_intercept
+        ds.RescaleSlope = rescale_slope
+        ds.PixelData = stored[i].tobytes()
+
+        path = os.path.join(folder, f"phantom_{i + 1:04d}.dcm")
+        ds.save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def make_phantom_series(folder, slices=64, rows=256, cols=256, spacing=(1.0, 0.5, 0.5), seed=0):
+    """
+    Generates a phantom and writes it to 'folder'. Returns the HU volume.
+    """
+    volume = phantom_volume(slices, rows, cols, seed=seed)
+    write_dicom_series(folder, volume, spacing=spacing)
+    return volume
@@ -0,0 +1,177 @@
+"""
+Memory admission control for segmentation and reconstruction requests.
+
+Peak memory is estimated from headers only, before any pixel is decoded:
+- segmentation: Rows, Columns, BitsAllocated and the slice count of the
+  source series (one DICOM header read). segment_folder holds one decoded
+  slice and a slab of chunk-writer buffers on top of a fixed base; auto
+  thresholds add the decoded volume they are computed from and the
+  Otsu search, whose size does not depend on the series.
+- reconstruction: the segmented volume's chunk metadata (shape, spacing
+  and the bounding box of the chunks holding bone), or one DICOM header
+  when it has none. The mask, cleanup and smoothing scale with the bone
+  box's voxels; the mesh with its surface.
+
+Each request gets its estimates as (mode, bytes) options, preferred first:
+- segmentation: "in_memory" (auto thresholds from the cached decoded
+  volume, which segmenting then reuses), then "streaming" (a histogram
+  pass slice by slice, see auto_threshold.series_histogram). Without auto
+  thresholds segmentation only streams.
+- reconstruction: "in_memory" (mesh_from_mask), then "streaming"
+  (do_streaming_reconstruction) when streaming_supported() the options.
+  Per-bone reconstruction has only "in_memory".
+The scheduler (scheduler.py) admits the first option that fits the free
+part of MEMORY_BUDGET_MB, queues the request while none does, and rejects
+it when even the smallest exceeds the whole budget.
+
+The budget covers the requests' working memory only. Decoded volumes that
+stay cached between requests are not counted: the shared cache
+(SHARED_VOLUME_CACHE_BYTES, host-wide) or, with it off, the last
+volume_cache.HU_VOLUME_CACHE_SIZE volumes of each process. Budget the
+host's memory for those on top of MEMORY_BUDGET_MB.
+
+The fixed, per-voxel and per-face costs were measured with tracemalloc
+(benchmarks/bench_admission.py) and rounded up.
+"""
+import os
+from math import ceil, prod
+
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+from .chunked_volume import CHUNK_SHAPE, VOLUME_CHUNKS_DIRNAME, open_chunked_volume
+from .histograms import get_voxel_spacing
+
+IN_MEMORY = "in_memory"
+STREAMING = "streaming"
+
+# Segmentation: a fixed base (headers, histogram arrays; 1.5 MB measured on
+# 32x32 slices), one slice through decode, HU conversion (float64), threshold
+# and histogram, plus int16 chunk-writer slabs (segmented and source volume).
+SEGMENTATION_BASE_BYTES = 2 * 1024 ** 2
+SLICE_BYTES_PER_PIXEL = 96
+HU_BYTES = 2
+CHUNK_WRITERS = 2
+# Auto thresholds from the decoded volume: the int16 volume plus the intp
+# temporaries of one histogram slab (auto_threshold.SLAB_SLICES slices).
+HISTOGRAM_SLAB_BYTES_PER_PIXEL = 16 * 8
+# Auto thresholds, streaming or not: the pair matrices of multi_otsu over at
+# most ~1280 coarse bins (50 MB measured over the full HU range).
+OTSU_BYTES = 56 * 1024 ** 2
+
+# Reconstruction: a fixed base (structuring elements, per-slab buffers; up to
+# 1.4 MB measured on 32x32 slices), then per voxel of the padded bone box.
+RECONSTRUCTION_BASE_BYTES = 2 * 1024 ** 2
+MASK_LOAD_BYTES_PER_VOXEL = 3
+CLEANUP_BYTES_PER_VOXEL = 10
+# Closing/opening through distance transforms (large balls, see morphology.py).
+EDT_CLEANUP_BYTES_PER_VOXEL = 40
+LABEL_BYTES_PER_VOXEL = 12
+SPLIT_TOUCHING_BYTES_PER_VOXEL = 40
+FIELD_BYTES_PER_VOXEL = {"gaussian": 8, "none": 4, "sdf": 48}
+EXTRACT_BYTES_PER_VOXEL = {"marching_cubes": 3, "surface_nets": 32}
+# Mesh faces per voxel face of the bone box's outer surface (twice what the
+# phantoms give, for real anatomy), and bytes per face: trimesh with its
+# component split, trimesh per bone (no split), or the streaming arrays.
+MESH_FACES_PER_BOX_FACE = 2
+MESH_BYTES_PER_FACE = 700
+BONE_MESH_BYTES_PER_FACE = 350
+STREAMING_BYTES_PER_FACE = 160
+
+
+def series_geometry(folder_path):
+    """
+    {"slices", "rows", "cols", "bytes_per_pixel", "spacing"} of a series
+    folder, from the header of one of its files. Raises ValueError when
+    that file is not a DICOM image (e.g. a structured report).
+    """
+    files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".dcm"))
+    if not files:
+        raise FileNotFoundError(f"No DICOM files found in {folder_path}")
+    try:
+        ds = pydicom.dcmread(os.path.join(folder_path, files[0]), stop_before_pixels=True)
+        rows, cols = int(ds.Rows), int(ds.Columns)
+    except (InvalidDicomError, AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"{files[0]} is not a DICOM image: {e}") from e
+    frames = int(getattr(ds, "NumberOfFrames", 1) or 1)
+    return {
+        "slices": len(files) * frames,
+        "rows": rows,
+        "cols": cols,
+        "bytes_per_pixel": ceil(int(getattr(ds, "BitsAllocated", 16)) / 8) * int(getattr(ds, "SamplesPerPixel", 1)),
+        "spacing": get_voxel_spacing(ds),
+    }
+
+
+def segmentation_options(folder_path, auto=False):
+    """
+    [(mode, estimated peak bytes)] for segmenting the series in 'folder_path'.
+    """
+    geometry = series_geometry(folder_path)
+    pixels = geometry["rows"] * geometry["cols"]
+    streaming = (SEGMENTATION_BASE_BYTES + pixels * (SLICE_BYTES_PER_PIXEL + geometry["bytes_per_pixel"])
+                 + CHUNK_SHAPE[0] * pixels * HU_BYTES * CHUNK_WRITERS)
+    if not auto:
+        return [(STREAMING, streaming)]
+    streaming += OTSU_BYTES
+    volume = geometry["slices"] * pixels * HU_BYTES + pixels * HISTOGRAM_SLAB_BYTES_PER_PIXEL
+    return [(IN_MEMORY, streaming + volume), (STREAMING, streaming)]
+
+
+def _cleanup_bytes_per_voxel(spacing, closing_radius, opening_radius):
+    from .morphology import MAX_STRUCTURE_VOXELS, ball
+
+    for radius in (closing_radius, opening_radius):
+        if radius > 0 and ball(radius, spacing).sum() > MAX_STRUCTURE_VOXELS:
+            return EDT_CLEANUP_BYTES_PER_VOXEL
+    return CLEANUP_BYTES_PER_VOXEL
+
+
+def reconstruction_options(folder_path, mesh_options, bone_options=None):
+    """
+    [(mode, estimated peak bytes)] for reconstructing the segmentation in
+    'folder_path' with parse_mesh_options() options (and, per bone, the
+    parse_bone_options() ones).
+    """
+    from .reconstruction import STREAM_SLAB_SLICES, crop_padding, streaming_supported
+
+    chunked = open_chunked_volume(os.path.join(folder_path, VOLUME_CHUNKS_DIRNAME))
+    if chunked is not None:
+        shape, spacing, stored = chunked.shape, chunked.spacing, chunked.stored_box()
+    else:
+        geometry = series_geometry(folder_path)
+        shape, spacing = (geometry["slices"], geometry["rows"], geometry["cols"]), geometry["spacing"]
+        stored = tuple(slice(0, n) for n in shape)
+    full_mask = RECONSTRUCTION_BASE_BYTES + prod(shape)
+    if stored is None:
+        return [(IN_MEMORY, full_mask)]
+
+    padding = crop_padding(spacing, mesh_options["smoothing"], mesh_options["smoothing_sigma"])
+    box = [min(s.stop + p, n) - max(s.start - p, 0) for s, p, n in zip(stored, padding, shape)]
+    voxels = prod(box)
+    faces = MESH_FACES_PER_BOX_FACE * 2 * (box[0] * box[1] + box[1] * box[2] + box[0] * box[2])
+    cleanup = _cleanup_bytes_per_voxel(spacing, mesh_options["closing_radius"], mesh_options["opening_radius"])
+    surface = (FIELD_BYTES_PER_VOXEL[mesh_options["smoothing"]]
+               + EXTRACT_BYTES_PER_VOXEL[mesh_options["algorithm"]])
+
+    if bone_options is not None:
+        labels = LABEL_BYTES_PER_VOXEL + (SPLIT_TOUCHING_BYTES_PER_VOXEL if bone_options["separate_touching"] else 0)
+        per_voxel = max(MASK_LOAD_BYTES_PER_VOXEL, cleanup + labels, labels + surface)
+        return [(IN_MEMORY, full_mask + voxels * per_voxel + faces * BONE_MESH_BYTES_PER_FACE)]
+
+    options = [(IN_MEMORY, full_mask + voxels * max(MASK_LOAD_BYTES_PER_VOXEL, cleanup, 1 + surface)
+                + faces * MESH_BYTES_PER_FACE)]
+    if streaming_supported(**mesh_options):
+        slab = voxels * min(STREAM_SLAB_SLICES + 1 + 2 * padding[0], box[0]) // box[0]
+        options.append((STREAMING, RECONSTRUCTION_BASE_BYTES
+                        + max(voxels * max(MASK_LOAD_BYTES_PER_VOXEL, cleanup), voxels + slab * surface)
+                        + faces * STREAMING_BYTES_PER_FACE))
+    return options
+
+
+def describe(choice):
+    """
+    The admitted option as reported in responses.
+    """
+    mode, needed = choice
+    return {"mode": mode, "estimated_peak_mb": round(needed / (1024 * 1024), 1)}
@@ -0,0 +1,251 @@
+"""
+Content-addressed store for source slices and segmentation outputs.
+
+Layout under MEDIA_ROOT/artifacts/:
+- objects/<sha256[:2]>/<sha256>: one copy of every stored file, named by
+  the SHA-256 of its bytes
+- segmentations/<key>/: the output of one segmentation. Its .dcm files are
+  hardlinks to objects; the folder also holds the histograms, the chunked
+  segmented volume (volume.chunks/), the preview thumbnails (thumbnails/)
+  and manifest.json.
+- volumes/<source hash>/: the chunked HU volume of a source series (see
+  chunked_volume.py), written by its first whole-series segmentation and
+  shared by every later one.
+
+A segmentation's key is the SHA-256 of the source series content (the same
+hash as DicomUpload.content_hash), the thresholds, the ROI and
+SEGMENTATION_VERSION. Segmenting the same data with the same parameters
+again returns the existing folder without reading a single slice, whatever
+folder or upload the data came from. Records with the same key share the
+folder (SegmentationRecord.content_key).
+
+Identical slices of different segmentations (e.g. slices with no bone in
+either threshold range), and identical uploaded files, are stored once as
+hardlinks to the same object. An object whose link count drops to 1 is
+referenced by nothing but the store and is removed with the last folder
+using it. Where hardlinks are not possible (another filesystem), files are
+kept as private copies.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+from . import metrics
+
+STORE_SUBDIR = "artifacts"
+MANIFEST_FILENAME = "manifest.json"
+# Part of every segmentation key: bump it when segment_folder's output changes.
+SEGMENTATION_VERSION = 3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def store_root():
+    return os.path.join(settings.MEDIA_ROOT, STORE_SUBDIR)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def combined_hash(file_hashes):
+    """
+    Hash of a set of files: SHA-256 of their sorted SHA-256s (as in uploads.py).
+    """
+    digest = hashlib.sha256()
+    for file_hash in sorted(file_hashes):
+        digest.update(file_hash.encode())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=64)
+def _folder_hash(folder_path, signature):
+    return combined_hash(file_sha256(os.path.join(folder_path, name)) for name, _, _ in signature)
+
+
+def source_content_hash(folder_path):
+    """
+    Content hash of the .dcm files in 'folder_path'. Uploaded folders have it
+    in their series index; other folders are hashed, and the result is
+    cached per process until a file's size or mtime changes.
+    """
+    from .series_index import INDEX_FILENAME
+    try:
+        with open(os.path.join(folder_path, INDEX_FILENAME)) as f:
+            content_hash = json.load(f).get("content_hash")
+        if content_hash:
+            return content_hash
+    except (OSError, ValueError):
+        pass
+    signature = []
+    for entry in sorted(os.scandir(folder_path), key=lambda e: e.name):
+        if entry.name.lower().endswith(".dcm"):
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return _folder_hash(os.path.abspath(folder_path), tuple(signature))
+
+
+def segmentation_key(source_hash, lower_threshold, upper_threshold, roi):
+    params = {"source": source_hash, "lower": lower_threshold, "upper": upper_threshold,
+              "roi": roi, "version": SEGMENTATION_VERSION}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def source_volume_path(source_hash):
+    return os.path.join(store_root(), "volumes", source_hash)
+
+
+def source_volume_of(output_folder):
+    """
+    Path of the chunked source volume of a stored segmentation, or None
+    when its manifest does not name one (older segmentations).
+    """
+    source_hash = (_manifest(output_folder) or {}).get("source_hash")
+    return source_volume_path(source_hash) if source_hash else None
+
+
+def _object_path(sha256):
+    return os.path.join(store_root(), "objects", sha256[:2], sha256)
+
+
+def link_object(path, sha256):
+    """
+    Makes 'path' a hardlink to the stored object with its content, adding
+    it to the store if it is the first copy. Returns False if the file had
+    to stay a private copy.
+    """
+    obj = _object_path(sha256)
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+    tmp_path = f"{path}.link-tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        try:
+            os.link(obj, tmp_path)
+        except FileNotFoundError:
+            # First copy (or the object was just removed): store this one.
+            os.link(path, obj)
+            return True
+        os.replace(tmp_path, path)
+        return True
+    except FileExistsError:
+        # Another request stored the same object first.
+        return link_object(path, sha256)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def dedupe_files(folder, file_hashes):
+    """
+    Replaces the files of 'folder' ({filename: sha256}) with hardlinks to
+    the store. Returns the number of files that now share an object.
+    """
+    return sum(link_object(os.path.join(folder, name), sha256) for name, sha256 in file_hashes.items())
+
+
+def _manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def segment_cached(folder_path, lower_threshold, upper_threshold, roi=None, hu_volume=None):
+    """
+    segment_folder() through the store. Returns (output_folder,
+    histogram_path, key, reused), 'reused' being True when an identical
+    segmentation already existed and nothing was computed.
+    """
+    from .chunked_volume import open_chunked_volume
+    from .imaging import segment_folder
+    from .thumbnails import write_thumbnails
+
+    source_hash = source_content_hash(folder_path)
+    key = segmentation_key(source_hash, lower_threshold, upper_threshold, roi)
+    segmentations = os.path.join(store_root(), "segmentations")
+    output_folder = os.path.join(segmentations, key)
+    manifest = _manifest(output_folder)
+    if manifest is not None:
+        return output_folder, os.path.join(output_folder, manifest["histograms"]), key, True
+
+    # Built in a private folder, then renamed into place in one step, so a
+    # folder under its key is always complete.
+    build_folder = os.path.join(segmentations, f".build-{key}-{os.getpid()}-{threading.get_ident()}")
+    os.makedirs(build_folder)
+    source_chunks = source_volume_path(source_hash)
+    whole_series = roi is None or (roi["slice_start"] is None and roi["slice_stop"] is None)
+    if (not getattr(settings, "CHUNK_SOURCE_VOLUMES", True) or not whole_series
+            or open_chunked_volume(source_chunks) is not None):
+        source_chunks = None
+    else:
+        os.makedirs(os.path.dirname(source_chunks), exist_ok=True)
+    try:
+        histogram_path = segment_folder(folder_path, build_folder, lower_threshold, upper_threshold,
+                                        roi=roi, hu_volume=hu_volume, source_chunks=source_chunks)
+        with metrics.stage("thumbnails"):
+            write_thumbnails(build_folder, lower_threshold, upper_threshold)
+        files = {name: file_sha256(os.path.join(build_folder, name))
+                 for name in os.listdir(build_folder) if name.lower().endswith(".dcm")}
+        dedupe_files(build_folder, files)
+        with open(os.path.join(build_folder, MANIFEST_FILENAME), "w") as f:
+            json.dump({"key": key, "source_hash": source_hash, "lower_threshold": lower_threshold,
+                       "upper_threshold": upper_threshold, "roi": roi, "version": SEGMENTATION_VERSION,
+                       "histograms": os.path.basename(histogram_path), "files": files}, f)
+        try:
+            os.rename(build_folder, output_folder)
+        except OSError:
+            # The same segmentation finished concurrently; keep that one.
+            if _manifest(output_folder) is None:
+                raise
+            shutil.rmtree(build_folder)
+    except BaseException:
+        shutil.rmtree(build_folder, ignore_errors=True)
+        raise
+    return output_folder, os.path.join(output_folder, os.path.basename(histogram_path)), key, False
+
+
+def _source_in_use(source_hash):
+    """
+    True if a stored segmentation was made from the source with 'source_hash'.
+    """
+    segmentations = os.path.join(store_root(), "segmentations")
+    if not os.path.isdir(segmentations):
+        return False
+    for entry in os.scandir(segmentations):
+        if not entry.name.startswith(".") and (_manifest(entry.path) or {}).get("source_hash") == source_hash:
+            return True
+    return False
+
+
+def remove_segmentation(output_folder):
+    """
+    Deletes a stored segmentation folder (once no record uses its key), the
+    objects nothing else links to any more, and the chunked source volume
+    once no stored segmentation was made from that source.
+    """
+    manifest = _manifest(output_folder) or {}
+    shutil.rmtree(output_folder, ignore_errors=True)
+    source_hash = manifest.get("source_hash")
+    if source_hash and not _source_in_use(source_hash):
+        shutil.rmtree(source_volume_path(source_hash), ignore_errors=True)
+    for sha256 in set(manifest.get("files", {}).values()):
+        obj = _object_path(sha256)
+        try:
+            if os.stat(obj).st_nlink == 1:
+                os.remove(obj)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,154 @@
+"""
+Automatic bone thresholds from a HU histogram.
+
+Three-class multi-Otsu over the HU range splits a CT volume into air/lung,
+soft tissue and bone. The tissue/bone cut is the lower threshold, and the
+upper threshold is the UPPER_QUANTILE of the voxels above it, which leaves
+out metal and streak artifacts. The whole search runs on the histogram
+(every threshold pair at once), so the cost is one histogram pass over the
+volume, or none when the segmentation's stored histograms are used.
+"""
+import os
+
+import numpy as np
+
+from .histograms import HIST_MAX_HU, HIST_MIN_HU, NUM_BINS, slice_histogram, whole_volume_histogram
+
+AUTO = "auto"
+# Width of the bins the Otsu search runs on: 4 HU keeps the pair matrix at
+# ~1300² entries with no visible effect on the thresholds.
+OTSU_BIN_HU = 4
+UPPER_QUANTILE = 0.9995
+# Slices per bincount pass, to bound the intp temporaries of slice_histogram.
+SLAB_SLICES = 16
+
+
+def parse_threshold(value):
+    """
+    A threshold field of a request payload: an int, or AUTO.
+    """
+    if isinstance(value, str) and value.strip().lower() == AUTO:
+        return AUTO
+    return int(value)
+
+
+def volume_histogram(volume):
+    """
+    HU histogram (histograms.py bins) of a whole (slices, rows, cols) volume.
+    """
+    hist = np.zeros(NUM_BINS, dtype=np.int64)
+    for start in range(0, volume.shape[0], SLAB_SLICES):
+        hist += slice_histogram(volume[start:start + SLAB_SLICES])
+    return hist
+
+
+def multi_otsu(counts, values):
+    """
+    Three-class Otsu on a histogram ('counts' at bin 'values').
+    Returns the two thresholds (values where the upper two classes start).
+    """
+    w = np.concatenate(([0.0], np.cumsum(counts, dtype=np.float64)))
+    m = np.concatenate(([0.0], np.cumsum(counts * values, dtype=np.float64)))
+    n = len(counts)
+    # Class 0 = bins [0, i), class 1 = [i, j), class 2 = [j, n), for all i < j.
+    i = np.arange(1, n)[:, None]
+    j = np.arange(1, n)[None, :]
+    w0, m0 = w[i], m[i]
+    w1, m1 = w[j] - w[i], m[j] - m[i]
+    w2, m2 = w[n] - w[j], m[n] - m[j]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Maximizing the between-class variance = maximizing sum(M_k² / W_k).
+        score = m0 ** 2 / w0 + m1 ** 2 / w1 + m2 ** 2 / w2
+    score[~((j > i) & (w0 > 0) & (w1 > 0) & (w2 > 0))] = -np.inf
+    best_i, best_j = np.unravel_index(np.argmax(score), score.shape)
+    return values[best_i + 1], values[best_j + 1]
+
+
+def suggest_from_histogram(hist):
+    """
+    Suggested thresholds from a histogram in the histograms.py bins
+    (under/overflow bins are ignored).
+    Returns {"lower_threshold", "upper_threshold", "method", "otsu_thresholds"}.
+    """
+    in_range = np.asarray(hist[1:-1], dtype=np.int64)
+    pad = -len(in_range) % OTSU_BIN_HU
+    coarse = np.pad(in_range, (0, pad)).reshape(-1, OTSU_BIN_HU).sum(axis=1)
+    coarse_values = HIST_MIN_HU + OTSU_BIN_HU * np.arange(len(coarse))
+    occupied = np.flatnonzero(coarse)
+    if len(occupied) < 3:
+        raise ValueError("Histogram has too few distinct HU values")
+    # Empty bins at either end do not change the result, only the search size.
+    keep = slice(occupied[0], occupied[-1] + 1)
+    low_cut, bone_cut = multi_otsu(coarse[keep], coarse_values[keep])
+
+    bone = in_range[bone_cut - HIST_MIN_HU:]
+    upper = HIST_MAX_HU
+    if bone.any():
+        cum = np.cumsum(bone)
+        upper = bone_cut + int(np.searchsorted(cum, UPPER_QUANTILE * cum[-1]))
+    return {
+        "lower_threshold": int(bone_cut),
+        "upper_threshold": int(min(upper, HIST_MAX_HU)),
+        "method": "multi_otsu",
+        "otsu_thresholds": [int(low_cut), int(bone_cut)],
+    }
+
+
+def suggest_from_histogram_file(path):
+    """
+    Suggestion from a segmentation's stored histograms; reads no pixel data.
+    """
+    hist, _ = whole_volume_histogram(path)
+    return suggest_from_histogram(hist)
+
+
+def suggest_from_volume(volume):
+    return suggest_from_histogram(volume_histogram(volume))
+
+
+def series_histogram(folder_path, roi=None):
+    """
+    HU histogram of a series (or the part of it inside 'roi'), decoding one
+    slice at a time: the same histogram as volume_histogram() of the
+    decoded volume, in the memory of a single slice.
+    """
+    import pydicom
+
+    from .imaging import convert_to_hu, list_series_files
+    from .roi import check_roi, roi_slices
+    from .scheduler import checkpoint
+
+    slice_range, (rows, cols) = roi_slices(roi)
+    series = list_series_files(folder_path)
+    if not series:
+        raise FileNotFoundError(f"No DICOM files found in {folder_path}")
+    check_roi(roi, (len(series),))
+    hist = np.zeros(NUM_BINS, dtype=np.int64)
+    for i, filename in enumerate(series[slice_range]):
+        checkpoint()
+        ds = pydicom.dcmread(os.path.join(folder_path, filename))
+        image = convert_to_hu(ds)
+        if i == 0:
+            check_roi(roi, (len(series),) + image.shape)
+        hist += slice_histogram(image[rows, cols])
+    return hist
+
+
+def suggest_for_series(folder_path, roi=None, streaming=False):
+    """
+    Suggestion for a source series (or the part of it inside 'roi'), from
+    one histogram pass over its decoded volume. The volume comes from the
+    volume cache, so segmenting it right after does not decode it again.
+    With 'streaming' the series is read slice by slice instead and never
+    held in memory (see admission.py); the suggestion is the same.
+    """
+    if streaming:
+        return suggest_from_histogram(series_histogram(folder_path, roi))
+
+    from .roi import check_roi, roi_slices
+    from .volume_cache import load_hu_volume
+
+    volume, _, _ = load_hu_volume(folder_path)
+    check_roi(roi, volume.shape)
+    slice_range, (rows, cols) = roi_slices(roi)
+    return suggest_from_volume(volume[slice_range, rows, cols])
@@ -0,0 +1,253 @@
+"""
+Chunked volume storage for reads that are not whole axial slices.
+
+A (slices, rows, cols) volume is split into CHUNK_SHAPE tiles, each
+compressed on its own with zlib, next to a JSON metadata file. The layout
+follows Zarr (v2):
+
+    <path>/meta.json        shape, chunks, dtype, fill_value, compressor,
+                            filters, spacing and the list of stored chunks
+    <path>/<iz>.<iy>.<ix>   one compressed chunk (edge chunks are cropped)
+
+Chunks that hold only fill_value are not written, so the background of a
+segmentation costs nothing to store or to read. Before compression the
+bytes of each chunk are shuffled (all low bytes, then all high bytes),
+which makes int16 CT data compress better and faster.
+
+ChunkedVolume reads any sub-box and decompresses only the chunks it
+intersects. Decoded chunks are cached per process. A coronal plane, an ROI
+crop or a bone's bounding box is then a few chunks instead of every DICOM
+file of the series.
+
+Writers build the folder privately and rename it into place on close(), so
+a folder with a meta.json is always complete.
+"""
+import itertools
+import json
+import os
+import shutil
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from . import metrics
+
+CHUNK_SHAPE = (64, 64, 64)
+COMPRESSION_LEVEL = 1
+META_FILENAME = "meta.json"
+# Chunked copy of a folder's series, written next to its DICOMs.
+VOLUME_CHUNKS_DIRNAME = "volume.chunks"
+FORMAT_VERSION = 1
+# Decoded chunks kept per process (a 64³ int16 chunk is 512 KiB).
+CHUNK_CACHE_SIZE = 128
+
+
+def _chunk_name(index):
+    return ".".join(str(i) for i in index)
+
+
+def _shuffle(block):
+    itemsize = block.dtype.itemsize
+    return np.ascontiguousarray(block).view(np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    itemsize = dtype.itemsize
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.copy().view(dtype).reshape(shape)
+
+
+class ChunkedVolumeWriter:
+    """
+    Writes a volume of 'shape' one slice at a time, in slice order. Only
+    one slab of CHUNK_SHAPE[0] slices is held in memory; each full slab is
+    compressed and written out. Use as a context manager: the folder is
+    completed on a clean exit and discarded on an exception.
+    """
+
+    def __init__(self, path, shape, dtype, spacing, fill_value=0, chunks=CHUNK_SHAPE, level=COMPRESSION_LEVEL):
+        self.path = path
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        self.spacing = [float(s) for s in spacing]
+        self.fill_value = fill_value
+        self.chunks = tuple(int(c) for c in chunks)
+        self.level = level
+        self._build = f"{path}.build-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(self._build)
+        self._slab = np.empty((self.chunks[0],) + self.shape[1:], dtype=self.dtype)
+        self._depth = 0
+        self._written = 0
+        self._stored = []
+        self._bytes = 0
+
+    def append(self, image):
+        if self._written >= self.shape[0]:
+            raise ValueError(f"Volume already has its {self.shape[0]} slices")
+        if image.shape != self.shape[1:]:
+            raise ValueError(f"Slice of shape {image.shape} in a volume of {self.shape[1:]} slices")
+        self._slab[self._depth] = image
+        self._depth += 1
+        self._written += 1
+        if self._depth == self.chunks[0]:
+            self._flush()
+
+    def _flush(self):
+        iz = (self._written - self._depth) // self.chunks[0]
+        slab = self._slab[:self._depth]
+        _, cy, cx = self.chunks
+        for iy, ix in itertools.product(range(-(-self.shape[1] // cy)), range(-(-self.shape[2] // cx))):
+            block = slab[:, iy * cy:(iy + 1) * cy, ix * cx:(ix + 1) * cx]
+            if not (block != self.fill_value).any():
+                continue
+            data = zlib.compress(_shuffle(block), self.level)
+            with open(os.path.join(self._build, _chunk_name((iz, iy, ix))), "wb") as f:
+                f.write(data)
+            self._stored.append([iz, iy, ix])
+            self._bytes += len(data)
+        self._depth = 0
+
+    def close(self):
+        """
+        Writes the last slab and the metadata and moves the folder into
+        place. If another writer got there first, its copy is kept.
+        """
+        if self._written != self.shape[0]:
+            raise ValueError(f"Expected {self.shape[0]} slices, got {self._written}")
+        if self._depth:
+            self._flush()
+        meta = {
+            "format": "chunked-volume",
+            "version": FORMAT_VERSION,
+            "shape": list(self.shape),
+            "chunks": list(self.chunks),
+            "dtype": self.dtype.str,
+            "fill_value": self.fill_value,
+            "compressor": {"id": "zlib", "level": self.level},
+            "filters": ["shuffle"],
+            "spacing": self.spacing,
+            "stored_chunks": self._stored,
+        }
+        with open(os.path.join(self._build, META_FILENAME), "w") as f:
+            json.dump(meta, f)
+        metrics.add_bytes("write", "chunks", self._bytes)
+        try:
+            os.rename(self._build, self.path)
+        except OSError:
+            if not os.path.exists(os.path.join(self.path, META_FILENAME)):
+                raise
+            shutil.rmtree(self._build)
+
+    def abort(self):
+        shutil.rmtree(self._build, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+@lru_cache(maxsize=CHUNK_CACHE_SIZE)
+def _decode_chunk(path, meta_mtime, dtype, shape):
+    with open(path, "rb") as f:
+        data = f.read()
+    metrics.add_bytes("read", "chunks", len(data))
+    chunk = _unshuffle(zlib.decompress(data), np.dtype(dtype), shape)
+    chunk.flags.writeable = False
+    return chunk
+
+
+class ChunkedVolume:
+    """
+    Read access to a chunked volume folder. Indexing with slices (step 1)
+    and ints works like on the equivalent array and reads only the chunks
+    the box intersects; read() takes a tuple of slices.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, META_FILENAME)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self._mtime = os.stat(meta_path).st_mtime_ns
+        self.shape = tuple(meta["shape"])
+        self.chunks = tuple(meta["chunks"])
+        self.dtype = np.dtype(meta["dtype"])
+        self.fill_value = meta["fill_value"]
+        self.spacing = tuple(meta["spacing"])
+        self._stored = {tuple(index) for index in meta["stored_chunks"]}
+        self.ndim = len(self.shape)
+
+    def _chunk(self, index):
+        shape = tuple(min(c, n - i * c) for i, c, n in zip(index, self.chunks, self.shape))
+        return _decode_chunk(os.path.join(self.path, _chunk_name(index)), self._mtime, self.dtype.str, shape)
+
+    def read(self, box=None):
+        """
+        The sub-box 'box' (a tuple of up to 3 slices with step 1; whole
+        volume when None) as a new array.
+        """
+        box = tuple(box or ()) + (slice(None),) * (3 - len(box or ()))
+        bounds = []
+        for axis, s in enumerate(box):
+            start, stop, step = s.indices(self.shape[axis])
+            if step != 1:
+                raise ValueError("Chunked volumes only support slices with step 1")
+            bounds.append((start, max(stop, start)))
+        out = np.full([stop - start for start, stop in bounds], self.fill_value, dtype=self.dtype)
+        if out.size == 0:
+            return out
+
+        ranges = [range(start // c, (stop - 1) // c + 1) for (start, stop), c in zip(bounds, self.chunks)]
+        for index in itertools.product(*ranges):
+            if index not in self._stored:
+                continue
+            chunk = self._chunk(index)
+            src, dst = [], []
+            for i, c, (start, stop) in zip(index, self.chunks, bounds):
+                lo, hi = max(start, i * c), min(stop, (i + 1) * c)
+                src.append(slice(lo - i * c, hi - i * c))
+                dst.append(slice(lo - start, hi - start))
+            out[tuple(dst)] = chunk[tuple(src)]
+        return out
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        box, squeeze = [], []
+        for axis, k in enumerate(key):
+            if isinstance(k, slice):
+                box.append(k)
+                continue
+            index = int(k)
+            if not -self.shape[axis] <= index < self.shape[axis]:
+                raise IndexError(f"index {index} is out of bounds for axis {axis} with size {self.shape[axis]}")
+            index %= self.shape[axis]
+            box.append(slice(index, index + 1))
+            squeeze.append(axis)
+        out = self.read(tuple(box))
+        return out.squeeze(axis=tuple(squeeze)) if squeeze else out
+
+    def stored_box(self):
+        """
+        Bounding box (tuple of slices) of the stored chunks: everything
+        outside it is fill_value. None when no chunk is stored.
+        """
+        if not self._stored:
+            return None
+        indices = np.array(sorted(self._stored))
+        return tuple(slice(int(lo) * c, min(int(hi + 1) * c, n))
+                     for lo, hi, c, n in zip(indices.min(axis=0), indices.max(axis=0), self.chunks, self.shape))
+
+
+def open_chunked_volume(path):
+    """
+    ChunkedVolume at 'path', or None if there is no complete one.
+    """
+    if path is None or not os.path.exists(os.path.join(path, META_FILENAME)):
+        return None
+    return ChunkedVolume(path)
@@ -0,0 +1,126 @@
+"""
+Fast writer for the slices of one series.
+
+ds.save_as re-encodes every header element of every slice, although the
+slices of a series share almost all of them. SeriesWriter keeps the encoded
+bytes of each element from the slices it has already written. An element is
+only encoded again when its value differs from the cached one, which
+normally means InstanceNumber, SOPInstanceUID, ImagePositionPatient,
+SliceLocation and the elements the pipeline touched. The pixel bytes are
+written straight after their element header, with buffered I/O.
+
+The output is byte-for-byte what ds.save_as() writes for the same dataset.
+Anything this shortcut does not cover falls back to save_as: compressed or
+deflated transfer syntaxes, datasets being re-encoded to another transfer
+syntax or character set, and missing file meta.
+"""
+import struct
+
+from pydicom.filebase import DicomBytesIO
+from pydicom.filewriter import write_data_element
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+
+PIXEL_DATA_TAG = 0x7FE00010
+WRITE_BUFFER_SIZE = 1024 * 1024
+# (implicit VR, little endian) of the File Meta Information group.
+META_ENCODING = (False, True)
+
+
+def _element_bytes(elem, encoding, charset):
+    buffer = DicomBytesIO()
+    buffer.is_implicit_VR, buffer.is_little_endian = encoding
+    write_data_element(buffer, elem, charset)
+    return buffer.getvalue()
+
+
+def _pixel_header(elem, length, encoding):
+    implicit, little = encoding
+    order = "<" if little else ">"
+    tag = struct.pack(order + "HH", PIXEL_DATA_TAG >> 16, PIXEL_DATA_TAG & 0xFFFF)
+    if implicit:
+        return tag + struct.pack(order + "I", length)
+    return tag + elem.VR.encode() + b"\x00\x00" + struct.pack(order + "I", length)
+
+
+class SeriesWriter:
+    """
+    Writes datasets like ds.save_as(path), reusing the encoded bytes of
+    header elements that have not changed since an earlier slice.
+    'fast_writes' / 'fallback_writes' count how each slice was written.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self.fast_writes = 0
+        self.fallback_writes = 0
+
+    def _encoding(self, ds):
+        file_meta = getattr(ds, "file_meta", None)
+        tsyntax = file_meta.get("TransferSyntaxUID") if file_meta else None
+        if tsyntax is None or tsyntax.is_private or not tsyntax.is_transfer_syntax:
+            return None
+        if tsyntax.is_compressed or tsyntax == DeflatedExplicitVRLittleEndian:
+            return None
+        encoding = (tsyntax.is_implicit_VR, tsyntax.is_little_endian)
+        if ds.original_encoding != encoding or ds.original_character_set != ds._character_set:
+            return None
+        if PIXEL_DATA_TAG not in ds or not isinstance(ds.PixelData, bytes):
+            return None
+        if not encoding[0] and len(ds["PixelData"].VR) != 2:
+            return None
+        return encoding
+
+    def _encoded(self, elem, encoding, charset):
+        """
+        Encoded bytes of one element, from the cache when the value is
+        unchanged. Raw (never decoded) elements are compared by their raw
+        bytes, decoded ones only when the value is a plain str/bytes, whose
+        encoding does not depend on how it was originally written.
+        """
+        if not (elem.is_raw or isinstance(elem.value, (str, bytes))):
+            return _element_bytes(elem, encoding, charset)
+        key = (int(elem.tag), encoding, str(charset))
+        state = (elem.is_raw, elem.VR, elem.length if elem.is_raw else elem.is_undefined_length)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == state and cached[1] == elem.value:
+            return cached[2]
+        data = _element_bytes(elem, encoding, charset)
+        self._cache[key] = (state, elem.value, data)
+        return data
+
+    def write(self, ds, path):
+        encoding = self._encoding(ds)
+        if encoding is None:
+            ds.save_as(path)
+            self.fallback_writes += 1
+            return
+
+        header = []
+        if ds.preamble:
+            header += [ds.preamble, b"DICM"]
+
+        file_meta = ds.file_meta
+        meta = [self._encoded(file_meta.get_item(tag), META_ENCODING, "iso8859")
+                for tag in sorted(map(int, file_meta.keys())) if tag != 0x00020000]
+        if 0x00020000 in file_meta:
+            # FileMetaInformationGroupLength: bytes of the meta elements after it.
+            header.append(b"\x02\x00\x00\x00UL\x04\x00" + struct.pack("<I", sum(map(len, meta))))
+        header += meta
+
+        charset = ds.get("SpecificCharacterSet", "iso8859")
+        trailer = []
+        for tag in sorted(map(int, ds.keys())):
+            # Retired group lengths are not written (PS3.5, 7.2), as in save_as.
+            if (tag & 0xFFFF == 0 and tag >> 16 > 6) or tag == PIXEL_DATA_TAG:
+                continue
+            pieces = header if tag < PIXEL_DATA_TAG else trailer
+            pieces.append(self._encoded(ds.get_item(tag), encoding, charset))
+
+        pixel_data = ds.PixelData
+        pad = b"\x00" if len(pixel_data) % 2 else b""
+        header.append(_pixel_header(ds["PixelData"], len(pixel_data) + len(pad), encoding))
+        with open(path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(b"".join(header))
+            f.write(pixel_data)
+            f.write(pad + b"".join(trailer))
+        self.fast_writes += 1
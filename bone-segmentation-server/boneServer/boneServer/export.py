@@ -0,0 +1,85 @@
+"""
+Streaming ZIP export.
+
+zipfile can write to an unseekable stream: each entry's sizes and CRC go in
+a data descriptor after its data instead of being patched into the local
+header. stream_zip writes into a sink that only collects bytes and yields
+them after every chunk, so a StreamingHttpResponse can send the archive
+while it is being built. Nothing is written to disk, and memory use stays at
+about one chunk whatever the size of the study. The first bytes go out as
+soon as the first entry header is written.
+"""
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 256 * 1024
+COMPRESSION = {"stored": zipfile.ZIP_STORED, "deflate": zipfile.ZIP_DEFLATED}
+DEFAULT_COMPRESSION = "deflate"
+# Deflate level: segmented slices are mostly background, and even level 1
+# shrinks them a lot at a fraction of the CPU cost of the default 6.
+DEFLATE_LEVEL = 1
+# Entries that may exceed this need ZIP64 headers from the start, because
+# the local header cannot be rewritten on an unseekable stream.
+ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+
+
+class _Sink(io.RawIOBase):
+    """
+    Write-only, unseekable stream that hands back what was written so far.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression=DEFAULT_COMPRESSION):
+    """
+    Yields a ZIP archive of 'entries' ((arcname, path) pairs) chunk by chunk.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode="w", compression=COMPRESSION[compression],
+                         compresslevel=DEFLATE_LEVEL if compression == "deflate" else None) as archive:
+        for arcname, path in entries:
+            force_zip64 = os.path.getsize(path) > ZIP64_LIMIT
+            with open(path, "rb") as src, archive.open(arcname, mode="w", force_zip64=force_zip64) as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+
+def segmentation_entries(seg_record, media_root, media_url):
+    """
+    (arcname, path) pairs for a segmentation export: its DICOMs under dicom/,
+    the STL and any per-bone STLs under bones/. Only directory listings, no
+    file is opened, so the response can start right away.
+    """
+    folder = seg_record.output_folder_path
+    entries = [(f"dicom/{name}", os.path.join(folder, name))
+               for name in sorted(os.listdir(folder)) if name.lower().endswith(".dcm")]
+    stl_urls = [("", seg_record.three_d_model_path)] if seg_record.three_d_model_path else []
+    stl_urls += [("bones/", bone.stl_path) for bone in seg_record.bone_meshes.all()]
+    for prefix, url in stl_urls:
+        path = os.path.join(media_root, url.replace(media_url, "", 1))
+        if os.path.exists(path):
+            entries.append((f"{prefix}{os.path.basename(path)}", path))
+    return entries
@@ -0,0 +1,121 @@
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+# HU range covered by one bin per unit. Bin 0 collects everything below
+# HIST_MIN_HU and the last bin everything above HIST_MAX_HU.
+HIST_MIN_HU = -1024
+HIST_MAX_HU = 4095
+NUM_BINS = HIST_MAX_HU - HIST_MIN_HU + 3
+
+HISTOGRAM_FILENAME = "hu_histograms.npz"
+
+
+def hu_to_bin(hu):
+    """
+    Map a HU value to its histogram bin index (under/overflow bins included).
+    """
+    return int(min(max(hu, HIST_MIN_HU - 1), HIST_MAX_HU + 1)) - (HIST_MIN_HU - 1)
+
+
+def slice_histogram(image_hu):
+    """
+    HU histogram of one int16 slice in a single vectorized bincount pass.
+    """
+    clipped = np.clip(image_hu, HIST_MIN_HU - 1, HIST_MAX_HU + 1).astype(np.intp)
+    clipped -= HIST_MIN_HU - 1
+    return np.bincount(clipped.ravel(), minlength=NUM_BINS).astype(np.uint32)
+
+
+def get_voxel_spacing(ds):
+    """
+    Returns (dz, dy, dx) in mm from SliceThickness / SpacingBetweenSlices and PixelSpacing.
+    """
+    try:
+        dz = float(ds.SliceThickness)
+    except (AttributeError, TypeError, ValueError):
+        dz = float(getattr(ds, 'SpacingBetweenSlices', 1.0))
+    dy, dx = [float(val) for val in getattr(ds, 'PixelSpacing', (1.0, 1.0))]
+    return dz, dy, dx
+
+
+def save_histograms(output_folder, slice_histograms, slice_files, spacing):
+    """
+    Stores the per-slice histograms (ordered like 'slice_files') next to the
+    segmented output. Returns the path of the written file.
+    """
+    path = os.path.join(output_folder, HISTOGRAM_FILENAME)
+    if slice_histograms:
+        hists = np.stack(slice_histograms)
+    else:
+        hists = np.zeros((0, NUM_BINS), dtype=np.uint32)
+    np.savez_compressed(
+        path,
+        histograms=hists,
+        slice_files=np.array(slice_files),
+        spacing=np.array(spacing, dtype=np.float64),
+        hu_range=np.array([HIST_MIN_HU, HIST_MAX_HU]),
+    )
+    return path
+
+
+@lru_cache(maxsize=32)
+def _load_cumulative(path, mtime):
+    with np.load(path) as data:
+        hists = data["histograms"].astype(np.int64)
+        spacing = tuple(float(v) for v in data["spacing"])
+        slice_files = [str(f) for f in data["slice_files"]]
+    # Prepend a zero column so that cum[:, b] counts everything in bins < b.
+    cum = np.zeros((hists.shape[0], hists.shape[1] + 1), dtype=np.int64)
+    np.cumsum(hists, axis=1, out=cum[:, 1:])
+    return cum, spacing, slice_files
+
+
+def load_histograms(path):
+    """
+    Loads a histogram file as cumulative per-slice counts.
+    Cached per process and invalidated when the file changes.
+    Returns (cumulative_counts, spacing, slice_files).
+    """
+    return _load_cumulative(path, os.path.getmtime(path))
+
+
+def whole_volume_histogram(path):
+    """
+    Returns the summed histogram of all slices and the HU value of bin 1.
+    """
+    cum, _, _ = load_histograms(path)
+    return np.diff(cum.sum(axis=0)), HIST_MIN_HU
+
+
+def predict_threshold_stats(path, lower_hu, upper_hu):
+    """
+    Predicts the outcome of segmenting with [lower_hu, upper_hu] from the
+    stored histograms alone: voxel count, bone volume (mm³) and per-slice
+    coverage (fraction of pixels inside the range).
+    """
+    start = time.perf_counter()
+    cum, spacing, slice_files = load_histograms(path)
+    lo = hu_to_bin(lower_hu)
+    hi = hu_to_bin(upper_hu) + 1
+    if hi <= lo:
+        per_slice = np.zeros(cum.shape[0], dtype=np.int64)
+    else:
+        per_slice = cum[:, hi] - cum[:, lo]
+    pixels_per_slice = cum[:, -1]
+    coverage = per_slice / np.maximum(pixels_per_slice, 1)
+
+    voxel_count = int(per_slice.sum())
+    dz, dy, dx = spacing
+    return {
+        "lower_threshold": lower_hu,
+        "upper_threshold": upper_hu,
+        "voxel_count": voxel_count,
+        "bone_volume_mm3": voxel_count * dz * dy * dx,
+        "slice_files": slice_files,
+        "slice_voxel_counts": per_slice.tolist(),
+        "slice_coverage": coverage.round(6).tolist(),
+        "elapsed_us": round((time.perf_counter() - start) * 1e6, 1),
+    }
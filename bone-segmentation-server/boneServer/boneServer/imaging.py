@@ -0,0 +1,183 @@
+"""
+Imaging core used by the segmentation views.
+
+Importing this module pulls in numpy, cv2 and pydicom, so views only import
+it inside the request handlers that actually touch pixel data.
+"""
+import os
+from contextlib import ExitStack
+
+import cv2
+import numpy as np
+import pydicom
+
+from .histograms import slice_histogram, save_histograms, get_voxel_spacing
+from . import metrics
+from .chunked_volume import VOLUME_CHUNKS_DIRNAME, ChunkedVolumeWriter
+from .dicom_writer import SeriesWriter
+from .kernels import segment_slice, to_hu
+from .roi import check_roi, roi_slices
+from .scheduler import checkpoint
+from .series_index import load_instance_numbers
+
+
+def convert_to_hu(dicom_data):
+    """
+    Convert DICOM pixel values to Hounsfield Units using RescaleSlope, RescaleIntercept.
+    """
+    image = dicom_data.pixel_array.astype(np.float64)
+    intercept = getattr(dicom_data, 'RescaleIntercept', 0.0)
+    slope = getattr(dicom_data, 'RescaleSlope', 1.0)
+
+    if slope != 1:
+        image *= slope
+    image += intercept
+
+    return image.astype(np.int16)
+
+def segment_bone_hu(image_hu, lower_hu=300, upper_hu=2000, closing_radius=0):
+    """
+    1. Threshold HU into [lower_hu, upper_hu]
+    2. Optional 2D closing with an elliptical kernel of 'closing_radius' pixels
+       (0 = off; the real 3D cleanup runs in morphology.py before meshing)
+    3. Return segmented HU image
+    """
+    binary_mask = np.logical_and(image_hu >= lower_hu, image_hu <= upper_hu)
+    if closing_radius > 0:
+        size = 2 * int(closing_radius) + 1
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+        binary_mask = cv2.morphologyEx(binary_mask.astype(np.uint8), cv2.MORPH_CLOSE, kernel) > 0
+    segmented_bone = image_hu * binary_mask
+    return segmented_bone
+
+def hu_to_original_scale(segmented_hu, dicom_data):
+    slope = dicom_data.RescaleSlope
+    intercept = dicom_data.RescaleIntercept
+    pixel_original  = (segmented_hu - intercept) / slope
+    return pixel_original.astype(np.uint16) 
+
+
+def list_series_files(folder_path):
+    """
+    Returns the .dcm filenames in 'folder_path' sorted by InstanceNumber (then name).
+    Uses the folder's series index when there is one (uploaded studies).
+    """
+    indexed = load_instance_numbers(folder_path)
+
+    def sort_key(filename):
+        if filename in indexed:
+            return (indexed[filename], filename)
+        ds = pydicom.dcmread(os.path.join(folder_path, filename), stop_before_pixels=True)
+        return (int(ds.InstanceNumber) if 'InstanceNumber' in ds else 0, filename)
+
+    dcm_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.dcm')]
+    return sorted(dcm_files, key=sort_key)
+
+
+def check_slice_shape(filename, shape, expected):
+    """
+    Raises ValueError when a slice's pixel 'shape' differs from the 'expected'
+    shape of the series' first slice (e.g. a localizer among the axial slices).
+    """
+    if expected is not None and shape != expected:
+        raise ValueError(f"Slice {filename} is {shape[0]}x{shape[1]} pixels, the series' first slice "
+                         f"{expected[0]}x{expected[1]}; series with mixed slice sizes are not supported")
+
+
+def segment_folder(folder_path, output_folder, lower_threshold, upper_threshold, roi=None, hu_volume=None,
+                   source_chunks=None):
+    """
+    Segments every .dcm in 'folder_path' into 'output_folder' (same filenames)
+    and collects a per-slice HU histogram of the source at the same time.
+    The segmented HU volume is also written in chunked form to
+    output_folder/volume.chunks (see chunked_volume.py), and the source HU
+    volume to 'source_chunks' when it is given (whole series only).
+    With an explicit 'roi' (see roi.py) only the slices in its slice range are
+    read and written, and only its in-plane box is thresholded; everything
+    outside the box is stored as background.
+    'hu_volume' is an already decoded (volume, slice_files, spacing) of the
+    folder (see volume_cache.py); its slices are used instead of decoding
+    the pixel data again. The headers are still read from the files.
+    Raises ValueError when the slices differ in size or "roi" is not inside
+    the series (see roi.check_roi).
+    Returns the path of the saved histogram file.
+    """
+    decoded = {}
+    if hu_volume is not None:
+        volume, slice_files, _ = hu_volume
+        decoded = {name: i for i, name in enumerate(slice_files)}
+
+    # Slices are processed in InstanceNumber order so the chunked volumes
+    # can be written one slab at a time.
+    slice_range, plane = roi_slices(roi)
+    series = list(slice_files) if hu_volume is not None else list_series_files(folder_path)
+    if hu_volume is not None:
+        check_roi(roi, volume.shape)
+    elif series:
+        header = pydicom.dcmread(os.path.join(folder_path, series[0]), stop_before_pixels=True)
+        check_roi(roi, (len(series), int(header.Rows), int(header.Columns)))
+    else:
+        raise FileNotFoundError(f"No DICOM files found in {folder_path}")
+    filenames = series[slice_range]
+    if source_chunks is not None and len(filenames) != len(series):
+        raise ValueError("source_chunks needs the whole series")
+
+    slices = []
+    spacing = (1.0, 1.0, 1.0)
+    writer = SeriesWriter()
+    with ExitStack() as chunk_writers:
+        segmented_chunks = source_chunks_writer = None
+        for filename in filenames:
+            checkpoint()
+            dicom_filepath = os.path.join(folder_path, filename)
+            with metrics.stage("dicom_read"):
+                ds = pydicom.dcmread(dicom_filepath)
+            metrics.add_bytes("read", "dicom", os.path.getsize(dicom_filepath))
+
+            # HU conversion, threshold and rescale in one fused pass (kernels.py)
+            if filename in decoded:
+                src, slope, intercept = np.asarray(volume[decoded[filename]]), 1, 0
+            else:
+                with metrics.stage("pixel_decode"):
+                    src = ds.pixel_array
+                slope = getattr(ds, 'RescaleSlope', 1.0)
+                intercept = getattr(ds, 'RescaleIntercept', 0.0)
+            check_slice_shape(filename, src.shape, None if segmented_chunks is None else segmented_chunks.shape[1:])
+            instance_number = int(ds.InstanceNumber) if 'InstanceNumber' in ds else 0
+            spacing = get_voxel_spacing(ds)
+
+            with metrics.stage("threshold"):
+                image_hu, segmented_raw = segment_slice(src, slope, intercept, lower_threshold, upper_threshold,
+                                                        ds.RescaleSlope, ds.RescaleIntercept, plane=plane)
+            with metrics.stage("histogram"):
+                slices.append((instance_number, filename, slice_histogram(image_hu[plane])))
+
+            with metrics.stage("chunk_write"):
+                if segmented_chunks is None:
+                    shape = (len(filenames),) + image_hu.shape
+                    segmented_chunks = chunk_writers.enter_context(ChunkedVolumeWriter(
+                        os.path.join(output_folder, VOLUME_CHUNKS_DIRNAME), shape, np.int16, spacing))
+                    if source_chunks is not None:
+                        source_chunks_writer = chunk_writers.enter_context(ChunkedVolumeWriter(
+                            source_chunks, shape, np.int16, spacing, fill_value=-1024))
+                # The HU the written file decodes to (its pixels are read
+                # back as int16 when PixelRepresentation is 1).
+                stored = segmented_raw.view(np.int16) if getattr(ds, 'PixelRepresentation', 0) == 1 else segmented_raw
+                segmented_chunks.append(to_hu(stored, ds.RescaleSlope, ds.RescaleIntercept))
+                if source_chunks_writer is not None:
+                    source_chunks_writer.append(image_hu)
+
+            ds.PixelData = segmented_raw.tobytes()
+            # Save the new DICOM in the output folder
+            output_path = os.path.join(output_folder, filename)
+            with metrics.stage("dicom_write"):
+                writer.write(ds, output_path)
+            metrics.add_bytes("write", "dicom", os.path.getsize(output_path))
+
+    slices.sort(key=lambda s: (s[0], s[1]))
+    return save_histograms(
+        output_folder,
+        [hist for _, _, hist in slices],
+        [name for _, name, _ in slices],
+        spacing,
+    )
@@ -0,0 +1,112 @@
+"""
+Fused per-slice segmentation kernel.
+
+convert_to_hu -> segment_bone_hu -> hu_to_original_scale (imaging.py) makes
+several full passes over a slice, through float64 temporaries.
+segment_slice() produces the same two results: the int16 HU slice (needed
+for the histograms) and the segmented slice in stored pixel values.
+
+- "numba" engine (when numba is installed): one parallel pass over the
+  rows. Each pixel is rescaled, thresholded and scaled back straight into
+  the two output buffers.
+- "numpy" engine: when slope and intercept are integral (slope 1, the usual
+  CT case) it works in int32 instead of float64. Otherwise it runs the
+  reference float64 steps.
+
+Both engines are bit-for-bit identical to the imaging.py functions, including
+their truncation and wrap-around when casting to int16/uint16
+(tests/test_kernels.py). benchmarks/bench_kernels.py times the engines.
+"""
+import numpy as np
+
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+ENGINES = ("numba", "numpy") if HAS_NUMBA else ("numpy",)
+DEFAULT_ENGINE = ENGINES[0]
+
+
+if HAS_NUMBA:
+    @numba.njit(parallel=True, cache=True)
+    def _segment_numba(src, in_slope, in_intercept, lower, upper, out_slope, out_intercept,
+                       r0, r1, c0, c1, hu_out, raw_out):
+        rows, cols = src.shape
+        for r in numba.prange(rows):
+            for c in range(cols):
+                value = np.float64(src[r, c])
+                if in_slope != 1.0:
+                    value *= in_slope
+                value += in_intercept
+                # float -> int64 -> int16/uint16 truncates and wraps like
+                # NumPy's astype does.
+                hu = np.int16(np.int64(value))
+                hu_out[r, c] = hu
+                kept = r0 <= r < r1 and c0 <= c < c1 and lower <= hu <= upper
+                segmented = np.float64(hu) if kept else 0.0
+                raw_out[r, c] = np.uint16(np.int64((segmented - out_intercept) / out_slope))
+
+
+def _integral(value):
+    return float(value).is_integer()
+
+
+def _to_hu_numpy(src, slope, intercept):
+    if slope == 1 and _integral(intercept) and src.dtype.kind in "iu" and src.dtype.itemsize <= 2:
+        # Same values as the float64 path: every sum fits int32 exactly.
+        hu = src.astype(np.int32)
+        hu += int(intercept)
+        return hu.astype(np.int16)
+    image = src.astype(np.float64)
+    if slope != 1:
+        image *= slope
+    image += intercept
+    return image.astype(np.int16)
+
+
+def to_hu(src, slope, intercept):
+    """
+    convert_to_hu() (imaging.py) on a pixel array, with the same result.
+    """
+    return _to_hu_numpy(src, slope, intercept)
+
+
+def _segment_numpy(src, in_slope, in_intercept, lower, upper, out_slope, out_intercept, plane):
+    hu = _to_hu_numpy(src, in_slope, in_intercept)
+    segmented = np.zeros_like(hu)
+    box = hu[plane]
+    keep = box >= lower
+    keep &= box <= upper
+    np.multiply(box, keep, out=segmented[plane])
+    if out_slope == 1 and _integral(out_intercept):
+        raw = segmented.astype(np.int32)
+        raw -= int(out_intercept)
+        return hu, raw.astype(np.uint16)
+    return hu, ((segmented - out_intercept) / out_slope).astype(np.uint16)
+
+
+def segment_slice(src, slope, intercept, lower, upper, out_slope, out_intercept, plane=None, engine=None):
+    """
+    One slice through HU conversion (slope/intercept; 1/0 when 'src' is
+    already HU), thresholding to [lower, upper] inside the in-plane box
+    'plane' ((row slice, col slice), whole slice when None) and conversion
+    back to stored values with out_slope/out_intercept.
+    Returns (hu int16, segmented uint16).
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {list(ENGINES)}")
+    plane = plane or (slice(None), slice(None))
+    if engine == "numpy":
+        return _segment_numpy(src, slope, intercept, lower, upper, out_slope, out_intercept, plane)
+
+    rows, cols = src.shape
+    r0, r1, _ = plane[0].indices(rows)
+    c0, c1, _ = plane[1].indices(cols)
+    hu = np.empty(src.shape, dtype=np.int16)
+    raw = np.empty(src.shape, dtype=np.uint16)
+    _segment_numba(np.ascontiguousarray(src), float(slope), float(intercept), int(lower), int(upper),
+                   float(out_slope), float(out_intercept), r0, r1, c0, c1, hu, raw)
+    return hu, raw
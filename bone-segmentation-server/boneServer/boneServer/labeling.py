@@ -0,0 +1,61 @@
+"""
+Splitting a bone mask into individual bones.
+
+Bones that do not touch are separated by 3D connected-component labeling.
+Bones that touch in the mask (joint spaces lost to partial volume) can
+optionally be split by a watershed over the distance transform: every
+local maximum of the distance to the background (the thick core of a
+bone) seeds one region.
+"""
+import numpy as np
+from scipy.ndimage import distance_transform_edt, generate_binary_structure, label
+
+DEFAULT_MIN_BONE_VOXELS = 500
+DEFAULT_SPLIT_DISTANCE_MM = 10.0
+
+
+def _relabel_by_size(labels, min_voxels):
+    """
+    Drops labels smaller than 'min_voxels' and renumbers the rest 1..n,
+    largest first. Returns (labels, n).
+    """
+    sizes = np.bincount(labels.ravel())
+    sizes[0] = 0
+    kept = np.flatnonzero(sizes >= max(min_voxels, 1))
+    kept = kept[np.argsort(-sizes[kept], kind="stable")]
+    lookup = np.zeros(len(sizes), dtype=np.int32)
+    lookup[kept] = np.arange(1, len(kept) + 1, dtype=np.int32)
+    return lookup[labels], len(kept)
+
+
+def split_touching(mask, components, spacing, split_distance_mm=DEFAULT_SPLIT_DISTANCE_MM):
+    """
+    Watershed of -distance transform seeded at its local maxima. Maxima
+    closer than 'split_distance_mm' to a higher one are merged, so a single
+    bone is not cut along its shaft.
+    """
+    from skimage.feature import peak_local_max
+    from skimage.segmentation import watershed
+
+    distance = distance_transform_edt(mask, sampling=spacing)
+    footprint = np.ones(tuple(2 * max(int(round(split_distance_mm / float(d))), 1) + 1 for d in spacing),
+                        dtype=bool)
+    peaks = peak_local_max(distance, footprint=footprint, labels=components, exclude_border=False)
+    markers = np.zeros(mask.shape, dtype=bool)
+    markers[tuple(peaks.T)] = True
+    # Plateau maxima give several adjacent peaks; they seed the same bone.
+    markers, _ = label(markers, structure=generate_binary_structure(3, 3))
+    return watershed(-distance, markers, mask=mask)
+
+
+def label_bones(mask, spacing, separate_touching=False, split_distance_mm=DEFAULT_SPLIT_DISTANCE_MM,
+                min_bone_voxels=DEFAULT_MIN_BONE_VOXELS):
+    """
+    Bone mask -> (labels, count). Labels are int32, 0 is background and
+    1..count are bones ordered by size (largest first).
+    """
+    components, count = label(mask, structure=generate_binary_structure(3, 3))
+    if count and separate_touching:
+        components = split_touching(mask, components, spacing, split_distance_mm)
+    return _relabel_by_size(components, min_bone_voxels)
+
@@ -0,0 +1,159 @@
+"""
+Bone measurements straight from the segmentation mask, without meshing.
+
+Everything is voxel counting and moments on the (slices, rows, cols) mask,
+scaled by the record's voxel spacing. Coordinates are in mm in the volume's
+own frame: z = slice index (InstanceNumber order) * dz, y = row * dy,
+x = col * dx.
+
+- volume_mm3: voxel count * voxel volume
+- surface_area_mm2: area of the exposed voxel faces * 2/3. The face area
+  overestimates a smooth surface by 3/2 on average over orientations, so
+  the corrected value is unbiased for surfaces without a preferred
+  orientation. voxel_face_area_mm2 keeps the raw face area.
+- centroid_mm, principal axes (eigenvectors of the covariance, largest
+  first), principal_lengths_mm (axis lengths of the solid ellipsoid with
+  the same second moments: 2 * sqrt(5 * eigenvalue))
+- bounding box (voxel indices, stop exclusive) and its size in mm
+- slice_area_mm2: cross-sectional area of every slice in the bounding box
+
+All moments come from the three 2D projections of the cropped mask. The
+first pass finds the bounding box and each later pass runs on the box only,
+so no coordinate arrays are built.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .roi import bounding_box
+
+# Measured segmentations kept per process (results are small).
+MEASUREMENT_CACHE_SIZE = 32
+
+
+def _face_counts(mask):
+    """
+    Exposed voxel faces along (z, y, x): transitions inside the mask plus
+    the filled voxels on the outer planes.
+    """
+    counts = []
+    for axis in range(3):
+        inner = np.count_nonzero(np.diff(mask, axis=axis))
+        first = np.count_nonzero(np.take(mask, 0, axis=axis))
+        last = np.count_nonzero(np.take(mask, -1, axis=axis))
+        counts.append(inner + first + last)
+    return counts
+
+
+def _moments(mask, spacing, offset):
+    """
+    Centroid (mm) and covariance (mm²) of the True voxels of 'mask', whose
+    first voxel is at index 'offset' of the full volume.
+    """
+    zy = mask.sum(axis=2, dtype=np.int64)
+    zx = mask.sum(axis=1, dtype=np.int64)
+    yx = mask.sum(axis=0, dtype=np.int64)
+    n = zy.sum()
+    coords = [(offset[axis] + np.arange(mask.shape[axis])) * spacing[axis] for axis in range(3)]
+    z, y, x = coords
+    count_z, count_y, count_x = zy.sum(axis=1), zy.sum(axis=0), zx.sum(axis=0)
+    mean = np.array([count_z @ z, count_y @ y, count_x @ x]) / n
+    second = np.empty((3, 3))
+    second[0, 0] = count_z @ (z * z)
+    second[1, 1] = count_y @ (y * y)
+    second[2, 2] = count_x @ (x * x)
+    second[0, 1] = second[1, 0] = z @ zy @ y
+    second[0, 2] = second[2, 0] = z @ zx @ x
+    second[1, 2] = second[2, 1] = y @ yx @ x
+    return mean, second / n - np.outer(mean, mean)
+
+
+def measure_mask(mask, spacing, offset=(0, 0, 0)):
+    """
+    Measurements of the True voxels of a boolean mask (see the module
+    docstring). 'offset' is the index of mask[0, 0, 0] in the full volume,
+    for masks that are a crop of it. Returns None for an empty mask.
+    """
+    box = bounding_box(mask)
+    if box is None:
+        return None
+    cropped = mask[box]
+    offset = tuple(offset[axis] + box[axis].start for axis in range(3))
+    dz, dy, dx = spacing
+    voxel_count = int(np.count_nonzero(cropped))
+
+    faces_z, faces_y, faces_x = _face_counts(cropped)
+    face_area = faces_z * dy * dx + faces_y * dz * dx + faces_x * dz * dy
+
+    centroid, covariance = _moments(cropped, spacing, offset)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = np.clip(eigenvalues[order], 0, None)
+
+    per_slice = cropped.sum(axis=(1, 2)) * dy * dx
+    return {
+        "voxel_count": voxel_count,
+        "volume_mm3": round(voxel_count * dz * dy * dx, 3),
+        "surface_area_mm2": round(face_area * 2 / 3, 3),
+        "voxel_face_area_mm2": round(face_area, 3),
+        "centroid_mm": [round(v, 3) for v in centroid],
+        "principal_axes": [[round(v, 6) for v in eigenvectors[:, i]] for i in order],
+        "principal_moments_mm2": [round(v, 3) for v in eigenvalues],
+        "principal_lengths_mm": [round(2 * np.sqrt(5 * v), 3) for v in eigenvalues],
+        "bounding_box": {
+            "start": list(offset),
+            "stop": [offset[axis] + cropped.shape[axis] for axis in range(3)],
+            "size_mm": [round(cropped.shape[axis] * spacing[axis], 3) for axis in range(3)],
+        },
+        "slice_area_mm2": {"first_slice": offset[0], "areas": [round(v, 3) for v in per_slice]},
+    }
+
+
+def measure_labels(labels, spacing, offset=(0, 0, 0)):
+    """
+    measure_mask() for every bone of a label volume (1..n, 0 = background),
+    each on its own bounding box. 'offset' is as for measure_mask().
+    """
+    from scipy.ndimage import find_objects
+
+    bones = []
+    for label, box in enumerate(find_objects(labels), start=1):
+        if box is None:
+            continue
+        result = measure_mask(labels[box] == label, spacing,
+                              offset=tuple(o + s.start for o, s in zip(offset, box)))
+        bones.append(dict(label=label, **result))
+    return bones
+
+
+@lru_cache(maxsize=MEASUREMENT_CACHE_SIZE)
+def _measure_folder(folder_path, mtime, bone_options):
+    from .reconstruction import label_mask, load_mask_volume
+
+    mask, spacing = load_mask_volume(folder_path)
+    result = {
+        "spacing_mm": list(spacing),
+        "slice_count": int(mask.shape[0]),
+        "bone": measure_mask(mask, spacing),
+        "bones": None,
+    }
+    if bone_options is not None and result["bone"] is not None:
+        labels, _, box = label_mask(mask, spacing, **dict(bone_options))
+        result["bones"] = measure_labels(labels, spacing, offset=tuple(s.start for s in box))
+    return result
+
+
+def measure_segmentation(output_folder, bone_options=None):
+    """
+    Measurements of a segmented series: the whole bone mask and, with
+    'bone_options' (reconstruction.LABEL_OPTIONS, as for per-bone
+    reconstruction), every bone cleaned and labeled as label_mask() does,
+    so labels and voxel counts match the per-bone meshes.
+    The mask is read from the segmentation's chunked volume when it has one.
+    Cached per process until the folder changes.
+    """
+    output_folder = os.path.abspath(output_folder)
+    if bone_options is not None:
+        bone_options = tuple(sorted(bone_options.items()))
+    return _measure_folder(output_folder, os.path.getmtime(output_folder), bone_options)
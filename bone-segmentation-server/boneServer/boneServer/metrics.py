@@ -0,0 +1,226 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms live in this module and are rendered by the
+/metrics view, so no client library or external service is needed. Values
+are per process; with several worker processes each one reports its own.
+
+- stage(name): times a pipeline stage into bone_stage_duration_seconds.
+- add_bytes(direction, kind, n): bytes read from / written to disk.
+- set_gauge(name, value, **labels): current values, e.g. scheduler queues.
+- metrics_middleware: per-view request latency, response bytes and the
+  number of DB queries each request ran.
+- cache hits/misses are read from cache_info() at scrape time, for the
+  caches whose modules are already loaded.
+- timeline(): collects the stages run by the current thread, with their
+  start offsets, for request profiling (see profiling.py).
+
+Only the standard library is imported here, since the middleware loads it
+at startup.
+"""
+import bisect
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers per-slice stages (ms) up to whole reconstructions (minutes).
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# (module, attribute) of the caches reported at scrape time: lru_cache'd
+# functions, or objects with the same cache_info().
+CACHES = {
+    "hu_volume": ("boneServer.volume_cache", "_load_hu_volume"),
+    "histograms": ("boneServer.histograms", "_load_cumulative"),
+    "shared_volume": ("boneServer.shared_cache", "_shared"),
+    "measurements": ("boneServer.measurements", "_measure_folder"),
+    "volume_chunks": ("boneServer.chunked_volume", "_decode_chunk"),
+}
+
+_HELP = {
+    "bone_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage."),
+    "bone_io_bytes_total": ("counter", "Bytes read from or written to disk by the pipeline."),
+    "bone_http_request_duration_seconds": ("histogram", "Request latency by view."),
+    "bone_http_requests_total": ("counter", "Requests by view and status code."),
+    "bone_http_response_bytes_total": ("counter", "Response body bytes by view (when the length is known)."),
+    "bone_db_queries_per_request": ("histogram", "Database queries run by one request, by view."),
+    "bone_scheduler_running": ("gauge", "Scheduled tasks running, by priority class."),
+    "bone_scheduler_queued": ("gauge", "Scheduled tasks waiting for a slot, by priority class."),
+    "bone_scheduler_wait_seconds": ("histogram", "Time tasks waited for a slot, by priority class."),
+    "bone_scheduler_yield_seconds": ("histogram", "Time batch tasks paused for interactive work."),
+    "bone_memory_budget_bytes": ("gauge", "Memory budget for admitted tasks (MEMORY_BUDGET_MB)."),
+    "bone_memory_reserved_bytes": ("gauge", "Estimated peak memory reserved by running tasks."),
+    "bone_admissions_total": ("counter", "Admitted segmentation and reconstruction tasks by memory mode."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+_local = threading.local()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [buckets, [0] * (len(buckets) + 1), 0.0]
+        hist[1][bisect.bisect_left(buckets, value)] += 1
+        hist[2] += value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+@contextmanager
+def stage(name):
+    """
+    Times the enclosed block as pipeline stage 'name'.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("bone_stage_duration_seconds", elapsed, stage=name)
+        recording = getattr(_local, "timeline", None)
+        if recording is not None:
+            origin, events = recording
+            events.append({"stage": name, "start_s": round(start - origin, 6), "duration_s": round(elapsed, 6)})
+
+
+@contextmanager
+def timeline():
+    """
+    Yields a list that receives one {stage, start_s, duration_s} dict per
+    stage the current thread finishes inside the block, start_s being
+    relative to entering the block.
+    """
+    events = []
+    previous = getattr(_local, "timeline", None)
+    _local.timeline = (time.perf_counter(), events)
+    try:
+        yield events
+    finally:
+        _local.timeline = previous
+
+
+def add_bytes(direction, kind, n):
+    """
+    direction: "read" or "write"; kind: what was read/written ("dicom", "stl", ...).
+    """
+    inc("bone_io_bytes_total", n, direction=direction, kind=kind)
+
+
+def _labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _cache_lines():
+    infos = {}
+    for cache, (module_name, function_name) in CACHES.items():
+        module = sys.modules.get(module_name)
+        cached = getattr(module, function_name, None) if module is not None else None
+        if cached is not None:
+            infos[cache] = cached.cache_info()
+    if not infos:
+        return []
+    lines = []
+    for name, kind, text, field in (
+            ("bone_cache_hits_total", "counter", "lru_cache hits.", "hits"),
+            ("bone_cache_misses_total", "counter", "lru_cache misses.", "misses"),
+            ("bone_cache_entries", "gauge", "Entries currently cached.", "currsize")):
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{cache}"}} {getattr(info, field)}' for cache, info in infos.items()]
+    return lines
+
+
+def render():
+    """
+    All metrics in Prometheus text format (version 0.0.4).
+    """
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: (buckets, list(counts), total) for key, (buckets, counts, total) in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def describe(name):
+        if name not in described:
+            described.add(name)
+            kind, text = _HELP.get(name, ("untyped", name))
+            lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name)
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        describe(name)
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), (buckets, counts, total) in sorted(histograms.items()):
+        describe(name)
+        cumulative = 0
+        for bound, count in zip(buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
+
+
+def metrics_middleware(get_response):
+    """
+    Records latency, status, response size and DB query count per view.
+    """
+    from django.db import connection
+
+    def middleware(request):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        observe("bone_http_request_duration_seconds", elapsed, view=view)
+        observe("bone_db_queries_per_request", queries[0], buckets=QUERY_BUCKETS, view=view)
+        inc("bone_http_requests_total", view=view, status=response.status_code)
+        if response.has_header("Content-Length"):
+            inc("bone_http_response_bytes_total", int(response["Content-Length"]), view=view)
+        elif not response.streaming:
+            inc("bone_http_response_bytes_total", len(response.content), view=view)
+        return response
+
+    return middleware
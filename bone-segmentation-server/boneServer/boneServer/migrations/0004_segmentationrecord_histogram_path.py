@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boneServer", "0003_segmentationrecord_three_d_model_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="segmentationrecord",
+            name="histogram_path",
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("boneServer", "0004_segmentationrecord_histogram_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="segmentationrecord",
+            name="roi",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
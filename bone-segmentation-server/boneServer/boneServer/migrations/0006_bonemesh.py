@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boneServer', '0005_segmentationrecord_roi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoneMesh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.IntegerField()),
+                ('stl_path', models.CharField(max_length=1024)),
+                ('voxel_count', models.IntegerField()),
+                ('volume_mm3', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('segmentation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bone_meshes', to='boneServer.segmentationrecord')),
+            ],
+            options={
+                'ordering': ['label'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boneServer', '0008_profileartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationrecord',
+            name='content_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
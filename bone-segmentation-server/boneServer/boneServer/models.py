@@ -22,6 +22,10 @@ class SegmentationRecord(models.Model):
     - output_folder_path (where the segmented DICOMs are saved)
     - lower_threshold, upper_threshold
     - created_at
+    - histogram_path (per-slice HU histograms of the source, used for threshold previews)
+    - roi (optional sub-volume that was segmented, see roi.py)
+    - content_key (key of the output in the artifact store, see artifact_store.py;
+      records with the same key share one output folder)
     """
     physician = models.ForeignKey(User, on_delete=models.CASCADE, related_name="segmentations")
     patient_email = models.EmailField()
@@ -31,7 +35,78 @@ class SegmentationRecord(models.Model):
     upper_threshold = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     three_d_model_path = models.CharField(max_length=1024, null=True, blank=True)
+    histogram_path = models.CharField(max_length=1024, null=True, blank=True)
+    roi = models.JSONField(null=True, blank=True)
+    content_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)
 
 
     def __str__(self):
         return f"Segmentation by {self.physician.username} for {self.patient_email} - {self.created_at}"
+
+
+class BoneMesh(models.Model):
+    """
+    One bone of a per-bone (labeled) 3D reconstruction:
+    - segmentation (the SegmentationRecord it was reconstructed from)
+    - label (1..n, largest bone first)
+    - stl_path (URL path of the bone's STL under MEDIA_URL)
+    - voxel_count, volume_mm3 (size of the bone in the cleaned mask)
+    """
+    segmentation = models.ForeignKey(SegmentationRecord, on_delete=models.CASCADE, related_name="bone_meshes")
+    label = models.IntegerField()
+    stl_path = models.CharField(max_length=1024)
+    voxel_count = models.IntegerField()
+    volume_mm3 = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["label"]
+
+    def __str__(self):
+        return f"Bone {self.label} of segmentation {self.segmentation_id}"
+
+
+class DicomUpload(models.Model):
+    """
+    A study uploaded through /upload-dicoms/:
+    - physician (who uploaded it)
+    - folder_path (where its DICOMs and series_index.json were written)
+    - file_count, total_bytes (DICOM files kept)
+    - content_hash (SHA-256 over the sorted per-file SHA-256s)
+    """
+    physician = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
+    folder_path = models.CharField(max_length=1024)
+    file_count = models.IntegerField()
+    total_bytes = models.BigIntegerField()
+    content_hash = models.CharField(max_length=64, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Upload by {self.physician.username} ({self.file_count} files) - {self.created_at}"
+
+
+class ProfileArtifact(models.Model):
+    """
+    A profiled segmentation/reconstruction request (see profiling.py):
+    - segmentation (the SegmentationRecord it created or worked on, if any)
+    - user (who made the request)
+    - view, status_code, sampled (picked by PROFILE_SAMPLE_PERCENT rather than ?profile=1)
+    - path (ZIP with profile.prof and summary.json)
+    - wall_time_s, peak_memory_bytes (tracemalloc peak)
+    """
+    segmentation = models.ForeignKey(SegmentationRecord, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name="profiles")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="profiles")
+    view = models.CharField(max_length=100)
+    path = models.CharField(max_length=1024)
+    status_code = models.IntegerField()
+    wall_time_s = models.FloatField()
+    peak_memory_bytes = models.BigIntegerField()
+    sampled = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Profile of {self.view} ({self.wall_time_s:.2f}s) - {self.created_at}"
@@ -0,0 +1,110 @@
+"""
+3D morphological cleanup of bone masks.
+
+Closing and opening use a Euclidean ball of r mm (anisotropic spacing is
+handled in mm). For large balls they are done with distance transforms:
+dilating by r keeps every voxel within r mm of the mask, eroding by r keeps
+every voxel more than r mm from the background, at a cost linear in the
+number of voxels whatever the radius. A structuring-element pass scales
+with the ball's voxel count, so it is only used for small balls where it
+is still the faster of the two. Both give the same mask.
+"""
+import numpy as np
+from scipy.ndimage import (binary_dilation, binary_erosion, binary_fill_holes, distance_transform_edt,
+                           generate_binary_structure, label)
+
+DEFAULT_CLOSING_RADIUS_MM = 1.0
+DEFAULT_OPENING_RADIUS_MM = 0.0
+DEFAULT_FILL_HOLES = True
+DEFAULT_MIN_SPECK_VOXELS = 64
+
+# Balls with more voxels than this go through the distance transforms.
+MAX_STRUCTURE_VOXELS = 200
+
+
+def radius_voxels(radius_mm, spacing):
+    """
+    Per-axis radius in whole voxels (rounded up).
+    """
+    return tuple(int(np.ceil(radius_mm / float(d))) for d in spacing)
+
+
+def ball(radius_mm, spacing):
+    """
+    Structuring element: every voxel offset within 'radius_mm'.
+    """
+    rz, ry, rx = radius_voxels(radius_mm, spacing)
+    z, y, x = np.ogrid[-rz:rz + 1, -ry:ry + 1, -rx:rx + 1]
+    return (z * spacing[0]) ** 2 + (y * spacing[1]) ** 2 + (x * spacing[2]) ** 2 <= radius_mm ** 2
+
+
+def dilate(mask, radius_mm, spacing):
+    structure = ball(radius_mm, spacing)
+    if structure.sum() <= MAX_STRUCTURE_VOXELS:
+        return binary_dilation(mask, structure=structure)
+    return distance_transform_edt(~mask, sampling=spacing) <= radius_mm
+
+
+def erode(mask, radius_mm, spacing):
+    structure = ball(radius_mm, spacing)
+    if structure.sum() <= MAX_STRUCTURE_VOXELS:
+        return binary_erosion(mask, structure=structure)
+    return distance_transform_edt(mask, sampling=spacing) > radius_mm
+
+
+def _padded(mask, radius_mm, spacing):
+    # Zero border so the erosion does not see the volume edge as background
+    # any differently from real background.
+    pad = [(r + 1, r + 1) for r in radius_voxels(radius_mm, spacing)]
+    return np.pad(mask, pad, mode='constant'), tuple(slice(p, -p) for p, _ in pad)
+
+
+def close_mask(mask, radius_mm, spacing):
+    """
+    Closing (dilate then erode) with a ball of 'radius_mm'.
+    """
+    if radius_mm <= 0:
+        return mask
+    padded, inner = _padded(mask, radius_mm, spacing)
+    return erode(dilate(padded, radius_mm, spacing), radius_mm, spacing)[inner]
+
+
+def open_mask(mask, radius_mm, spacing):
+    """
+    Opening (erode then dilate) with a ball of 'radius_mm'.
+    """
+    if radius_mm <= 0:
+        return mask
+    padded, inner = _padded(mask, radius_mm, spacing)
+    return dilate(erode(padded, radius_mm, spacing), radius_mm, spacing)[inner]
+
+
+def remove_small_specks(mask, min_voxels):
+    """
+    Drops 26-connected components smaller than 'min_voxels'.
+    """
+    if min_voxels <= 1:
+        return mask
+    labels, count = label(mask, structure=generate_binary_structure(3, 3))
+    if count == 0:
+        return mask
+    sizes = np.bincount(labels.ravel())
+    keep = sizes >= min_voxels
+    keep[0] = False
+    return keep[labels]
+
+
+def clean_mask(mask, spacing, closing_radius=DEFAULT_CLOSING_RADIUS_MM,
+               opening_radius=DEFAULT_OPENING_RADIUS_MM, fill_holes=DEFAULT_FILL_HOLES,
+               min_speck_voxels=DEFAULT_MIN_SPECK_VOXELS):
+    """
+    Full cleanup stage: speck removal, closing, opening, then 3D hole filling
+    (cavities fully enclosed by bone). Radii are in mm.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    mask = remove_small_specks(mask, min_speck_voxels)
+    mask = close_mask(mask, closing_radius, spacing)
+    mask = open_mask(mask, opening_radius, spacing)
+    if fill_holes:
+        mask = binary_fill_holes(mask)
+    return mask
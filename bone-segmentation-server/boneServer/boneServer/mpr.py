@@ -0,0 +1,191 @@
+"""
+Multi-planar reformatting: sagittal, coronal and oblique planes resampled
+from a (slices, rows, cols) HU volume.
+
+Planes are given in the volume's own frame in mm, as in measurements.py:
+z = slice index * dz, y = row * dy, x = col * dx. The output has square
+pixels of the smallest voxel spacing, so a plane keeps its physical
+proportions whatever the slice thickness.
+
+Sampling is trilinear and vectorized: the plane's points become fractional
+voxel indices, and the 8 corner voxels of all points are gathered at once
+from the flattened volume. With the volume memory-mapped from the shared
+cache only the pages the plane crosses are touched; from a chunked volume
+(chunked_volume.py) only the chunks in the plane's bounding box are read.
+Points outside the volume get the fill value.
+"""
+import numpy as np
+
+PLANES = ("axial", "coronal", "sagittal", "oblique")
+# Normal of each orthogonal plane and the volume axis its index runs along.
+ORTHOGONAL_AXES = {"axial": 0, "coronal": 1, "sagittal": 2}
+# Longest side of a rendered plane in pixels; larger planes get coarser pixels.
+MPR_MAX_SIZE = 1024
+# Rows follow z unless the normal is within ~25° of it (then they follow y).
+_Z_ALIGNED = 0.9
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float64)
+    norm = np.linalg.norm(vector)
+    if vector.shape != (3,) or not np.isfinite(norm) or norm == 0:
+        raise ValueError("Plane normal must be a non-zero (z, y, x) vector")
+    return vector / norm
+
+
+def plane_axes(normal):
+    """
+    (row_direction, column_direction) of the plane with this (z, y, x)
+    normal. Rows run along +z where possible (along +y for near-axial
+    planes) and columns along +x (along +y for sagittal planes), so the
+    orthogonal planes come out in the usual orientation.
+    """
+    normal = _unit(normal)
+    up = np.array([1.0, 0.0, 0.0]) if abs(normal[0]) < _Z_ALIGNED else np.array([0.0, 1.0, 0.0])
+    rows = _unit(up - (up @ normal) * normal)
+    cols = np.cross(rows, normal)
+    if cols[2] < -1e-9 or (abs(cols[2]) <= 1e-9 and cols[1] < 0):
+        cols = -cols
+    return rows, cols
+
+
+def volume_center(shape, spacing):
+    return (np.asarray(shape) - 1) * np.asarray(spacing, dtype=np.float64) / 2.0
+
+
+def orthogonal_plane(plane, index, shape, spacing):
+    """
+    (center_mm, normal) of an axial/coronal/sagittal plane through voxel
+    'index' along its axis.
+    """
+    axis = ORTHOGONAL_AXES[plane]
+    if not 0 <= index < shape[axis]:
+        raise ValueError(f"index out of range (0..{shape[axis] - 1})")
+    center = volume_center(shape, spacing)
+    center[axis] = index * spacing[axis]
+    normal = np.zeros(3)
+    normal[axis] = 1.0
+    return center, normal
+
+
+def _extent(shape, spacing, center, direction):
+    """
+    Offsets (mm) from 'center' along 'direction' covered by the volume.
+    """
+    corners = np.array(np.meshgrid(*[[0, n - 1] for n in shape], indexing="ij")).reshape(3, -1).T
+    offsets = (corners * np.asarray(spacing) - center) @ direction
+    return offsets.min(), offsets.max()
+
+
+def sample_trilinear(volume, coords, fill):
+    """
+    Values of 'volume' at the fractional voxel indices 'coords' (one float
+    array per axis, all of the same shape), 'fill' outside the volume.
+    Returns float32 of that shape.
+    """
+    shape = volume.shape
+    inside = np.ones(coords[0].shape, dtype=bool)
+    for axis in range(3):
+        # The tolerance keeps points on the volume's faces despite rounding.
+        inside &= coords[axis] >= -1e-3
+        inside &= coords[axis] <= shape[axis] - 1 + 1e-3
+    result = np.full(coords[0].shape, fill, dtype=np.float32)
+    if not inside.any():
+        return result
+    # Oblique planes are often half outside the volume: interpolate only
+    # the points inside.
+    points = np.flatnonzero(inside)
+
+    # Per axis: the lower voxel index and, unless the plane only crosses
+    # that axis on voxel centers (orthogonal planes), the weight of the
+    # upper one. An axial plane is then one gather, a coronal or sagittal
+    # plane two, an oblique plane eight.
+    start = np.zeros(len(points), dtype=np.intp)
+    weights = []
+    stride = 1
+    for axis in (2, 1, 0):
+        n = shape[axis]
+        c = np.clip(coords[axis].reshape(-1)[points], 0, n - 1)
+        base = np.minimum(c.astype(np.intp), max(n - 2, 0))
+        frac = (c - base).astype(np.float32)
+        start += base * stride
+        weights.insert(0, (stride, frac) if frac.any() else None)
+        stride *= n
+
+    flat = volume.reshape(-1)
+
+    def interpolate(axis, offset):
+        if axis == 3:
+            return np.take(flat, start + offset).astype(np.float32)
+        low = interpolate(axis + 1, offset)
+        if weights[axis] is None:
+            return low
+        step, frac = weights[axis]
+        high = interpolate(axis + 1, offset + step)
+        high -= low
+        high *= frac
+        low += high
+        return low
+
+    result.reshape(-1)[points] = interpolate(0, 0)
+    return result
+
+
+def _plane_box(coords, shape):
+    """
+    Voxel box (tuple of slices) holding every voxel the trilinear sampling
+    of 'coords' can touch; at least one voxel per axis.
+    """
+    box = []
+    for c, n in zip(coords, shape):
+        start = min(max(int(np.floor(c.min())), 0), n - 1)
+        stop = min(max(int(np.ceil(c.max())) + 1, start + 1), n)
+        box.append(slice(start, stop))
+    return tuple(box)
+
+
+def reformat(volume, spacing, center, normal, pixel_mm=None, size=None, fill=0):
+    """
+    Resamples the plane through 'center' (mm) with 'normal' (see the module
+    docstring for the frame), cropped to the volume's footprint on it.
+    'volume' is an array or a ChunkedVolume.
+    'pixel_mm' defaults to the smallest voxel spacing; 'size' caps the
+    longest side in pixels (MPR_MAX_SIZE at most).
+    Returns (image int16, geometry dict with the pixel spacing and the
+    mm position and directions of the image's first pixel, rows and columns).
+    """
+    spacing = np.asarray(spacing, dtype=np.float64)
+    center = np.asarray(center, dtype=np.float64)
+    rows_dir, cols_dir = plane_axes(normal)
+    row_min, row_max = _extent(volume.shape, spacing, center, rows_dir)
+    col_min, col_max = _extent(volume.shape, spacing, center, cols_dir)
+
+    pixel_mm = float(pixel_mm or spacing.min())
+    limit = min(int(size or MPR_MAX_SIZE), MPR_MAX_SIZE)
+    longest = max(row_max - row_min, col_max - col_min)
+    if longest / pixel_mm + 1 > limit:
+        pixel_mm = longest / max(limit - 1, 1)
+    # Small epsilon so spans that are an exact multiple of the pixel keep
+    # their last row/column.
+    height = int(np.floor((row_max - row_min) / pixel_mm + 1e-6)) + 1
+    width = int(np.floor((col_max - col_min) / pixel_mm + 1e-6)) + 1
+
+    origin = center + row_min * rows_dir + col_min * cols_dir
+    r = np.arange(height)[:, None] * pixel_mm
+    c = np.arange(width)[None, :] * pixel_mm
+    coords = [(origin[axis] + r * rows_dir[axis] + c * cols_dir[axis]) / spacing[axis] for axis in range(3)]
+    if not isinstance(volume, np.ndarray):
+        # Chunked volume: read only the box the plane passes through.
+        box = _plane_box(coords, volume.shape)
+        volume = volume[box]
+        coords = [coords[axis] - box[axis].start for axis in range(3)]
+    values = sample_trilinear(volume, coords, fill)
+    image = np.rint(values, out=values).astype(np.int16)
+    return image, {
+        "pixel_spacing_mm": [pixel_mm, pixel_mm],
+        "origin_mm": origin.tolist(),
+        # + 0.0 turns -0.0 into 0.0.
+        "row_direction": (rows_dir + 0.0).tolist(),
+        "column_direction": (cols_dir + 0.0).tolist(),
+        "normal": (_unit(normal) + 0.0).tolist(),
+    }
@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+# Default display window (HU) for the grayscale background of previews.
+PREVIEW_WINDOW_CENTER = 400
+PREVIEW_WINDOW_WIDTH = 1800
+# Overlay colour (BGR) and opacity for voxels inside the threshold range.
+OVERLAY_COLOR = np.array([0, 0, 255], dtype=np.uint16)
+OVERLAY_ALPHA = 0.5
+
+
+def window_gray(image_hu, window_center=PREVIEW_WINDOW_CENTER, window_width=PREVIEW_WINDOW_WIDTH):
+    """
+    HU image -> uint8 grayscale through a display window.
+    """
+    window_width = max(float(window_width), 1.0)
+    low = window_center - window_width / 2.0
+    gray = (image_hu.astype(np.float32) - low) * (255.0 / window_width)
+    return np.clip(gray, 0, 255).astype(np.uint8)
+
+
+def encode_png(image):
+    ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise ValueError("Failed to encode preview image")
+    return encoded.tobytes()
+
+
+def render_threshold_preview(image_hu, lower_hu, upper_hu,
+                             window_center=PREVIEW_WINDOW_CENTER,
+                             window_width=PREVIEW_WINDOW_WIDTH):
+    """
+    Renders one HU slice as a windowed grayscale image with the voxels in
+    [lower_hu, upper_hu] blended in the overlay colour.
+    Returns PNG bytes; nothing is written to disk.
+    """
+    gray = window_gray(image_hu, window_center, window_width)
+
+    mask = (image_hu >= lower_hu) & (image_hu <= upper_hu)
+    bgr = np.repeat(gray[:, :, None], 3, axis=2)
+    alpha = int(OVERLAY_ALPHA * 256)
+    blended = (bgr.astype(np.uint16) * (256 - alpha) + OVERLAY_COLOR * alpha) >> 8
+    bgr = np.where(mask[:, :, None], blended.astype(np.uint8), bgr)
+
+    return encode_png(bgr)
@@ -0,0 +1,193 @@
+"""
+Opt-in profiling of the segmentation and reconstruction views.
+
+A request is profiled when it asks for it with ?profile=1 (physicians and
+admins only), or when it is picked by sampling: settings.PROFILE_SAMPLE_PERCENT
+percent of the requests to these views are profiled automatically.
+
+A profiled request runs under cProfile and tracemalloc, and the pipeline
+stages it goes through (metrics.stage) are recorded as a timeline. The result
+is saved as a ZIP under MEDIA_ROOT/profiles/:
+- profile.prof: the cProfile stats (pstats / snakeviz can open it)
+- summary.json: wall time, the timeline, tracemalloc peak and top
+  allocations, and the top functions by cumulative time
+
+and recorded as a ProfileArtifact linked to the SegmentationRecord the
+request created or worked on. The response carries its id in X-Profile-Id.
+
+tracemalloc slows the request down several times, so this is meant for a
+small sample or for the one study that is slow. cProfile only sees the
+request's own thread: work done in the per-bone process pool shows up as
+time spent waiting for it. Only one request is profiled at a time per
+process; others that would be profiled meanwhile run normally.
+"""
+import cProfile
+import json
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import zipfile
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import metrics
+
+PROFILES_SUBDIR = "profiles"
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# Stack depth kept per allocation; 1 is enough to group by line.
+TRACEMALLOC_FRAMES = 1
+
+_profiling = threading.Lock()
+
+
+def can_profile(user):
+    """
+    Physicians and admins (staff) may ask for a profile.
+    """
+    if user.is_staff or user.is_superuser:
+        return True
+    profile = getattr(user, "userprofile", None)
+    return profile is not None and profile.role.lower() == "physician"
+
+
+def _requested(request):
+    return request.GET.get("profile", "").lower() in ("1", "true", "yes")
+
+
+def _sampled():
+    percent = getattr(settings, "PROFILE_SAMPLE_PERCENT", 0)
+    return percent > 0 and random.random() * 100 < percent
+
+
+def _segmentation_id(response, kwargs):
+    """
+    The segmentation a view's response refers to: the one it created
+    (segment_images, resegment_images) or the one in the URL.
+    """
+    if isinstance(response, JsonResponse):
+        try:
+            body = json.loads(response.content)
+        except ValueError:
+            body = {}
+        for key in ("new_segmentation_id", "segmentation_id"):
+            if isinstance(body.get(key), int):
+                return body[key]
+    return kwargs.get("segmentation_id")
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({"function": f"{filename}:{line}({function})", "calls": calls,
+                     "tottime_s": round(tottime, 6), "cumtime_s": round(cumtime, 6)})
+    rows.sort(key=lambda row: row["cumtime_s"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _top_allocations(snapshot):
+    return [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+
+
+def _write_artifact(path, profiler, summary):
+    profiler.create_stats()
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # Same bytes as profiler.dump_stats() would write.
+        archive.writestr("profile.prof", marshal.dumps(profiler.stats))
+        archive.writestr("summary.json", json.dumps(summary, indent=2))
+
+
+def _run_profiled(view, request, args, kwargs, user, sampled):
+    from .models import ProfileArtifact, SegmentationRecord
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    with metrics.timeline() as events:
+        profiler.enable()
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            profiler.disable()
+    wall_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    segmentation_id = _segmentation_id(response, kwargs)
+    segmentation = SegmentationRecord.objects.filter(id=segmentation_id).first() if segmentation_id else None
+    view_name = view.__name__
+    summary = {
+        "view": view_name,
+        "path": request.get_full_path(),
+        "status": response.status_code,
+        "segmentation_id": segmentation.id if segmentation else None,
+        "sampled": sampled,
+        "wall_time_s": round(wall_time, 6),
+        "timeline": events,
+        "tracemalloc_peak_bytes": peak,
+        "top_allocations": _top_allocations(snapshot),
+        "top_functions": _top_functions(profiler),
+    }
+
+    folder = os.path.join(settings.MEDIA_ROOT, PROFILES_SUBDIR)
+    os.makedirs(folder, exist_ok=True)
+    timestamp_str = timezone.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = os.path.join(folder, f"{view_name}_{timestamp_str}.zip")
+    _write_artifact(path, profiler, summary)
+
+    artifact = ProfileArtifact.objects.create(
+        segmentation=segmentation,
+        user=user,
+        view=view_name,
+        path=path,
+        status_code=response.status_code,
+        wall_time_s=wall_time,
+        peak_memory_bytes=peak,
+        sampled=sampled,
+    )
+    response["X-Profile-Id"] = str(artifact.id)
+    return response
+
+
+def profiled(view):
+    """
+    Decorator for the views that may be profiled (see the module docstring).
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        requested = _requested(request)
+        sampled = not requested and _sampled()
+        if not (requested or sampled):
+            return view(request, *args, **kwargs)
+
+        from .views import decode_jwt_token
+        user, _ = decode_jwt_token(request)
+        if user is None or not can_profile(user):
+            if requested and user is not None:
+                return JsonResponse({"error": "Only physicians and admins can profile requests."}, status=403)
+            # Unauthenticated: let the view answer with its own 401.
+            return view(request, *args, **kwargs)
+
+        if not _profiling.acquire(blocking=False):
+            return view(request, *args, **kwargs)
+        try:
+            return _run_profiled(view, request, args, kwargs, user, sampled)
+        finally:
+            _profiling.release()
+
+    return wrapper
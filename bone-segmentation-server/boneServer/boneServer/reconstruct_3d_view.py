@@ -2,24 +2,24 @@ import os
 import json
 import shutil
 
-import numpy as np
-import pydicom
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 import jwt as pyjwt
 from django.conf import settings
 from django.contrib.auth.models import User
-from scipy.ndimage import binary_closing, gaussian_filter
-from .models import SegmentationRecord
-from skimage.measure import marching_cubes
+from .models import BoneMesh, SegmentationRecord
+from .profiling import profiled
+from .scheduler import BATCH, OverBudget, SchedulerBusy, busy_response, over_budget_response, task
 
-try:
-    import trimesh
-    from trimesh.smoothing import filter_taubin
-    HAS_TRIMESH = True
-except ImportError:
-    HAS_TRIMESH = False
+
+def __getattr__(name):
+    # The reconstruction code (scipy, skimage, trimesh) lives in .reconstruction
+    # and is only imported when a reconstruction actually runs.
+    if name in ("do_3d_reconstruction", "HAS_TRIMESH"):
+        from . import reconstruction
+        return getattr(reconstruction, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def decode_jwt_token(request):
     """
@@ -46,15 +46,37 @@ def decode_jwt_token(request):
         return None, "Invalid token"
 
 @csrf_exempt
+@profiled
 def reconstruct_3d_view(request, segmentation_id):
     """
     POST /reconstruct-3d/<segmentation_id>/
-    Body: { "iso_level": 0.5 }  # optional
+    Body (all optional):
+      { "iso_level": 0.5,
+        "smoothing": "gaussian",      # "gaussian" | "sdf" | "none"
+        "smoothing_sigma": 0.75,      # mm
+        "taubin_iterations": 0,       # extra mesh-space smoothing passes
+        "algorithm": "marching_cubes",  # "marching_cubes" | "surface_nets"
+        "closing_radius": 1.0,        # mm, 3D closing before meshing (0 = off)
+        "opening_radius": 0.0,        # mm, 3D opening (0 = off)
+        "fill_holes": true,           # fill cavities enclosed by bone
+        "min_speck_voxels": 64,       # drop smaller connected components
+        "per_bone": false,            # one STL per bone (see below)
+        "separate_touching": false,   # per_bone: watershed split of touching bones
+        "split_distance": 10.0,       # per_bone: mm between watershed seeds
+        "min_bone_voxels": 500,       # per_bone: smaller labels are dropped
+        "workers": null }             # per_bone: meshing processes (default: CPUs)
 
     - Reconstructs a 3D STL model from segmented DICOMs
     - Saves STL in MEDIA_ROOT/stl_models/
     - Stores URL path in SegmentationRecord.three_d_model_path
     - Returns JSON with the model's HTTP-accessible URL
+    - With per_bone, every bone is also meshed on its own, saved under
+      MEDIA_ROOT/stl_models/bones_<id>_<timestamp>/ and stored as BoneMesh
+      rows (replacing earlier ones); three_d_model_path is all bones combined.
+    - Admitted by estimated peak memory (admission.py): within the budget
+      it runs in memory, or streaming when only that fits, otherwise it
+      waits; over the whole budget it gets a 413. "memory" in the response
+      reports the mode and estimate.
     """
     if request.method != "POST":
         return JsonResponse({"error": "Only POST allowed"}, status=405)
@@ -69,7 +91,14 @@ def reconstruct_3d_view(request, segmentation_id):
         data = json.loads(request.body)
     except (json.JSONDecodeError, TypeError):
         data = {}
-    iso_level = float(data.get("iso_level", 0.5))
+    from .reconstruction import parse_bone_options, parse_flag, parse_mesh_options
+    try:
+        per_bone = parse_flag(data, "per_bone", False)
+        iso_level, mesh_options = parse_mesh_options(data)
+        if per_bone:
+            mesh_options.update(parse_bone_options(data))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid reconstruction parameters: {e}"}, status=400)
 
     try:
         seg_record = SegmentationRecord.objects.get(id=segmentation_id)
@@ -80,6 +109,28 @@ def reconstruct_3d_view(request, segmentation_id):
     if not os.path.isdir(segmented_folder):
         return JsonResponse({"error": f"Segmented folder not found: {segmented_folder}"}, status=400)
 
+    # Admitted in memory, streaming or not at all by its estimated peak memory
+    # (admission.py), before the previous model is touched.
+    from .admission import reconstruction_options
+    try:
+        memory = reconstruction_options(segmented_folder, mesh_options, mesh_options if per_bone else None)
+    except (FileNotFoundError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    try:
+        with task(BATCH, current_user.id, memory=memory) as admitted:
+            return _reconstruct(seg_record, iso_level, per_bone, mesh_options, admitted)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except OverBudget as e:
+        return over_budget_response(e)
+
+
+def _reconstruct(seg_record, iso_level, per_bone, mesh_options, admitted):
+    """
+    The reconstruction itself, in the mode the request was admitted with.
+    """
+    from .admission import STREAMING, describe
+
     timestamp_str = timezone.now().strftime("%Y%m%d_%H%M%S")
     stl_filename = f"3D_model_{seg_record.id}_{timestamp_str}.stl"
     stl_dir = os.path.join(settings.MEDIA_ROOT, 'stl_models')
@@ -92,7 +143,16 @@ def reconstruct_3d_view(request, segmentation_id):
             os.remove(old_stl)
 
 
-    success, msg = do_3d_reconstruction(segmented_folder, iso_level, stl_path)
+    # ROI segmentations only contain part of the series; keep the STL in the
+    # full series' frame.
+    mesh_options["slice_offset"] = (seg_record.roi or {}).get("slice_start") or 0
+    if per_bone:
+        return _reconstruct_per_bone(seg_record, iso_level, stl_path, stl_filename, timestamp_str, mesh_options,
+                                     admitted)
+
+    from .reconstruction import do_3d_reconstruction, do_streaming_reconstruction
+    reconstruct = do_streaming_reconstruction if admitted[0] == STREAMING else do_3d_reconstruction
+    success, msg = reconstruct(seg_record.output_folder_path, iso_level, stl_path, **mesh_options)
     if not success:
         return JsonResponse({"error": msg}, status=500)
 
@@ -103,58 +163,80 @@ def reconstruct_3d_view(request, segmentation_id):
     return JsonResponse({
         "message": "3D reconstruction completed",
         "three_d_model_url": stl_web_url,
+        "memory": describe(admitted),
     }, status=200)
 
 
+def _bone_mesh_data(bone):
+    return {
+        "label": bone.label,
+        "stl_url": bone.stl_path,
+        "voxel_count": bone.voxel_count,
+        "volume_mm3": bone.volume_mm3,
+    }
+
+
+def _reconstruct_per_bone(seg_record, iso_level, stl_path, stl_filename, timestamp_str, mesh_options, admitted):
+    from .admission import describe
+    from .reconstruction import do_per_bone_reconstruction
+    bone_dirname = f"bones_{seg_record.id}_{timestamp_str}"
+    bone_dir = os.path.join(settings.MEDIA_ROOT, 'stl_models', bone_dirname)
+    success, result = do_per_bone_reconstruction(seg_record.output_folder_path, iso_level, stl_path,
+                                                  bone_dir, **mesh_options)
+    if not success:
+        return JsonResponse({"error": result}, status=500)
+
+    old_dirs = {
+        os.path.dirname(os.path.join(settings.MEDIA_ROOT, old_bone.stl_path.replace(settings.MEDIA_URL, "")))
+        for old_bone in seg_record.bone_meshes.all()
+    }
+    for old_dir in old_dirs - {bone_dir}:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    seg_record.bone_meshes.all().delete()
+    bones = BoneMesh.objects.bulk_create([
+        BoneMesh(
+            segmentation=seg_record,
+            label=bone["label"],
+            stl_path=f"{settings.MEDIA_URL}stl_models/{bone_dirname}/{os.path.basename(bone['stl_path'])}",
+            voxel_count=bone["voxel_count"],
+            volume_mm3=bone["volume_mm3"],
+        )
+        for bone in result
+    ])
+
+    stl_web_url = f"{settings.MEDIA_URL}stl_models/{stl_filename}"
+    seg_record.three_d_model_path = stl_web_url
+    seg_record.save()
+
+    return JsonResponse({
+        "message": "3D reconstruction completed",
+        "three_d_model_url": stl_web_url,
+        "bones": [_bone_mesh_data(bone) for bone in bones],
+        "memory": describe(admitted),
+    }, status=200)
+
 
-def do_3d_reconstruction(folder_path, iso_level, save_stl):
+@csrf_exempt
+def list_bone_meshes(request, segmentation_id):
     """
-    Calls your existing reconstruction logic.
-    Returns (True, "success_message") or (False, "error_message")
+    GET /bone-meshes/<segmentation_id>/
+    Lists the per-bone STLs of the latest per-bone reconstruction.
     """
-    if not HAS_TRIMESH:
-        return (False, "trimesh not installed. Please install it to save STL.")
-    if not os.path.exists(folder_path):
-        return (False, f"Folder does not exist: {folder_path}")
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+    if not current_user.userprofile.role.lower() == "physician":
+        return JsonResponse({"error": "Only physicians can view bone meshes."}, status=403)
 
     try:
-        dcm_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(".dcm")]
-        if not dcm_files:
-            return (False, f"No DICOM files found in {folder_path}")
-        def get_instance_number(fp):
-            ds = pydicom.dcmread(fp, stop_before_pixels=True)
-            return int(ds.InstanceNumber) if 'InstanceNumber' in ds else 0
-        dcm_files.sort(key=get_instance_number)
-        datasets = [pydicom.dcmread(fp) for fp in dcm_files]
-        first_ds = datasets[0]
-        rows, cols = first_ds.pixel_array.shape
-        num_slices = len(datasets)
-
-        volume_3d = np.zeros((num_slices, rows, cols), dtype=np.float32)
-        for i, ds in enumerate(datasets):
-            arr = ds.pixel_array.astype(np.float32)
-            print("ARRAY MIN:", arr.min(), "MAX:", arr.max())
-            arr_binary = (arr > 1).astype(np.float32)
-            volume_3d[i] = arr_binary
-        
-        volume_3d = binary_closing(volume_3d, structure=np.ones((1, 1, 1)))
-            
-        try:
-            dz = float(first_ds.SliceThickness)
-        except:
-            dz = float(first_ds.SpacingBetweenSlices)
-        dy, dx = [float(val) for val in first_ds.PixelSpacing]
-        spacing = (dz, dy, dx)
-        verts, faces, norms, vals = marching_cubes(volume_3d, 
-                                                   level=iso_level, 
-                                                   spacing=spacing,
-                                                   step_size=1)
-        
-        mesh = trimesh.Trimesh(vertices=verts, faces=faces, vertex_normals=norms)
-        components = mesh.split(only_watertight=False)
-        largest_component = max(components, key=lambda m: m.area)
-        filter_taubin(largest_component, lamb=0.5, nu=-0.53, iterations=10)
-        largest_component.export(save_stl)
-        return (True, f"STL saved to {save_stl}")
-    except Exception as e:
-        return (False, str(e))
+        seg_record = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation record not found"}, status=404)
+
+    return JsonResponse({
+        "segmentation_id": seg_record.id,
+        "bones": [_bone_mesh_data(bone) for bone in seg_record.bone_meshes.all()],
+    }, status=200)
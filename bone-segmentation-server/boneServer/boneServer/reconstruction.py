@@ -0,0 +1,521 @@
+"""
+3D reconstruction core: segmented DICOM folder -> STL.
+
+Imports scipy, scikit-image and trimesh, so it is only imported by
+reconstruct_3d_view when a reconstruction request comes in.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.ndimage import find_objects
+from skimage.measure import marching_cubes
+
+from . import metrics
+from .scheduler import checkpoint
+from .chunked_volume import VOLUME_CHUNKS_DIRNAME, open_chunked_volume
+from .roi import bounding_box, box_offset
+from .labeling import DEFAULT_MIN_BONE_VOXELS, DEFAULT_SPLIT_DISTANCE_MM, label_bones
+from .morphology import (DEFAULT_CLOSING_RADIUS_MM, DEFAULT_FILL_HOLES, DEFAULT_MIN_SPECK_VOXELS,
+                         DEFAULT_OPENING_RADIUS_MM, clean_mask)
+from .smoothing import DEFAULT_SMOOTHING, DEFAULT_SMOOTHING_SIGMA_MM, SMOOTHING_METHODS, smooth_mask
+from .surface_nets import surface_nets
+from .volume_cache import load_hu_volume
+
+try:
+    import trimesh
+    from trimesh.smoothing import filter_taubin
+    HAS_TRIMESH = True
+except ImportError:
+    HAS_TRIMESH = False
+
+SURFACE_ALGORITHMS = ("marching_cubes", "surface_nets")
+DEFAULT_SURFACE_ALGORITHM = "marching_cubes"
+# Background voxels kept around the bone bounding box: covers the Gaussian
+# support (scipy truncates at 4 sigma) plus one voxel so the surface closes.
+CROP_TRUNCATE_SIGMAS = 4.0
+# Streaming reconstruction (do_streaming_reconstruction): slices smoothed and
+# meshed at a time, the smoothing methods whose field is local (the signed
+# distance field is not), and faces per STL write.
+STREAM_SLAB_SLICES = 32
+STREAMING_SMOOTHING = ("gaussian", "none")
+STL_WRITE_FACES = 1 << 20
+# The mesh and bone options label_mask() takes.
+LABEL_OPTIONS = ("closing_radius", "opening_radius", "fill_holes", "min_speck_voxels",
+                 "separate_touching", "split_distance", "min_bone_voxels")
+
+
+def load_mask_volume(folder_path):
+    """
+    Reads a segmented series (sorted by InstanceNumber) into a boolean bone
+    mask (slices, rows, cols). Segmentation stores HU 0 outside the bone, so
+    the mask is every voxel whose HU is non-zero. Read from the folder's
+    chunked volume when it has one (only the chunks holding bone), else
+    decoded from the DICOMs through the shared volume cache.
+    Returns (mask, spacing) or raises FileNotFoundError when there are no DICOMs.
+    """
+    chunked = open_chunked_volume(os.path.join(folder_path, VOLUME_CHUNKS_DIRNAME))
+    if chunked is not None:
+        mask = np.zeros(chunked.shape, dtype=bool)
+        box = chunked.stored_box()
+        if box is not None:
+            mask[box] = chunked.read(box) != 0
+        return mask, chunked.spacing
+    volume, _, spacing = load_hu_volume(folder_path, process_cache=False)
+    return volume != 0, spacing
+
+
+def load_mask_box(folder_path, smoothing=DEFAULT_SMOOTHING, smoothing_sigma=DEFAULT_SMOOTHING_SIGMA_MM):
+    """
+    The bone mask cropped as mesh_from_mask crops it: the bone's bounding
+    box grown by crop_padding() and clipped to the volume. From the chunked
+    volume only that box is read, without allocating the whole volume.
+    Returns (mask, spacing, box) with 'box' in volume coordinates; raises
+    FileNotFoundError when there are no DICOMs, ValueError for an empty mask.
+    """
+    chunked = open_chunked_volume(os.path.join(folder_path, VOLUME_CHUNKS_DIRNAME))
+    if chunked is None:
+        mask, spacing = load_mask_volume(folder_path)
+        outer = tuple(slice(0, n) for n in mask.shape)
+        padding = crop_padding(spacing, smoothing, smoothing_sigma)
+    else:
+        spacing = chunked.spacing
+        padding = crop_padding(spacing, smoothing, smoothing_sigma)
+        stored = chunked.stored_box()
+        if stored is None:
+            raise ValueError("Segmentation mask is empty.")
+        # Everything outside the stored chunks is background, so growing them
+        # by the padding gives the same bounding box as the whole volume.
+        outer = tuple(slice(max(s.start - p, 0), min(s.stop + p, n))
+                      for s, p, n in zip(stored, padding, chunked.shape))
+        mask = chunked.read(outer) != 0
+    box = bounding_box(mask, padding=padding)
+    if box is None:
+        raise ValueError("Segmentation mask is empty.")
+    return mask[box], spacing, tuple(slice(o.start + b.start, o.start + b.stop) for o, b in zip(outer, box))
+
+
+def parse_flag(data, name, default):
+    """
+    Reads a boolean option: a JSON bool or "true"/"false"/"1"/"0". Raises
+    ValueError on anything else, so "false" does not count as set.
+    """
+    value = data.get(name, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in ("true", "false", "1", "0"):
+        return value.lower() in ("true", "1")
+    raise ValueError(f"{name} must be true or false")
+
+
+def parse_mesh_options(data):
+    """
+    Reads iso_level and the mesh_from_mask options from a request payload,
+    falling back to the defaults. Returns (iso_level, options); raises
+    ValueError on invalid values.
+    """
+    options = {
+        "smoothing": data.get("smoothing", DEFAULT_SMOOTHING),
+        "smoothing_sigma": float(data.get("smoothing_sigma", DEFAULT_SMOOTHING_SIGMA_MM)),
+        "taubin_iterations": int(data.get("taubin_iterations", 0)),
+        "algorithm": data.get("algorithm", DEFAULT_SURFACE_ALGORITHM),
+        "closing_radius": float(data.get("closing_radius", DEFAULT_CLOSING_RADIUS_MM)),
+        "opening_radius": float(data.get("opening_radius", DEFAULT_OPENING_RADIUS_MM)),
+        "fill_holes": parse_flag(data, "fill_holes", DEFAULT_FILL_HOLES),
+        "min_speck_voxels": int(data.get("min_speck_voxels", DEFAULT_MIN_SPECK_VOXELS)),
+    }
+    if options["smoothing"] not in SMOOTHING_METHODS:
+        raise ValueError(f"smoothing must be one of {list(SMOOTHING_METHODS)}")
+    if options["algorithm"] not in SURFACE_ALGORITHMS:
+        raise ValueError(f"algorithm must be one of {list(SURFACE_ALGORITHMS)}")
+    if options["closing_radius"] < 0 or options["opening_radius"] < 0 or options["smoothing_sigma"] < 0:
+        raise ValueError("radii and smoothing_sigma must be >= 0")
+    return float(data.get("iso_level", 0.5)), options
+
+
+def parse_bone_options(data):
+    """
+    Reads the per-bone (labeled) reconstruction options from a request
+    payload. Raises ValueError on invalid values.
+    """
+    options = {
+        "separate_touching": parse_flag(data, "separate_touching", False),
+        "split_distance": float(data.get("split_distance", DEFAULT_SPLIT_DISTANCE_MM)),
+        "min_bone_voxels": int(data.get("min_bone_voxels", DEFAULT_MIN_BONE_VOXELS)),
+        "workers": data.get("workers"),
+    }
+    if options["workers"] is not None:
+        options["workers"] = int(options["workers"])
+        if options["workers"] < 1:
+            raise ValueError("workers must be >= 1")
+    if options["split_distance"] <= 0:
+        raise ValueError("split_distance must be > 0")
+    return options
+
+
+def extract_surface(field, level, spacing, algorithm=DEFAULT_SURFACE_ALGORITHM):
+    """
+    Iso-surface of 'field' at 'level'. Returns (verts, faces, normals or None).
+    """
+    if algorithm == "surface_nets":
+        verts, faces = surface_nets(field, level=level, spacing=spacing)
+        return verts, faces, None
+    if algorithm != "marching_cubes":
+        raise ValueError(f"Unknown surface algorithm '{algorithm}', expected one of {SURFACE_ALGORITHMS}")
+    verts, faces, norms, vals = marching_cubes(field,
+                                               level=level,
+                                               spacing=spacing,
+                                               step_size=1)
+    return verts, faces, norms
+
+
+def crop_padding(spacing, smoothing, smoothing_sigma):
+    """
+    Per-axis padding (voxels) for cropping a mask to its bounding box.
+    """
+    if smoothing == "none":
+        return (1, 1, 1)
+    return tuple(int(np.ceil(CROP_TRUNCATE_SIGMAS * smoothing_sigma / float(d))) + 1 for d in spacing)
+
+
+def mesh_from_mask(mask, spacing, iso_level=0.5, smoothing=DEFAULT_SMOOTHING,
+                   smoothing_sigma=DEFAULT_SMOOTHING_SIGMA_MM, taubin_iterations=0,
+                   algorithm=DEFAULT_SURFACE_ALGORITHM, slice_offset=0,
+                   closing_radius=DEFAULT_CLOSING_RADIUS_MM, opening_radius=DEFAULT_OPENING_RADIUS_MM,
+                   fill_holes=DEFAULT_FILL_HOLES, min_speck_voxels=DEFAULT_MIN_SPECK_VOXELS):
+    """
+    Binary mask -> trimesh of its largest connected surface (by area).
+    The mask is cropped to its bone bounding box first; vertex coordinates
+    are in the full volume's frame, shifted by 'slice_offset' slices when the
+    mask itself starts part-way through a series (ROI segmentations).
+    - smoothing: "gaussian" / "sdf" smooth the mask in voxel space so marching
+      cubes places vertices at sub-voxel positions; "none" meshes the raw
+      0/1 mask (staircase surface).
+    - smoothing_sigma: smoothing width in mm.
+    - taubin_iterations: optional mesh-space Taubin passes on top (0 = off).
+    - algorithm: "marching_cubes" or "surface_nets" (see surface_nets.py).
+    - closing_radius / opening_radius (mm), fill_holes, min_speck_voxels:
+      3D cleanup before meshing (see morphology.py).
+    """
+    box = bounding_box(mask, padding=crop_padding(spacing, smoothing, smoothing_sigma))
+    if box is None:
+        raise ValueError("Segmentation mask is empty.")
+    # Every stage below runs on the cropped view only.
+    with metrics.stage("cleanup"):
+        volume_3d = clean_mask(mask[box], spacing, closing_radius=closing_radius,
+                               opening_radius=opening_radius, fill_holes=fill_holes,
+                               min_speck_voxels=min_speck_voxels)
+    # Stage boundaries are where batch reconstructions yield to interactive work.
+    checkpoint()
+    with metrics.stage("smoothing"):
+        field, level = smooth_mask(volume_3d, spacing, method=smoothing,
+                                   sigma_mm=smoothing_sigma, iso_level=iso_level)
+    checkpoint()
+    with metrics.stage(algorithm):
+        verts, faces, norms = extract_surface(field, level, spacing, algorithm=algorithm)
+    verts = verts + box_offset(box, spacing)
+    verts[:, 0] += slice_offset * float(spacing[0])
+
+    checkpoint()
+    with metrics.stage("component_split"):
+        mesh = trimesh.Trimesh(vertices=verts, faces=faces, vertex_normals=norms)
+        components = mesh.split(only_watertight=False)
+        largest_component = max(components, key=lambda m: m.area)
+    if taubin_iterations > 0:
+        with metrics.stage("taubin"):
+            filter_taubin(largest_component, lamb=0.5, nu=-0.53, iterations=taubin_iterations)
+    return largest_component
+
+
+def _mesh_bone(job):
+    """
+    Worker for mesh_bones: one bone's padded sub-mask -> (label, verts, faces).
+    Module-level so it can be sent to a process pool.
+    """
+    bone, sub_mask, offset, spacing, iso_level, smoothing, smoothing_sigma, taubin_iterations, algorithm = job
+    field, level = smooth_mask(sub_mask, spacing, method=smoothing, sigma_mm=smoothing_sigma, iso_level=iso_level)
+    verts, faces, norms = extract_surface(field, level, spacing, algorithm=algorithm)
+    if taubin_iterations > 0:
+        mesh = trimesh.Trimesh(vertices=verts, faces=faces, vertex_normals=norms)
+        filter_taubin(mesh, lamb=0.5, nu=-0.53, iterations=taubin_iterations)
+        verts, faces = mesh.vertices, mesh.faces
+    return bone, np.asarray(verts) + offset, np.asarray(faces)
+
+
+def label_mask(mask, spacing, closing_radius=DEFAULT_CLOSING_RADIUS_MM, opening_radius=DEFAULT_OPENING_RADIUS_MM,
+               fill_holes=DEFAULT_FILL_HOLES, min_speck_voxels=DEFAULT_MIN_SPECK_VOXELS,
+               separate_touching=False, split_distance=DEFAULT_SPLIT_DISTANCE_MM,
+               min_bone_voxels=DEFAULT_MIN_BONE_VOXELS):
+    """
+    The bones of a binary mask as per-bone reconstruction labels them: the
+    mask is cropped to its bounding box, cleaned (see morphology.py) and
+    labeled (see labeling.py). Returns (labels, count, box), 'labels'
+    covering mask[box]; raises ValueError for an empty mask.
+    """
+    box = bounding_box(mask, padding=1)
+    if box is None:
+        raise ValueError("Segmentation mask is empty.")
+    with metrics.stage("cleanup"):
+        volume_3d = clean_mask(mask[box], spacing, closing_radius=closing_radius,
+                               opening_radius=opening_radius, fill_holes=fill_holes,
+                               min_speck_voxels=min_speck_voxels)
+    checkpoint()
+    with metrics.stage("labeling"):
+        labels, count = label_bones(volume_3d, spacing, separate_touching=separate_touching,
+                                    split_distance_mm=split_distance, min_bone_voxels=min_bone_voxels)
+    return labels, count, box
+
+
+def mesh_bones(mask, spacing, iso_level=0.5, smoothing=DEFAULT_SMOOTHING,
+               smoothing_sigma=DEFAULT_SMOOTHING_SIGMA_MM, taubin_iterations=0,
+               algorithm=DEFAULT_SURFACE_ALGORITHM, slice_offset=0,
+               closing_radius=DEFAULT_CLOSING_RADIUS_MM, opening_radius=DEFAULT_OPENING_RADIUS_MM,
+               fill_holes=DEFAULT_FILL_HOLES, min_speck_voxels=DEFAULT_MIN_SPECK_VOXELS,
+               separate_touching=False, split_distance=DEFAULT_SPLIT_DISTANCE_MM,
+               min_bone_voxels=DEFAULT_MIN_BONE_VOXELS, workers=None):
+    """
+    Binary mask -> one mesh per bone, as a list of dicts
+    {"label", "mesh", "voxel_count", "volume_mm3"} ordered by size.
+    Cleanup and labeling run once on the whole (cropped) mask; each bone is
+    then smoothed and meshed from its own padded bounding box, in parallel
+    across 'workers' processes (default: one per CPU). Labeling options are
+    described in labeling.py; the rest are as for mesh_from_mask.
+    """
+    labels, count, box = label_mask(mask, spacing, closing_radius=closing_radius,
+                                    opening_radius=opening_radius, fill_holes=fill_holes,
+                                    min_speck_voxels=min_speck_voxels, separate_touching=separate_touching,
+                                    split_distance=split_distance, min_bone_voxels=min_bone_voxels)
+    if count == 0:
+        raise ValueError("No bone large enough to mesh.")
+
+    origin = box_offset(box, spacing)
+    origin[0] += slice_offset * float(spacing[0])
+    pad = crop_padding(spacing, smoothing, smoothing_sigma)
+    voxel_counts = np.bincount(labels.ravel(), minlength=count + 1)
+    jobs = []
+    for bone, obj in enumerate(find_objects(labels), start=1):
+        # Zero padding (not clipping to the volume) so every bone surface closes.
+        sub_mask = np.pad(labels[obj] == bone, [(p, p) for p in pad])
+        offset = origin + np.array([(s.start - p) * float(d) for s, p, d in zip(obj, pad, spacing)])
+        jobs.append((bone, sub_mask, offset, spacing, iso_level, smoothing, smoothing_sigma,
+                     taubin_iterations, algorithm))
+
+    checkpoint()
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    # Smoothing and extraction run in the workers, so they are timed together.
+    with metrics.stage("bone_meshing"):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_mesh_bone, jobs))
+        else:
+            results = []
+            for job in jobs:
+                checkpoint()
+                results.append(_mesh_bone(job))
+
+    voxel_volume = float(np.prod(spacing))
+    return [{
+        "label": bone,
+        "mesh": trimesh.Trimesh(vertices=verts, faces=faces),
+        "voxel_count": int(voxel_counts[bone]),
+        "volume_mm3": round(float(voxel_counts[bone]) * voxel_volume, 3),
+    } for bone, verts, faces in results]
+
+
+def do_3d_reconstruction(folder_path, iso_level, save_stl, **mesh_options):
+    """
+    Segmented DICOM folder -> STL of the largest connected surface.
+    'mesh_options' are passed to mesh_from_mask (smoothing, algorithm, cleanup...).
+    Returns (True, "success_message") or (False, "error_message")
+    """
+    if not HAS_TRIMESH:
+        return (False, "trimesh not installed. Please install it to save STL.")
+    if not os.path.exists(folder_path):
+        return (False, f"Folder does not exist: {folder_path}")
+
+    try:
+        try:
+            with metrics.stage("mask_load"):
+                mask, spacing = load_mask_volume(folder_path)
+        except FileNotFoundError as e:
+            return (False, str(e))
+
+        mesh = mesh_from_mask(mask, spacing, iso_level=iso_level, **mesh_options)
+        with metrics.stage("stl_export"):
+            mesh.export(save_stl)
+        metrics.add_bytes("write", "stl", os.path.getsize(save_stl))
+        return (True, f"STL saved to {save_stl}")
+    except Exception as e:
+        return (False, str(e))
+
+
+def do_per_bone_reconstruction(folder_path, iso_level, save_stl, bone_dir, **options):
+    """
+    Segmented DICOM folder -> one STL per bone in 'bone_dir' (bone_<label>.stl)
+    plus all bones combined in 'save_stl'. 'options' are passed to mesh_bones.
+    Returns (True, [{"label", "stl_path", "voxel_count", "volume_mm3"}, ...])
+    or (False, "error_message").
+    """
+    if not HAS_TRIMESH:
+        return (False, "trimesh not installed. Please install it to save STL.")
+    if not os.path.exists(folder_path):
+        return (False, f"Folder does not exist: {folder_path}")
+
+    try:
+        try:
+            with metrics.stage("mask_load"):
+                mask, spacing = load_mask_volume(folder_path)
+        except FileNotFoundError as e:
+            return (False, str(e))
+
+        bones = mesh_bones(mask, spacing, iso_level=iso_level, **options)
+        os.makedirs(bone_dir, exist_ok=True)
+        with metrics.stage("stl_export"):
+            for bone in bones:
+                bone["stl_path"] = os.path.join(bone_dir, f"bone_{bone['label']:03d}.stl")
+                bone["mesh"].export(bone["stl_path"])
+                metrics.add_bytes("write", "stl", os.path.getsize(bone["stl_path"]))
+            trimesh.util.concatenate([bone.pop("mesh") for bone in bones]).export(save_stl)
+        metrics.add_bytes("write", "stl", os.path.getsize(save_stl))
+        return (True, bones)
+    except Exception as e:
+        return (False, str(e))
+
+
+def streaming_supported(smoothing=DEFAULT_SMOOTHING, algorithm=DEFAULT_SURFACE_ALGORITHM, taubin_iterations=0,
+                        **_):
+    """
+    Whether do_streaming_reconstruction() handles these mesh options.
+    """
+    return smoothing in STREAMING_SMOOTHING and algorithm == "marching_cubes" and not taubin_iterations
+
+
+def stream_surface(mask, spacing, iso_level=0.5, smoothing=DEFAULT_SMOOTHING,
+                   smoothing_sigma=DEFAULT_SMOOTHING_SIGMA_MM, slab_slices=STREAM_SLAB_SLICES):
+    """
+    Marching cubes surface of a (cleaned, cropped) mask, smoothed and
+    meshed 'slab_slices' slices at a time. Each slab is smoothed with enough
+    neighbouring slices around it that its field equals the whole-volume
+    field, so the surface is that of extract_surface(smooth_mask(mask))
+    while only one slab's field is in memory. Vertices on the plane two
+    slabs share are merged. Returns (verts in mm, faces).
+    """
+    if smoothing not in STREAMING_SMOOTHING:
+        raise ValueError(f"Streaming needs smoothing in {list(STREAMING_SMOOTHING)}")
+    context = crop_padding(spacing, smoothing, smoothing_sigma)[0]
+    slices = mask.shape[0]
+    verts, faces, count = [], [], 0
+    # Slab cells start..stop-1 span planes start..stop; neighbours share a plane.
+    for start in range(0, slices - 1, slab_slices):
+        checkpoint()
+        stop = min(start + slab_slices, slices - 1)
+        lo, hi = max(start - context, 0), min(stop + 1 + context, slices)
+        field, level = smooth_mask(mask[lo:hi], spacing, method=smoothing, sigma_mm=smoothing_sigma,
+                                   iso_level=iso_level)
+        slab = field[start - lo:stop + 1 - lo]
+        if not slab.min() < level < slab.max():
+            continue
+        slab_verts, slab_faces, _, _ = marching_cubes(slab, level=level, step_size=1)
+        slab_verts[:, 0] += start
+        verts.append(slab_verts)
+        faces.append(slab_faces + count)
+        count += len(slab_verts)
+    if not verts:
+        raise ValueError("Segmentation mask is empty.")
+    # In voxel units the shared planes' vertices are bit-identical in both slabs.
+    verts, inverse = np.unique(np.concatenate(verts), axis=0, return_inverse=True)
+    faces = inverse.reshape(-1)[np.concatenate(faces)]
+    return verts * np.asarray(spacing, dtype=np.float32), faces
+
+
+def largest_component(verts, faces):
+    """
+    The connected piece of surface with the largest area, as (verts, faces)
+    reindexed to the vertices it uses. Pieces touching at a single vertex
+    count as one.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    edges = (faces[:, :2].ravel(), faces[:, 1:].ravel())
+    graph = coo_matrix((np.ones(edges[0].size, dtype=np.int8), edges), shape=(len(verts),) * 2)
+    _, labels = connected_components(graph, directed=False)
+    face_labels = labels[faces[:, 0]]
+    corners = verts[faces]
+    areas = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    del corners
+    faces = faces[face_labels == np.argmax(np.bincount(face_labels, weights=areas))]
+    used, faces = np.unique(faces, return_inverse=True)
+    return verts[used], faces.reshape(-1, 3)
+
+
+_STL_RECORD = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
+
+
+def write_binary_stl(path, verts, faces):
+    """
+    Binary STL of a triangle mesh, written STL_WRITE_FACES faces at a time.
+    """
+    with open(path, "wb") as f:
+        f.write(b"bone-segmentation".ljust(80, b" "))
+        f.write(np.uint32(len(faces)).tobytes())
+        for start in range(0, len(faces), STL_WRITE_FACES):
+            corners = verts[faces[start:start + STL_WRITE_FACES]].astype(np.float32)
+            normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            records = np.zeros(len(corners), dtype=_STL_RECORD)
+            records["normal"] = normals / np.where(lengths > 0, lengths, 1)
+            records["vertices"] = corners
+            f.write(records.tobytes())
+
+
+def do_streaming_reconstruction(folder_path, iso_level, save_stl, smoothing=DEFAULT_SMOOTHING,
+                                smoothing_sigma=DEFAULT_SMOOTHING_SIGMA_MM, taubin_iterations=0,
+                                algorithm=DEFAULT_SURFACE_ALGORITHM, slice_offset=0,
+                                closing_radius=DEFAULT_CLOSING_RADIUS_MM, opening_radius=DEFAULT_OPENING_RADIUS_MM,
+                                fill_holes=DEFAULT_FILL_HOLES, min_speck_voxels=DEFAULT_MIN_SPECK_VOXELS,
+                                slab_slices=STREAM_SLAB_SLICES):
+    """
+    do_3d_reconstruction() in bounded memory, for the options
+    streaming_supported() accepts: only the bone's box of the mask is
+    loaded, the field is smoothed and meshed one slab at a time
+    (stream_surface), and the largest piece is picked and written with
+    numpy instead of trimesh. The STL holds the same surface.
+    Returns (True, "success_message") or (False, "error_message").
+    """
+    if not streaming_supported(smoothing, algorithm, taubin_iterations):
+        return (False, "Streaming reconstruction needs marching_cubes, gaussian or no smoothing "
+                       "and no Taubin passes.")
+    if not os.path.exists(folder_path):
+        return (False, f"Folder does not exist: {folder_path}")
+
+    try:
+        try:
+            with metrics.stage("mask_load"):
+                mask, spacing, box = load_mask_box(folder_path, smoothing, smoothing_sigma)
+        except FileNotFoundError as e:
+            return (False, str(e))
+
+        with metrics.stage("cleanup"):
+            volume_3d = clean_mask(mask, spacing, closing_radius=closing_radius,
+                                   opening_radius=opening_radius, fill_holes=fill_holes,
+                                   min_speck_voxels=min_speck_voxels)
+        del mask
+        with metrics.stage("streaming_surface"):
+            verts, faces = stream_surface(volume_3d, spacing, iso_level=iso_level, smoothing=smoothing,
+                                          smoothing_sigma=smoothing_sigma, slab_slices=slab_slices)
+        del volume_3d
+        verts = verts + box_offset(box, spacing)
+        verts[:, 0] += slice_offset * float(spacing[0])
+
+        checkpoint()
+        with metrics.stage("component_split"):
+            verts, faces = largest_component(verts, faces)
+        with metrics.stage("stl_export"):
+            write_binary_stl(save_stl, verts, faces)
+        metrics.add_bytes("write", "stl", os.path.getsize(save_stl))
+        return (True, f"STL saved to {save_stl}")
+    except Exception as e:
+        return (False, str(e))
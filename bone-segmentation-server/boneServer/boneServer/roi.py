@@ -0,0 +1,98 @@
+"""
+Regions of interest: tight bounding boxes of bone masks and explicit
+sub-volume requests for the segmentation endpoints.
+
+An explicit ROI is a dict with optional integer bounds (start inclusive,
+stop exclusive, None = unbounded):
+    {"slice_start", "slice_stop", "row_start", "row_stop", "col_start", "col_stop"}
+Slice indices refer to the series sorted by InstanceNumber. Bounds past
+the end of the series' volume are rejected (check_roi).
+"""
+import numpy as np
+
+ROI_KEYS = ("slice_start", "slice_stop", "row_start", "row_stop", "col_start", "col_stop")
+
+
+def parse_roi(value):
+    """
+    Validates an ROI from a request payload. Returns a normalized dict or
+    None when no ROI was given. Raises ValueError on bad input.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError("roi must be an object")
+    unknown = set(value) - set(ROI_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown roi fields: {sorted(unknown)}")
+    roi = {}
+    for key in ROI_KEYS:
+        bound = value.get(key)
+        if bound is not None:
+            bound = int(bound)
+            if bound < 0:
+                raise ValueError(f"roi.{key} must be >= 0")
+        roi[key] = bound
+    for axis in ("slice", "row", "col"):
+        start, stop = roi[f"{axis}_start"], roi[f"{axis}_stop"]
+        if start is not None and stop is not None and stop <= start:
+            raise ValueError(f"roi.{axis}_stop must be greater than roi.{axis}_start")
+    return roi
+
+
+def check_roi(roi, shape):
+    """
+    Raises ValueError unless every bound of 'roi' lies inside a volume of
+    'shape' (slices, rows, cols; or just (slices,) to check the slice range),
+    so no part of it is empty.
+    """
+    if roi is None:
+        return
+    for axis, size in zip(("slice", "row", "col"), shape):
+        start, stop = roi[f"{axis}_start"], roi[f"{axis}_stop"]
+        if start is not None and start >= size:
+            raise ValueError(f"roi.{axis}_start {start} is outside the volume's {size} {axis}s")
+        if stop is not None and stop > size:
+            raise ValueError(f"roi.{axis}_stop {stop} is outside the volume's {size} {axis}s")
+
+
+def roi_slices(roi):
+    """
+    Explicit ROI -> (slice range, in-plane (row, col) slices).
+    """
+    if roi is None:
+        return slice(None), (slice(None), slice(None))
+    return (
+        slice(roi["slice_start"], roi["slice_stop"]),
+        (slice(roi["row_start"], roi["row_stop"]), slice(roi["col_start"], roi["col_stop"])),
+    )
+
+
+def bounding_box(mask, padding=0):
+    """
+    Tight bounding box of the True voxels of a 3D mask, grown by 'padding'
+    voxels (an int or one per axis) and clipped to the volume.
+    Computed from per-axis projections instead of np.nonzero over the
+    whole volume. Returns a tuple of 3 slices, or None for an empty mask.
+    """
+    if np.ndim(padding) == 0:
+        padding = (int(padding),) * 3
+    # Two full passes: one projection onto the slice axis, one onto the plane.
+    plane = mask.any(axis=0)
+    projections = (mask.any(axis=(1, 2)), plane.any(axis=1), plane.any(axis=0))
+    box = []
+    for axis, projection in enumerate(projections):
+        hits = np.flatnonzero(projection)
+        if hits.size == 0:
+            return None
+        start = max(int(hits[0]) - padding[axis], 0)
+        stop = min(int(hits[-1]) + 1 + padding[axis], mask.shape[axis])
+        box.append(slice(start, stop))
+    return tuple(box)
+
+
+def box_offset(box, spacing):
+    """
+    Physical (z, y, x) offset of a bounding box's first voxel.
+    """
+    return np.array([s.start * float(d) for s, d in zip(box, spacing)], dtype=np.float64)
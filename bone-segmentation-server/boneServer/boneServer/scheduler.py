@@ -0,0 +1,316 @@
+"""
+Priority scheduling of the CPU-heavy work behind the views.
+
+Views run their imaging work inside `with task(priority, user):`.
+
+- Priority classes: INTERACTIVE (previews, MPR planes, frame fetches,
+  threshold stats: short, and someone is looking at a spinner) and BATCH
+  (segmentation, reconstruction). Each class has its own concurrency limit
+  (SCHEDULER_LIMITS), so batch work never holds the slots interactive
+  requests need.
+- Fair share: a freed slot goes to the waiter whose physician has the
+  fewest tasks of that class running, then to the one served least
+  recently, then first come first served. One physician's queue of
+  segmentations does not hold back another physician's.
+- Yielding: batch work calls checkpoint() between chunks (slices,
+  reconstruction stages). While interactive tasks are running or queued,
+  checkpoint() pauses the batch task, for at most SCHEDULER_MAX_YIELD_MS
+  per call, so batch work still makes progress under constant load.
+  It never pauses inside no_yield(), i.e. while holding a lock (such as a
+  shared cache entry being built) that an interactive task may be
+  blocked on.
+- Queue timeout: a task that waits longer than its class's
+  SCHEDULER_QUEUE_TIMEOUT_S raises SchedulerBusy; views answer 503
+  (busy_response) with a Retry-After header.
+- Memory budget: a task can reserve its estimated peak memory (see
+  admission.py) out of MEMORY_BUDGET_MB, given as options in order of
+  preference, e.g. [("in_memory", 3e9), ("streaming", 5e8)]. It gets the
+  first option that fits the memory free when it is its turn, and waits
+  while none does. A task that does not fit even the whole budget raises
+  OverBudget at once; views answer 413 (over_budget_response).
+
+Queue depth and running tasks per class are /metrics gauges, and wait and
+yield times are histograms. stats() returns the same numbers as a dict.
+
+State is per process, so this schedules the threads of one worker; with
+several worker processes each one schedules its own requests.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from . import metrics
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+DEFAULT_LIMITS = {INTERACTIVE: 4, BATCH: 2}
+DEFAULT_QUEUE_TIMEOUT_S = {INTERACTIVE: 30.0, BATCH: 900.0}
+DEFAULT_MAX_YIELD_MS = 200
+DEFAULT_RETRY_AFTER_S = 30
+MB = 1024 * 1024
+
+
+class SchedulerBusy(Exception):
+    """
+    The task waited longer than its queue timeout.
+    """
+
+
+class OverBudget(Exception):
+    """
+    The task's smallest memory estimate exceeds the whole memory budget.
+    """
+
+    def __init__(self, needed, budget):
+        super().__init__(f"Estimated peak memory {needed / MB:.0f} MB exceeds the budget of {budget / MB:.0f} MB")
+        self.needed = needed
+        self.budget = budget
+
+
+class Scheduler:
+    def __init__(self, limits=None, queue_timeouts=None, max_yield_ms=DEFAULT_MAX_YIELD_MS, memory_budget=None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.queue_timeouts = dict(DEFAULT_QUEUE_TIMEOUT_S, **(queue_timeouts or {}))
+        self.max_yield_s = max_yield_ms / 1000.0
+        # Bytes; None for no budget.
+        self.memory_budget = memory_budget
+        self._reserved = 0
+        if memory_budget is not None:
+            metrics.set_gauge("bone_memory_budget_bytes", memory_budget)
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._sequence = itertools.count()
+        self._waiting = {p: [] for p in PRIORITIES}
+        self._running = {p: 0 for p in PRIORITIES}
+        self._running_by_user = {p: {} for p in PRIORITIES}
+        self._last_served = {}
+        self._counts = {p: {"admitted": 0, "timed_out": 0, "rejected": 0, "yields": 0} for p in PRIORITIES}
+
+    def _publish(self, priority):
+        metrics.set_gauge("bone_scheduler_queued", len(self._waiting[priority]), priority=priority)
+        metrics.set_gauge("bone_scheduler_running", self._running[priority], priority=priority)
+        metrics.set_gauge("bone_memory_reserved_bytes", self._reserved)
+
+    def _fit(self, options):
+        """
+        First (mode, bytes) option that fits the free memory, or None.
+        """
+        if not options:
+            return None, 0
+        for option in options:
+            if self.memory_budget is None or self._reserved + option[1] <= self.memory_budget:
+                return option
+        return None
+
+    def _dispatch(self, priority):
+        """
+        Grants free slots of 'priority' to waiters, fairest first. When the
+        fairest waiter's memory does not fit yet, the class waits behind it,
+        so large tasks are not starved by a stream of small ones.
+        Called with the condition held.
+        """
+        waiting = self._waiting[priority]
+        by_user = self._running_by_user[priority]
+        granted = False
+        while waiting and self._running[priority] < self.limits[priority]:
+            waiter = min(waiting, key=lambda w: (by_user.get(w["user"], 0),
+                                                 self._last_served.get(w["user"], -1), w["seq"]))
+            choice = self._fit(waiter["options"])
+            if choice is None:
+                break
+            waiting.remove(waiter)
+            waiter["granted"] = True
+            waiter["choice"] = choice
+            self._reserved += choice[1]
+            if choice[0] is not None:
+                metrics.inc("bone_admissions_total", priority=priority, mode=choice[0])
+            self._running[priority] += 1
+            by_user[waiter["user"]] = by_user.get(waiter["user"], 0) + 1
+            self._last_served[waiter["user"]] = waiter["seq"]
+            self._counts[priority]["admitted"] += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+        self._publish(priority)
+
+    def _acquire(self, priority, user, timeout, options):
+        start = time.perf_counter()
+        waiter = {"seq": next(self._sequence), "user": user, "options": options, "granted": False}
+        with self._cond:
+            if options and self.memory_budget is not None:
+                smallest = min(needed for _, needed in options)
+                if smallest > self.memory_budget:
+                    self._counts[priority]["rejected"] += 1
+                    raise OverBudget(smallest, self.memory_budget)
+            self._waiting[priority].append(waiter)
+            self._dispatch(priority)
+            deadline = start + timeout
+            while not waiter["granted"]:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._waiting[priority].remove(waiter)
+                    self._counts[priority]["timed_out"] += 1
+                    # It may have been holding up the waiters behind it.
+                    self._dispatch(priority)
+                    raise SchedulerBusy(f"No {priority} slot free after {timeout:g} s")
+                self._cond.wait(remaining)
+        metrics.observe("bone_scheduler_wait_seconds", time.perf_counter() - start, priority=priority)
+        return waiter["choice"]
+
+    def _release(self, priority, user, choice):
+        with self._cond:
+            self._running[priority] -= 1
+            self._reserved -= choice[1]
+            by_user = self._running_by_user[priority]
+            by_user[user] -= 1
+            if not by_user[user]:
+                del by_user[user]
+            # Freed memory may let waiters of either class in.
+            for waiting_priority in PRIORITIES:
+                self._dispatch(waiting_priority)
+            # Paused batch tasks re-check whether interactive work is left.
+            self._cond.notify_all()
+
+    @contextmanager
+    def task(self, priority, user=None, timeout=None, memory=None):
+        """
+        Runs the block in a slot of 'priority' for 'user' (any hashable,
+        e.g. the physician's id). 'memory' is the bytes to reserve, or a
+        list of (mode, bytes) options in order of preference; the block
+        receives the (mode, bytes) it was admitted with ((None, 0) without
+        'memory'). A thread that already holds a slot runs nested tasks in
+        it, without a reservation of their own.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        if getattr(self._local, "priority", None) is not None:
+            yield None, 0
+            return
+        options = [(None, int(memory))] if isinstance(memory, (int, float)) else list(memory or [])
+        choice = self._acquire(priority, user, self.queue_timeouts[priority] if timeout is None else timeout,
+                               options)
+        self._local.priority = priority
+        try:
+            yield choice
+        finally:
+            self._local.priority = None
+            self._release(priority, user, choice)
+
+    @contextmanager
+    def no_yield(self):
+        """
+        checkpoint() does not pause in the block.
+        """
+        depth = getattr(self._local, "no_yield", 0)
+        self._local.no_yield = depth + 1
+        try:
+            yield
+        finally:
+            self._local.no_yield = depth
+
+    def _interactive_pending(self):
+        return self._running[INTERACTIVE] > 0 or bool(self._waiting[INTERACTIVE])
+
+    def checkpoint(self):
+        """
+        Yield point for batch work: pauses while interactive tasks are
+        running or queued, for at most max_yield_s. No-op elsewhere and
+        inside no_yield().
+        """
+        if getattr(self._local, "priority", None) != BATCH or getattr(self._local, "no_yield", 0):
+            return
+        with self._cond:
+            if not self._interactive_pending():
+                return
+            start = time.perf_counter()
+            deadline = start + self.max_yield_s
+            while self._interactive_pending():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._counts[BATCH]["yields"] += 1
+        metrics.observe("bone_scheduler_yield_seconds", time.perf_counter() - start, priority=BATCH)
+
+    def stats(self):
+        with self._cond:
+            stats = {p: dict(self._counts[p], limit=self.limits[p], running=self._running[p],
+                             queued=len(self._waiting[p]),
+                             queued_users=len({w["user"] for w in self._waiting[p]}))
+                     for p in PRIORITIES}
+            stats["memory"] = {"budget_bytes": self.memory_budget, "reserved_bytes": self._reserved}
+            return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler():
+    """
+    The process-wide Scheduler, configured from settings on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                from django.conf import settings
+                configured = settings.configured
+                budget_mb = getattr(settings, "MEMORY_BUDGET_MB", None) if configured else None
+                _scheduler = Scheduler(
+                    limits=getattr(settings, "SCHEDULER_LIMITS", None) if configured else None,
+                    queue_timeouts=getattr(settings, "SCHEDULER_QUEUE_TIMEOUT_S", None) if configured else None,
+                    max_yield_ms=(getattr(settings, "SCHEDULER_MAX_YIELD_MS", DEFAULT_MAX_YIELD_MS)
+                                  if configured else DEFAULT_MAX_YIELD_MS),
+                    memory_budget=int(budget_mb * MB) if budget_mb is not None else None,
+                )
+    return _scheduler
+
+
+def task(priority, user=None, timeout=None, memory=None):
+    return scheduler().task(priority, user=user, timeout=timeout, memory=memory)
+
+
+def checkpoint():
+    """
+    Yield point for long jobs; cheap enough to call once per slice.
+    """
+    if _scheduler is not None:
+        _scheduler.checkpoint()
+
+
+def no_yield():
+    """
+    Context in which checkpoint() does not pause, for work done while holding
+    a lock other tasks may wait on: pausing there would make them wait for
+    the pauses too.
+    """
+    if _scheduler is None:
+        return nullcontext()
+    return _scheduler.no_yield()
+
+
+def stats():
+    return scheduler().stats()
+
+
+def busy_response(error):
+    """
+    503 JsonResponse for a request whose task timed out in the queue.
+    """
+    from django.conf import settings
+    from django.http import JsonResponse
+    response = JsonResponse({"error": f"Server busy: {error}"}, status=503)
+    response["Retry-After"] = str(getattr(settings, "SCHEDULER_RETRY_AFTER_S", DEFAULT_RETRY_AFTER_S))
+    return response
+
+
+def over_budget_response(error):
+    """
+    413 JsonResponse for a request whose estimated peak memory exceeds the budget.
+    """
+    from django.http import JsonResponse
+    return JsonResponse({"error": str(error), "estimated_peak_mb": round(error.needed / MB),
+                         "memory_budget_mb": round(error.budget / MB)}, status=413)
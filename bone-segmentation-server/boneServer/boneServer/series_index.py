@@ -0,0 +1,58 @@
+"""
+Per-folder DICOM header index (series_index.json).
+
+Written when a study is uploaded (see uploads.py), from headers read as each
+file arrives. list_series_files uses it to order slices without opening
+every file again.
+"""
+import json
+import os
+
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+INDEX_FILENAME = "series_index.json"
+
+
+def header_entry(path):
+    """
+    Index entry for one file, read without pixel data. Returns None when
+    the file is not DICOM.
+    """
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True)
+    except (InvalidDicomError, EOFError, OSError):
+        return None
+    return {
+        "filename": os.path.basename(path),
+        "sop_instance_uid": str(ds.get("SOPInstanceUID", "")),
+        "series_instance_uid": str(ds.get("SeriesInstanceUID", "")),
+        "instance_number": int(ds.InstanceNumber) if 'InstanceNumber' in ds else 0,
+        "rows": int(ds.get("Rows", 0)),
+        "columns": int(ds.get("Columns", 0)),
+    }
+
+
+def write_index(folder, entries, **extra):
+    """
+    Saves the entries (sorted by series, InstanceNumber, filename) plus any
+    'extra' top-level fields to folder/series_index.json.
+    """
+    entries = sorted(entries, key=lambda e: (e["series_instance_uid"], e["instance_number"], e["filename"]))
+    path = os.path.join(folder, INDEX_FILENAME)
+    with open(path, "w") as f:
+        json.dump({"files": entries, **extra}, f)
+    return path
+
+
+def load_instance_numbers(folder):
+    """
+    {filename: InstanceNumber} from the folder's index, or {} when there is
+    no readable index.
+    """
+    try:
+        with open(os.path.join(folder, INDEX_FILENAME)) as f:
+            entries = json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {e["filename"]: e["instance_number"] for e in entries}
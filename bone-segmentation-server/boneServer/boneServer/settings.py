@@ -28,6 +28,48 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'  # URL prefix for serving media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # file system path to store files
 
+# /upload-dicoms/ takes one multipart part per slice; Django's default is 100.
+DATA_UPLOAD_MAX_NUMBER_FILES = 5000
+
+# Percent of segmentation/reconstruction requests profiled automatically
+# (see boneServer/profiling.py); 0 = only when asked for with ?profile=1.
+PROFILE_SAMPLE_PERCENT = 0
+
+# Decoded volumes shared by all worker processes (boneServer/shared_cache.py):
+# at most this many bytes, in this directory (None = /dev/shm/boneServer-volumes).
+# 0 turns it off; each process then keeps its own small cache.
+SHARED_VOLUME_CACHE_BYTES = 2 * 1024 ** 3
+SHARED_VOLUME_CACHE_DIR = None
+
+# Write a 64³-chunked copy of each source series during its first whole-series
+# segmentation (boneServer/chunked_volume.py), for MPR and previews that are
+# not in the shared cache. Costs one zlib pass over the series, once per series.
+CHUNK_SOURCE_VOLUMES = True
+
+# Priority scheduling of imaging work within each worker (boneServer/scheduler.py):
+# concurrent tasks per class, how long a request may wait for a slot before it
+# gets a 503, and how long batch work pauses per checkpoint for interactive work.
+SCHEDULER_LIMITS = {"interactive": 4, "batch": 2}
+SCHEDULER_QUEUE_TIMEOUT_S = {"interactive": 30, "batch": 900}
+SCHEDULER_MAX_YIELD_MS = 200
+SCHEDULER_RETRY_AFTER_S = 30
+
+# Estimated peak memory (boneServer/admission.py) that the segmentations and
+# reconstructions running in one worker may reserve together, in MB. Requests
+# wait for room, switch to streaming modes, or get a 413 above the whole
+# budget. None disables admission control. Cached volumes are not part of it:
+# with the 2 GB shared cache above this keeps a worker within 4 GB. Without
+# the shared cache each worker instead keeps its last 4 decoded volumes.
+MEMORY_BUDGET_MB = 2048
+
+# Limits on one /upload-dicoms/ request (boneServer/uploads.py): request bytes,
+# files in a ZIP, and bytes extracted from ZIPs, in total and per compressed
+# byte. Checked while the upload streams in; going over is a 413.
+UPLOAD_MAX_BYTES = 4 * 1024 ** 3
+UPLOAD_MAX_ZIP_MEMBERS = 20000
+UPLOAD_MAX_UNCOMPRESSED_BYTES = 8 * 1024 ** 3
+UPLOAD_MAX_COMPRESSION_RATIO = 100
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -77,6 +119,7 @@ CORS_ALLOW_HEADERS = [
 
 
 MIDDLEWARE = [
+    "boneServer.metrics.metrics_middleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
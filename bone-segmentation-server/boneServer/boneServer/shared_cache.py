@@ -0,0 +1,269 @@
+"""
+Decoded volumes shared by all the worker processes of a host.
+
+Each worker of a gunicorn/uvicorn deployment has its own lru_caches, so a
+popular study used to be read and decoded once per worker. With this cache
+the first worker that needs a volume decodes it into an .npy file under
+SHARED_VOLUME_CACHE_DIR (/dev/shm by default, i.e. RAM). Every worker then
+maps that one copy read-only with np.load(mmap_mode="r").
+
+Coordination goes through a small JSON index next to the files, updated
+under an exclusive flock:
+- key -> file, size, meta (slice files, spacing, ...), last use, and
+  refs: {pid: number of arrays that worker still has mapped}
+- a worker takes a ref when it maps an entry. The ref is dropped when the
+  array (and every view of it) is garbage collected. Refs of workers that
+  no longer exist are discarded.
+- entries are evicted least recently used first when a new one would push
+  the total over SHARED_VOLUME_CACHE_BYTES. Entries with refs are kept. If
+  the new volume still does not fit, it is returned unshared.
+
+Only one worker decodes a given volume: the others wait on that key's lock
+file and then map the result. Keys share a fixed pool of KEY_LOCKS lock
+files, picked by key hash, so evicted keys leave no files behind. The
+decode does not yield to interactive work (scheduler.no_yield) since those
+may be the ones waiting. Needs fcntl (POSIX); elsewhere shared_volumes()
+returns None and callers keep their per-process caches.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from .scheduler import no_yield
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_FILENAME = "index.json"
+INDEX_LOCK_FILENAME = "index.lock"
+KEY_LOCKS = 256
+DEFAULT_BUDGET_BYTES = 2 * 1024 ** 3
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+def default_directory():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "boneServer-volumes")
+
+
+def cache_key(*parts):
+    """
+    Filename-safe key for 'parts' (e.g. kind, folder path, mtime).
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def _key_lock_filename(key):
+    slot = int(hashlib.sha1(key.encode()).hexdigest(), 16) % KEY_LOCKS
+    return f"key-{slot:02x}.lock"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedVolumeCache:
+    """
+    See the module docstring. 'hits', 'misses', 'evictions' and 'unshared'
+    count this process's lookups.
+    """
+
+    def __init__(self, directory, budget_bytes):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.unshared = 0
+        self._local = threading.local()
+        self._pending_releases = []
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _flock(self, name):
+        with open(self._path(name), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _index(self):
+        """
+        Yields the index for update; it is written back on exit.
+        """
+        self._local.in_index = True
+        try:
+            with self._flock(INDEX_LOCK_FILENAME):
+                index = self._read_index()
+                self._apply_releases(index)
+                yield index
+                tmp_path = self._path(f".{INDEX_FILENAME}.{os.getpid()}.tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self._path(INDEX_FILENAME))
+        finally:
+            self._local.in_index = False
+
+    def _read_index(self):
+        try:
+            with open(self._path(INDEX_FILENAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _apply_releases(self, index):
+        pid = str(os.getpid())
+        while self._pending_releases:
+            entry = index.get(self._pending_releases.pop())
+            if entry and entry["refs"].get(pid, 0) > 0:
+                entry["refs"][pid] -= 1
+                if not entry["refs"][pid]:
+                    del entry["refs"][pid]
+
+    def _release(self, key):
+        # Runs when a mapped array is garbage collected. That can happen
+        # while this thread holds the index lock, so then it is applied on
+        # the next index update instead.
+        self._pending_releases.append(key)
+        if not getattr(self._local, "in_index", False):
+            with self._index():
+                pass
+
+    def _attach(self, key):
+        with self._index() as index:
+            entry = index.get(key)
+            if entry is None:
+                return None
+            try:
+                array = np.load(self._path(entry["file"]), mmap_mode="r")
+            except FileNotFoundError:
+                del index[key]
+                return None
+            pid = str(os.getpid())
+            entry["refs"][pid] = entry["refs"].get(pid, 0) + 1
+            entry["last_used"] = time.time()
+        weakref.finalize(array, self._release, key)
+        return array, entry["meta"]
+
+    def _evict_for(self, index, nbytes):
+        """
+        Drops unreferenced entries, least recently used first, until
+        'nbytes' more fit in the budget. Returns False if they cannot.
+        """
+        for entry in index.values():
+            entry["refs"] = {pid: n for pid, n in entry["refs"].items() if _alive(int(pid))}
+        used = sum(entry["nbytes"] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if used + nbytes <= self.budget_bytes:
+                break
+            if entry["refs"]:
+                continue
+            try:
+                # Workers that still have it mapped keep their mapping.
+                os.remove(self._path(entry["file"]))
+            except FileNotFoundError:
+                pass
+            del index[key]
+            used -= entry["nbytes"]
+            self.evictions += 1
+        return used + nbytes <= self.budget_bytes
+
+    def _store(self, key, array, meta):
+        if array.nbytes > self.budget_bytes:
+            return False
+        filename = f"{key}.npy"
+        tmp_path = self._path(f".{filename}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        with self._index() as index:
+            if not self._evict_for(index, array.nbytes):
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, self._path(filename))
+            index[key] = {"file": filename, "nbytes": int(array.nbytes), "meta": meta,
+                          "last_used": time.time(), "refs": {}}
+        return True
+
+    def get_or_load(self, key, load):
+        """
+        (array, meta) for 'key', the array being a read-only mapping of the
+        shared copy. On a miss load() -> (array, JSON-able meta) builds it,
+        in one worker only; the others wait for it and map the result.
+        """
+        found = self._attach(key)
+        if found is None:
+            with self._flock(_key_lock_filename(key)):
+                found = self._attach(key)
+                if found is None:
+                    self.misses += 1
+                    # Other workers' requests, interactive ones included, wait
+                    # on this lock, so batch work must not pause while holding it.
+                    with no_yield():
+                        array, meta = load()
+                    if self._store(key, array, meta):
+                        found = self._attach(key)
+                    if found is None:
+                        self.unshared += 1
+                        return array, meta
+                    return found
+        self.hits += 1
+        return found
+
+    def peek(self, key):
+        """
+        (array, meta) if 'key' is cached, else None; never loads.
+        """
+        found = self._attach(key)
+        if found is not None:
+            self.hits += 1
+        return found
+
+    def cache_info(self):
+        # The index is replaced atomically, so reading it needs no lock.
+        return CacheInfo(self.hits, self.misses, self.budget_bytes, len(self._read_index()))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_volumes():
+    """
+    The process's SharedVolumeCache, or None when disabled
+    (SHARED_VOLUME_CACHE_BYTES = 0) or unsupported (no fcntl).
+    """
+    global _shared
+    if _shared is None and fcntl is not None:
+        from django.conf import settings
+        if not settings.configured:
+            # Used outside the server (scripts, benchmarks).
+            return None
+        budget = getattr(settings, "SHARED_VOLUME_CACHE_BYTES", DEFAULT_BUDGET_BYTES)
+        if budget > 0:
+            with _shared_lock:
+                if _shared is None:
+                    directory = getattr(settings, "SHARED_VOLUME_CACHE_DIR", None) or default_directory()
+                    _shared = SharedVolumeCache(directory, budget)
+    return _shared
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from unittest import skipIf, skipUnless
+
+import numpy as np
+import pydicom
+from django.test import SimpleTestCase
+
+from .. import kernels
+from ..imaging import convert_to_hu, hu_to_original_scale, segment_bone_hu
+from .utils import write_series
+
+# (PixelRepresentation, RescaleSlope, RescaleIntercept)
+CASES = [
+    (0, 1.0, -1024.0),
+    (1, 1.0, 0.0),
+    (1, 1.0, -1024.0),
+    (0, 0.5, -1024.0),
+    (0, 2.5, -1000.5),
+    (1, 2.5, -1000.5),
+]
+THRESHOLDS = [(300, 2000), (-100, 100), (5000, 6000), (-40000, 40000)]
+PLANES = [None, (slice(10, 50), slice(None, -12))]
+
+
+def reference(ds, lower, upper, plane):
+    """
+    The unfused steps segment_slice() replaces.
+    """
+    image_hu = convert_to_hu(ds)
+    if plane is None:
+        segmented = segment_bone_hu(image_hu, lower_hu=lower, upper_hu=upper)
+    else:
+        segmented = np.zeros_like(image_hu)
+        segmented[plane] = segment_bone_hu(image_hu[plane], lower_hu=lower, upper_hu=upper)
+    return image_hu, hu_to_original_scale(segmented, ds)
+
+
+class SegmentSliceTests(SimpleTestCase):
+    """
+    Every engine is bit-for-bit identical to the imaging.py steps.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        work = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        cls.datasets = []
+        try:
+            for i, (representation, slope, intercept) in enumerate(CASES):
+                volume = rng.integers(-1024, 3000, size=(1, 64, 64), endpoint=True)
+                folder = write_series(os.path.join(work, str(i)), volume, slope=slope, intercept=intercept,
+                                      signed=bool(representation))
+                cls.datasets.append(pydicom.dcmread(os.path.join(folder, os.listdir(folder)[0])))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    def check_engine(self, engine):
+        for ds in self.datasets:
+            pixels = ds.pixel_array
+            for (lower, upper) in THRESHOLDS:
+                for plane in PLANES:
+                    with self.subTest(representation=ds.PixelRepresentation, slope=ds.RescaleSlope,
+                                      intercept=ds.RescaleIntercept, thresholds=(lower, upper), roi=plane):
+                        hu_ref, raw_ref = reference(ds, lower, upper, plane)
+                        hu, raw = kernels.segment_slice(pixels, ds.RescaleSlope, ds.RescaleIntercept, lower, upper,
+                                                        ds.RescaleSlope, ds.RescaleIntercept, plane=plane,
+                                                        engine=engine)
+                        self.assertEqual((hu.dtype, raw.dtype), (hu_ref.dtype, raw_ref.dtype))
+                        np.testing.assert_array_equal(hu, hu_ref)
+                        np.testing.assert_array_equal(raw, raw_ref)
+
+    def test_numpy_engine(self):
+        self.check_engine("numpy")
+
+    @skipUnless(kernels.HAS_NUMBA, "numba is not installed")
+    def test_numba_engine(self):
+        self.check_engine("numba")
+
+    def test_to_hu(self):
+        for ds in self.datasets:
+            with self.subTest(representation=ds.PixelRepresentation, slope=ds.RescaleSlope):
+                hu = kernels.to_hu(ds.pixel_array, ds.RescaleSlope, ds.RescaleIntercept)
+                np.testing.assert_array_equal(hu, convert_to_hu(ds))
+
+
+class EngineSelectionTests(SimpleTestCase):
+
+    @skipIf(kernels.HAS_NUMBA, "numba is installed")
+    def test_falls_back_to_numpy_without_numba(self):
+        self.assertEqual(kernels.ENGINES, ("numpy",))
+        self.assertEqual(kernels.DEFAULT_ENGINE, "numpy")
+        with self.assertRaises(ValueError):
+            kernels.segment_slice(np.zeros((4, 4), np.int16), 1, 0, 300, 2000, 1, 0, engine="numba")
+
+    @skipUnless(kernels.HAS_NUMBA, "numba is not installed")
+    def test_prefers_numba(self):
+        self.assertEqual(kernels.DEFAULT_ENGINE, "numba")
@@ -0,0 +1,47 @@
+from unittest import mock
+
+import numpy as np
+from pydicom.dataset import Dataset
+
+from ..measurements import _measure_folder
+from .utils import BONE_HU, ApiTestCase, bone_volume
+
+
+class BoneMeasurementTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        _measure_folder.cache_clear()
+        self.addCleanup(_measure_folder.cache_clear)
+        volume = bone_volume()
+        # A speck of bone away from the cylinder, dropped by the mask cleanup.
+        volume[5:7, 2:4, 2:4] = BONE_HU
+        response = self.segment(self.series(volume))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.url = f"/measurements/{response.json()['segmentation_id']}/"
+
+    def test_bones_are_cleaned_before_labeling(self):
+        response = self.get(self.url, per_bone="true", min_bone_voxels=1)
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual(len(result["bones"]), 1)
+        self.assertGreater(result["bone"]["voxel_count"], result["bones"][0]["voxel_count"])
+
+    def test_cleanup_options_are_applied(self):
+        response = self.get(self.url, per_bone="true", min_bone_voxels=1, min_speck_voxels=0,
+                            closing_radius=0, fill_holes="false")
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual(len(result["bones"]), 2)
+        self.assertEqual(sum(bone["voxel_count"] for bone in result["bones"]), result["bone"]["voxel_count"])
+
+    def test_reads_the_chunked_volume(self):
+        with mock.patch.object(Dataset, "convert_pixel_data") as convert:
+            response = self.get(self.url, per_bone="true")
+        self.assertEqual(response.status_code, 200, response.content)
+        convert.assert_not_called()
+
+    def test_invalid_flag_is_rejected(self):
+        for params in ({"per_bone": "yes"}, {"per_bone": "true", "separate_touching": "maybe"}):
+            response = self.get(self.url, **params)
+            self.assertEqual(response.status_code, 400, response.content)
@@ -0,0 +1,44 @@
+import os
+
+from ..chunked_volume import VOLUME_CHUNKS_DIRNAME, ChunkedVolumeWriter
+from ..models import SegmentationRecord
+from ..thumbnails import write_thumbnails
+from .utils import ApiTestCase
+
+
+class OutOfRangeRoiTests(ApiTestCase):
+
+    def assertRejected(self, roi):
+        response = self.segment(self.series(), roi=roi)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(SegmentationRecord.objects.exists())
+
+    def test_slice_start_past_the_series(self):
+        self.assertRejected({"slice_start": 100})
+
+    def test_rows_past_the_image(self):
+        self.assertRejected({"row_start": 200})
+
+    def test_cols_stop_past_the_image(self):
+        self.assertRejected({"col_start": 10, "col_stop": 49})
+
+    def test_auto_thresholds_with_rows_past_the_image(self):
+        response = self.segment(self.series(), lower_threshold="auto", roi={"row_start": 200})
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_resegment_with_slices_past_the_series(self):
+        segmentation_id = self.segment(self.series()).json()["segmentation_id"]
+        response = self.post(f"/resegment-images/{segmentation_id}/",
+                             {"lower_threshold": 400, "upper_threshold": 2000, "roi": {"slice_stop": 13}})
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(SegmentationRecord.objects.count(), 1)
+
+    def test_roi_inside_the_series(self):
+        response = self.segment(self.series(), roi={"slice_start": 2, "slice_stop": 12, "row_stop": 48})
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_thumbnails_of_an_empty_volume(self):
+        folder = os.path.join(self.work, "empty")
+        with ChunkedVolumeWriter(os.path.join(folder, VOLUME_CHUNKS_DIRNAME), (0, 8, 8), "int16", (1, 1, 1)):
+            pass
+        self.assertEqual(write_thumbnails(folder, 300, 2000), {})
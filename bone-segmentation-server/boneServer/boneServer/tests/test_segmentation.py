@@ -0,0 +1,78 @@
+import os
+from unittest import mock
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import BasicTextSRStorage, ExplicitVRLittleEndian, generate_uid
+
+from ..models import SegmentationRecord
+from .utils import ApiTestCase
+
+SLICES = 12
+
+
+class DecodeCountTests(ApiTestCase):
+    """
+    Auto thresholds decode the series once: segmenting reuses the volume
+    the suggestion was computed from.
+    """
+
+    def count_decodes(self, run):
+        decodes = []
+        convert = Dataset.convert_pixel_data
+
+        def counting(ds, *args, **kwargs):
+            before = getattr(ds, "_pixel_array", None)
+            convert(ds, *args, **kwargs)
+            if ds._pixel_array is not before:
+                decodes.append(ds)
+
+        with mock.patch.object(Dataset, "convert_pixel_data", counting):
+            response = run()
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(decodes)
+
+    def test_auto_segmentation_decodes_once(self):
+        folder = self.series()
+        decodes = self.count_decodes(lambda: self.segment(folder, lower_threshold="auto", upper_threshold="auto"))
+        self.assertEqual(decodes, SLICES)
+
+    def test_auto_resegmentation_decodes_once(self):
+        folder = self.series()
+        segmentation_id = self.segment(folder).json()["segmentation_id"]
+        decodes = self.count_decodes(lambda: self.post(
+            f"/resegment-images/{segmentation_id}/",
+            {"lower_threshold": "auto", "upper_threshold": 2000, "roi": {"slice_start": 1}}))
+        self.assertEqual(decodes, SLICES)
+
+
+class NonImageSeriesTests(ApiTestCase):
+    """
+    Folders whose DICOM files are not images are rejected before admission.
+    """
+
+    def assertRejected(self, folder):
+        response = self.segment(folder)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(SegmentationRecord.objects.exists())
+
+    def test_structured_report(self):
+        folder = os.path.join(self.work, "report")
+        os.makedirs(folder)
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = BasicTextSRStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = BasicTextSRStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.Modality = "SR"
+        ds.save_as(os.path.join(folder, "report.dcm"), enforce_file_format=True)
+        self.assertRejected(folder)
+
+    def test_not_dicom(self):
+        folder = os.path.join(self.work, "text")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "notes.dcm"), "w") as f:
+            f.write("not a DICOM file")
+        self.assertRejected(folder)
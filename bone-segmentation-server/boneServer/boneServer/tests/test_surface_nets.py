@@ -0,0 +1,33 @@
+import numpy as np
+from django.test import SimpleTestCase
+from skimage.measure import marching_cubes
+
+from ..surface_nets import surface_nets
+
+SPACING = (1.0, 0.5, 0.5)
+
+
+def binary_sphere(size=64):
+    z, y, x = np.ogrid[:size, :size, :size]
+    centre = (size - 1) / 2
+    radius = size / 3
+    return (((z - centre) * SPACING[0]) ** 2 + ((y - centre) * SPACING[1]) ** 2
+            + ((x - centre) * SPACING[2]) ** 2 <= (radius * SPACING[1]) ** 2).astype(np.float32)
+
+
+class SurfaceNetsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.mask = binary_sphere()
+
+    def test_decimated_sphere_has_far_fewer_faces_than_marching_cubes(self):
+        _, mc_faces, _, _ = marching_cubes(np.pad(self.mask, 1), 0.5, spacing=SPACING)
+        _, faces = surface_nets(self.mask, 0.5, SPACING)
+        self.assertLess(len(faces), 0.6 * len(mc_faces))
+
+    def test_decimated_sphere_is_watertight(self):
+        verts, faces = surface_nets(self.mask, 0.5, SPACING)
+        edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+        _, counts = np.unique(edges, axis=0, return_counts=True)
+        self.assertTrue((counts == 2).all())
+        self.assertEqual(len(np.unique(faces)), len(verts))
@@ -0,0 +1,109 @@
+"""
+Helpers for the boneServer tests: small synthetic CT series and an API
+test case with a logged-in physician and a throwaway MEDIA_ROOT.
+"""
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pydicom
+from django.test import TestCase, override_settings
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from .. import shared_cache
+from ..volume_cache import _load_hu_volume
+
+AIR_HU = -1000
+SOFT_TISSUE_HU = 40
+BONE_HU = 1200
+
+
+def bone_volume(slices=12, rows=48, cols=48, noise_hu=20.0, seed=0):
+    """
+    int16 HU volume: a soft-tissue disc in air holding a bone cylinder along
+    the slice axis, with Gaussian noise (so thresholds can be suggested).
+    """
+    y, x = np.mgrid[:rows, :cols]
+    r2 = ((y - rows / 2) / (rows / 2)) ** 2 + ((x - cols / 2) / (cols / 2)) ** 2
+    plane = np.select([r2 < 0.25, r2 < 0.8], [BONE_HU, SOFT_TISSUE_HU], AIR_HU)
+    volume = np.repeat(plane[None], slices, axis=0).astype(np.float64)
+    volume += np.random.default_rng(seed).normal(0.0, noise_hu, volume.shape)
+    return np.round(volume).astype(np.int16)
+
+
+def write_series(folder, volume_hu, spacing=(1.0, 0.5, 0.5), slope=1.0, intercept=0.0, signed=True):
+    """
+    Writes 'volume_hu' as one CT file per slice (stored = (HU - intercept) / slope).
+    """
+    os.makedirs(folder, exist_ok=True)
+    stored = np.round((volume_hu.astype(np.float64) - intercept) / slope).astype(np.int16 if signed else np.uint16)
+    series_uid = generate_uid()
+    for i, image in enumerate(stored):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.Modality = "CT"
+        ds.SeriesInstanceUID = series_uid
+        ds.InstanceNumber = i + 1
+        ds.ImagePositionPatient = [0.0, 0.0, i * spacing[0]]
+        ds.SliceThickness = spacing[0]
+        ds.PixelSpacing = list(spacing[1:])
+        ds.Rows, ds.Columns = image.shape
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1 if signed else 0
+        ds.RescaleSlope = slope
+        ds.RescaleIntercept = intercept
+        ds.PixelData = image.tobytes()
+        ds.save_as(os.path.join(folder, f"slice_{i + 1:04d}.dcm"), enforce_file_format=True)
+    return folder
+
+
+class ApiTestCase(TestCase):
+    """
+    Logged-in physician, MEDIA_ROOT in a temporary folder, no shared volume
+    cache and an empty per-process one.
+    """
+
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.work, "media"), SHARED_VOLUME_CACHE_BYTES=0)
+        media.enable()
+        self.addCleanup(media.disable)
+        patch = mock.patch.object(shared_cache, "_shared", None)
+        patch.start()
+        self.addCleanup(patch.stop)
+        _load_hu_volume.cache_clear()
+        self.addCleanup(_load_hu_volume.cache_clear)
+
+        self.client.post("/signup/", {"username": "doc", "password": "pw", "role": "physician"},
+                         content_type="application/json")
+        token = self.client.post("/login/", {"username": "doc", "password": "pw"},
+                                 content_type="application/json").json()["access_token"]
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def series(self, volume=None, name="series", **kwargs):
+        return write_series(os.path.join(self.work, name), bone_volume() if volume is None else volume, **kwargs)
+
+    def post(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type="application/json", **self.auth)
+
+    def get(self, url, **params):
+        return self.client.get(url, params, **self.auth)
+
+    def segment(self, folder, **fields):
+        data = {"folder_path": folder, "lower_threshold": 300, "upper_threshold": 2000,
+                "patient_email": "patient@example.com", **fields}
+        return self.post("/segment-images/", data)
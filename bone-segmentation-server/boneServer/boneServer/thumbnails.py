@@ -0,0 +1,149 @@
+"""
+Preview thumbnails of a segmentation, rendered once when it is created.
+
+From the segmented volume's chunked copy (chunked_volume.py), in slabs of
+one chunk depth:
+- mip_axial, mip_coronal, mip_sagittal: maximum-intensity projections of
+  the bone along each volume axis (background stays black)
+- render_anterior: shaded depth render seen from the first row (anterior
+  for LPS-oriented series). The depth of the first bone voxel along each
+  ray is lit with a Lambert term from its gradient and dimmed with
+  distance.
+
+All are max/argmax reductions over the slab, so only the bone's
+bounding box is read. Images are resampled to the physical aspect ratio
+with the longest side THUMBNAIL_SIZE and saved as PNGs in
+<output folder>/thumbnails/.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from .chunked_volume import VOLUME_CHUNKS_DIRNAME, open_chunked_volume
+
+THUMBNAIL_DIRNAME = "thumbnails"
+THUMBNAILS = ("mip_axial", "mip_coronal", "mip_sagittal", "render_anterior")
+THUMBNAIL_SIZE = 256
+# Gray level of bone at the lower threshold, so faint bone stays visible on black.
+MIN_BONE_GRAY = 64
+# Light from the top left, mostly from the viewer: (z, x, towards viewer).
+LIGHT = np.array([-0.5, -0.3, 1.0]) / np.linalg.norm([-0.5, -0.3, 1.0])
+AMBIENT = 0.15
+# Farthest surface is drawn at this fraction of the nearest one's brightness.
+DEPTH_DIMMING = 0.5
+_NO_BONE = np.iinfo(np.int16).min
+
+
+def _projections(volume):
+    """
+    Per-axis MIPs (int16, _NO_BONE where no ray hits bone) and the index of
+    the first bone row along each (slice, col) ray (-1 for none).
+    """
+    slices, rows, cols = volume.shape
+    mips = [np.full((rows, cols), _NO_BONE, dtype=np.int16),
+            np.full((slices, cols), _NO_BONE, dtype=np.int16),
+            np.full((slices, rows), _NO_BONE, dtype=np.int16)]
+    first_row = np.full((slices, cols), -1, dtype=np.int64)
+    box = volume.stored_box()
+    if box is None:
+        return mips, first_row
+
+    z_box, y_box, x_box = box
+    depth = volume.chunks[0]
+    for z0 in range(z_box.start, z_box.stop, depth):
+        z = slice(z0, min(z0 + depth, z_box.stop))
+        slab = volume.read((z, y_box, x_box))
+        bone = slab != 0
+        np.maximum(mips[0][y_box, x_box], slab.max(axis=0, where=bone, initial=_NO_BONE),
+                   out=mips[0][y_box, x_box])
+        mips[1][z, x_box] = slab.max(axis=1, where=bone, initial=_NO_BONE)
+        mips[2][z, y_box] = slab.max(axis=2, where=bone, initial=_NO_BONE)
+        hit = bone.any(axis=1)
+        first_row[z, x_box] = np.where(hit, bone.argmax(axis=1) + y_box.start, -1)
+    return mips, first_row
+
+
+def _mip_gray(mip, lower, upper):
+    bone = mip != _NO_BONE
+    scale = np.clip((mip.astype(np.float32) - lower) / max(upper - lower, 1), 0, 1)
+    gray = MIN_BONE_GRAY + (255 - MIN_BONE_GRAY) * scale
+    return np.where(bone, gray, 0).astype(np.uint8)
+
+
+def _depth_render(first_row, row_spacing, slice_spacing, col_spacing):
+    hit = first_row >= 0
+    if not hit.any():
+        return np.zeros(first_row.shape, dtype=np.uint8)
+    depth = first_row * row_spacing
+    near, far = depth[hit].min(), depth[hit].max()
+    # Background at the far plane, so silhouettes get a dark rim, not a spike.
+    depth = np.where(hit, depth, far).astype(np.float64)
+    gz = np.gradient(depth, slice_spacing, axis=0) if depth.shape[0] > 1 else np.zeros_like(depth)
+    gx = np.gradient(depth, col_spacing, axis=1) if depth.shape[1] > 1 else np.zeros_like(depth)
+    # Normal of the surface facing the viewer: (dd/dz, dd/dx, 1), normalized.
+    norm = np.sqrt(gz * gz + gx * gx + 1)
+    lambert = np.clip((gz * LIGHT[0] + gx * LIGHT[1] + LIGHT[2]) / norm, 0, None)
+    dimming = 1 - DEPTH_DIMMING * (depth - near) / max(far - near, 1e-6)
+    shade = (AMBIENT + (1 - AMBIENT) * lambert) * dimming
+    return np.where(hit, np.clip(shade * 255, 0, 255), 0).astype(np.uint8)
+
+
+def _resize(image, row_spacing, col_spacing, size=THUMBNAIL_SIZE):
+    """
+    Resamples to square pixels with the longest side 'size'.
+    """
+    height_mm = image.shape[0] * row_spacing
+    width_mm = image.shape[1] * col_spacing
+    scale = size / max(height_mm, width_mm)
+    shape = (max(int(round(width_mm * scale)), 1), max(int(round(height_mm * scale)), 1))
+    return cv2.resize(image, shape, interpolation=cv2.INTER_AREA)
+
+
+def write_thumbnails(output_folder, lower_threshold, upper_threshold):
+    """
+    Renders THUMBNAILS of the segmentation in 'output_folder' (which must
+    have its volume.chunks) into output_folder/thumbnails/.
+    Returns {name: path}, empty for an empty volume.
+    """
+    volume = open_chunked_volume(os.path.join(output_folder, VOLUME_CHUNKS_DIRNAME))
+    if volume is None:
+        raise FileNotFoundError(f"No chunked volume in {output_folder}")
+    if 0 in volume.shape:
+        return {}
+    dz, dy, dx = volume.spacing
+    mips, first_row = _projections(volume)
+    images = {
+        "mip_axial": _resize(_mip_gray(mips[0], lower_threshold, upper_threshold), dy, dx),
+        "mip_coronal": _resize(_mip_gray(mips[1], lower_threshold, upper_threshold), dz, dx),
+        "mip_sagittal": _resize(_mip_gray(mips[2], lower_threshold, upper_threshold), dz, dy),
+        "render_anterior": _resize(_depth_render(first_row, dy, dz, dx), dz, dx),
+    }
+    folder = os.path.join(output_folder, THUMBNAIL_DIRNAME)
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for name, image in images.items():
+        paths[name] = os.path.join(folder, f"{name}.png")
+        if not cv2.imwrite(paths[name], image):
+            raise ValueError(f"Failed to write thumbnail {paths[name]}")
+    return paths
+
+
+def thumbnail_urls(output_folder, media_root, media_url):
+    """
+    {name: URL under media_url} of a segmentation's thumbnails, or None when
+    it has none (older segmentations, folders outside media_root).
+    """
+    if not output_folder:
+        return None
+    folder = os.path.join(output_folder, THUMBNAIL_DIRNAME)
+    media_root = os.path.abspath(media_root)
+    if os.path.commonpath([media_root, os.path.abspath(folder)]) != media_root:
+        return None
+    urls = {}
+    for name in THUMBNAILS:
+        path = os.path.join(folder, f"{name}.png")
+        if not os.path.isfile(path):
+            return None
+        urls[name] = media_url + os.path.relpath(path, media_root).replace(os.sep, "/")
+    return urls
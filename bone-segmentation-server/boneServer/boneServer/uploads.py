@@ -0,0 +1,229 @@
+"""
+Streaming DICOM upload ingest.
+
+A study arrives either as multipart/form-data (any number of DICOM and/or
+ZIP file parts) or as a raw ZIP request body. Every part is written to the
+upload folder chunk by chunk, so the study is never held in memory. ZIP
+members are extracted one at a time with the same chunked copy.
+
+Each file's SHA-256 is updated as its chunks are written. Its header is read
+as soon as the file is complete, which builds the folder's series index
+(series_index.json). Non-DICOM files are discarded. The study's content hash
+is the SHA-256 of its sorted per-file hashes, so it does not depend on
+filenames or upload order.
+
+Uploads are capped by the UPLOAD_* settings: request bytes, ZIP members and
+uncompressed bytes (total and per compressed byte), all checked while the
+data streams in. Going over raises UploadTooLarge, answered with a 413.
+"""
+import hashlib
+import os
+import re
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .artifact_store import combined_hash
+from .series_index import header_entry, write_index
+
+CHUNK_SIZE = 1024 * 1024
+UPLOADS_SUBDIR = "uploads"
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+DEFAULT_MAX_ZIP_MEMBERS = 20000
+DEFAULT_MAX_UNCOMPRESSED_BYTES = 8 * 1024 ** 3
+DEFAULT_MAX_COMPRESSION_RATIO = 100
+
+
+class UploadTooLarge(Exception):
+    """
+    An upload over one of the UPLOAD_* limits.
+    """
+
+
+def safe_filename(name):
+    """
+    Client-supplied path -> a plain .dcm filename with no directory parts.
+    """
+    base = os.path.basename((name or "").replace("\\", "/"))
+    base = re.sub(r"[^A-Za-z0-9._-]", "_", base).lstrip(".") or "file"
+    if not base.lower().endswith(".dcm"):
+        base += ".dcm"
+    return base
+
+
+def copy_hashed(read, path, limit=None):
+    """
+    Copies chunks from 'read(CHUNK_SIZE)' to 'path' until EOF.
+    Returns (sha256 hex digest, size). Raises UploadTooLarge once more than
+    'limit' bytes have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        while True:
+            chunk = read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise UploadTooLarge(f"More than {limit} bytes")
+            out.write(chunk)
+            digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+class UploadIngest:
+    """
+    The files of one upload: unique names, per-file hashes and header index.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = []
+        self.skipped = 0
+        self.total_bytes = 0
+        self.received = 0
+        self.unzipped = 0
+        self._parts = 0
+        self.max_bytes = getattr(settings, "UPLOAD_MAX_BYTES", DEFAULT_MAX_BYTES)
+        self.max_members = getattr(settings, "UPLOAD_MAX_ZIP_MEMBERS", DEFAULT_MAX_ZIP_MEMBERS)
+        self.max_unzipped = getattr(settings, "UPLOAD_MAX_UNCOMPRESSED_BYTES", DEFAULT_MAX_UNCOMPRESSED_BYTES)
+        self.max_ratio = getattr(settings, "UPLOAD_MAX_COMPRESSION_RATIO", DEFAULT_MAX_COMPRESSION_RATIO)
+
+    def receive(self, size):
+        """
+        Counts 'size' more request bytes against UPLOAD_MAX_BYTES.
+        """
+        self.received += size
+        if self.received > self.max_bytes:
+            raise UploadTooLarge(f"Upload is larger than {self.max_bytes} bytes")
+
+    def part_path(self):
+        """
+        Temporary path for the next incoming part (renamed once complete).
+        """
+        self._parts += 1
+        return os.path.join(self.folder, f".part-{self._parts}")
+
+    def _final_path(self, name):
+        base = safe_filename(name)
+        stem, ext = os.path.splitext(base)
+        path = os.path.join(self.folder, base)
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.folder, f"{stem}_{n}{ext}")
+            n += 1
+        return path
+
+    def _add_file(self, path, sha256, size):
+        entry = header_entry(path)
+        if entry is None:
+            os.remove(path)
+            self.skipped += 1
+            return
+        entry["sha256"] = sha256
+        entry["size"] = size
+        self.entries.append(entry)
+        self.total_bytes += size
+
+    def add_part(self, part_path, name, sha256, size):
+        """
+        A completed part: ZIPs are expanded member by member, anything else
+        is kept if it is DICOM.
+        """
+        if zipfile.is_zipfile(part_path):
+            self.add_zip(part_path)
+            os.remove(part_path)
+            return
+        path = self._final_path(name)
+        os.replace(part_path, path)
+        self._add_file(path, sha256, size)
+
+    def add_zip(self, zip_path):
+        """
+        Extracts a ZIP member by member. The uncompressed total is capped at
+        UPLOAD_MAX_UNCOMPRESSED_BYTES and at UPLOAD_MAX_COMPRESSION_RATIO
+        times the archive's size, checked on the bytes actually extracted.
+        """
+        limit = min(self.max_unzipped, self.unzipped + self.max_ratio * os.path.getsize(zip_path))
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            if len(members) > self.max_members:
+                raise UploadTooLarge(f"ZIP has {len(members)} files, more than {self.max_members}")
+            for member in members:
+                path = self._final_path(member.filename)
+                try:
+                    with archive.open(member) as src:
+                        sha256, size = copy_hashed(src.read, path, limit - self.unzipped)
+                except UploadTooLarge:
+                    raise UploadTooLarge(f"ZIP content is larger than {limit} bytes uncompressed") from None
+                self.unzipped += size
+                self._add_file(path, sha256, size)
+
+    def add_stream(self, read, name):
+        """
+        A raw request body (or any file-like 'read').
+        """
+        part_path = self.part_path()
+        try:
+            sha256, size = copy_hashed(read, part_path, self.max_bytes - self.received)
+        except UploadTooLarge:
+            raise UploadTooLarge(f"Upload is larger than {self.max_bytes} bytes") from None
+        self.receive(size)
+        self.add_part(part_path, name, sha256, size)
+
+    def content_hash(self):
+        return combined_hash(e["sha256"] for e in self.entries)
+
+    def series(self):
+        """
+        {SeriesInstanceUID: file count}
+        """
+        counts = {}
+        for entry in self.entries:
+            counts[entry["series_instance_uid"]] = counts.get(entry["series_instance_uid"], 0) + 1
+        return counts
+
+    def write_index(self):
+        return write_index(self.folder, self.entries, content_hash=self.content_hash())
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Django upload handler that hands every multipart file part to an
+    UploadIngest, writing and hashing it chunk by chunk.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, ingest, request=None):
+        super().__init__(request)
+        self.ingest = ingest
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.part_path = self.ingest.part_path()
+        self.part = open(self.part_path, "wb")
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.ingest.receive(len(raw_data))
+        except UploadTooLarge:
+            self.part.close()
+            raise
+        self.part.write(raw_data)
+        self.digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.part.close()
+        self.ingest.add_part(self.part_path, self.file_name, self.digest.hexdigest(), file_size)
+        return UploadedFile(name=self.file_name, size=file_size, content_type=self.content_type)
+
+    def upload_interrupted(self):
+        if getattr(self, "part", None) is not None and not self.part.closed:
+            self.part.close()
+            os.remove(self.part_path)
@@ -20,14 +20,15 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 
-from .views import signup, login, segment_images, get_scans, get_dicom_files, serve_dicom_file, wado_rs_frame, resegment_images, get_scan
-from .reconstruct_3d_view import reconstruct_3d_view
+from .views import signup, login, segment_images, get_scans, get_dicom_files, serve_dicom_file, wado_rs_frame, resegment_images, get_scan, threshold_stats, suggest_thresholds, bone_measurements, preview_slice, mpr_slice, upload_dicoms, export_segmentation, prometheus_metrics, list_profiles, download_profile
+from .reconstruct_3d_view import reconstruct_3d_view, list_bone_meshes
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("signup/", signup, name="signup"),
     path("login/", login, name="login"),
     path("segment-images/", segment_images, name="segment_images"),
+    path("upload-dicoms/", upload_dicoms, name="upload_dicoms"),
     path("get-scans/", get_scans, name="get_scans"),
     path('get-dicom-files/<int:seg_id>/', get_dicom_files, name='get_dicom_files'),
     path('dicoms/<int:seg_id>/<str:filename>/', serve_dicom_file, name='serve_dicom_file'),
@@ -41,6 +42,16 @@ urlpatterns = [
 
         path('reconstruct-3d/<int:segmentation_id>/', reconstruct_3d_view, name='reconstruct-3d'),
             path('get-scan/<int:segmentation_id>/', get_scan, name='get-scan'),
+    path('threshold-stats/<int:segmentation_id>/', threshold_stats, name='threshold-stats'),
+    path('suggest-thresholds/', suggest_thresholds, name='suggest-thresholds'),
+    path('measurements/<int:segmentation_id>/', bone_measurements, name='measurements'),
+    path('preview-slice/<int:segmentation_id>/', preview_slice, name='preview-slice'),
+    path('mpr/<int:segmentation_id>/', mpr_slice, name='mpr'),
+    path('bone-meshes/<int:segmentation_id>/', list_bone_meshes, name='bone-meshes'),
+    path('export/<int:segmentation_id>/', export_segmentation, name='export'),
+    path('metrics', prometheus_metrics, name='metrics'),
+    path('profiles/<int:segmentation_id>/', list_profiles, name='profiles'),
+    path('profile-artifact/<int:profile_id>/', download_profile, name='profile-artifact'),
 
 
 ]
@@ -1,48 +1,33 @@
 import json
 import datetime
 import os
-import pydicom
-import numpy as np
-import cv2
-import datetime
 import jwt as pyjwt
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.http import JsonResponse, FileResponse, Http404, HttpResponse
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from .models import UserProfile, SegmentationRecord
+from .models import UserProfile, SegmentationRecord, DicomUpload, ProfileArtifact
+from .profiling import can_profile, profiled
+from .scheduler import (BATCH, INTERACTIVE, OverBudget, SchedulerBusy, busy_response, over_budget_response,
+                        task)
 from django.utils import timezone
 from io import BytesIO
 import shutil
 
+# Imaging helpers live in .imaging (numpy/cv2/pydicom) and are imported inside
+# the views that need them, so auth and listing requests never load them.
+_IMAGING_EXPORTS = ("convert_to_hu", "segment_bone_hu", "hu_to_original_scale", "segment_folder")
 
-def convert_to_hu(dicom_data):
-    """
-    Convert DICOM pixel values to Hounsfield Units using RescaleSlope, RescaleIntercept.
-    """
-    image = dicom_data.pixel_array.astype(np.float64)
-    intercept = getattr(dicom_data, 'RescaleIntercept', 0.0)
-    slope = getattr(dicom_data, 'RescaleSlope', 1.0)
 
-    if slope != 1:
-        image *= slope
-    image += intercept
+def __getattr__(name):
+    # Keeps `views.convert_to_hu` & co. working without importing them eagerly.
+    if name in _IMAGING_EXPORTS:
+        from . import imaging
+        return getattr(imaging, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    return image.astype(np.int16)
 
-def segment_bone_hu(image_hu, lower_hu=300, upper_hu=2000):
-    """
-    1. Threshold HU into [lower_hu, upper_hu]
-    2. Morphological closing to remove small holes
-    3. Return segmented HU image
-    """
-    binary_mask = np.logical_and(image_hu >= lower_hu, image_hu <= upper_hu)
-    binary_mask = (binary_mask * 255).astype(np.uint8)
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (1, 1))
-    cleaned_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_CLOSE, kernel)
-    segmented_bone = image_hu * (cleaned_mask > 0)
-    return segmented_bone
 
 def decode_jwt_token(request):
     """
@@ -122,18 +107,27 @@ def login(request):
 
 
 @csrf_exempt
+@profiled
 def segment_images(request):
     """
     POST endpoint.
     Expects JSON (or multipart if needed) with:
     - folder_path (string): path to folder with DICOM files
-    - lower_threshold (int): e.g. 300
-    - upper_threshold (int): e.g. 2000
+      (or upload_id (int): a study sent to /upload-dicoms/ by this physician)
+    - lower_threshold (int): e.g. 300, or "auto"
+    - upper_threshold (int): e.g. 2000, or "auto"
+      ("auto" takes the value suggested from the series' HU histogram, see
+      auto_threshold.py and /suggest-thresholds/)
     - patient_email (string): the patient’s email
+    - roi (object, optional): sub-volume to segment, any of slice_start/slice_stop
+      (indices in InstanceNumber order), row_start/row_stop, col_start/col_stop
     Requires 'Authorization: Bearer <access_token>' header.
 
     Performs segmentation on all DICOMs in 'folder_path' and saves them
     in an output folder. Creates a SegmentationRecord in the DB.
+    Requests are admitted by their estimated peak memory (admission.py):
+    they wait while it does not fit the free budget and get a 413 when it
+    exceeds the whole budget. "memory" in the response reports the mode.
     """
     if request.method != "POST":
         return JsonResponse({"error": "POST method required"}, status=405)
@@ -151,37 +145,70 @@ def segment_images(request):
         return JsonResponse({"error": "User profile not found"}, status=404)
 
     # Parse input data
+    from .auto_threshold import AUTO, parse_threshold
     try:
         data = json.loads(request.body)
-        folder_path = data["folder_path"]
-        lower_threshold = int(data["lower_threshold"])
-        upper_threshold = int(data["upper_threshold"])
+        upload_id = int(data["upload_id"]) if "upload_id" in data else None
+        folder_path = data["folder_path"] if upload_id is None else None
+        lower_threshold = parse_threshold(data["lower_threshold"])
+        upper_threshold = parse_threshold(data["upper_threshold"])
         patient_email = data["patient_email"]
-    except (KeyError, json.JSONDecodeError, ValueError):
+    except (KeyError, json.JSONDecodeError, ValueError, TypeError):
         return JsonResponse({"error": "Missing or invalid fields"}, status=400)
 
+    from .roi import parse_roi
+    try:
+        roi = parse_roi(data.get("roi"))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid roi: {e}"}, status=400)
+
+    if upload_id is not None:
+        try:
+            folder_path = DicomUpload.objects.get(id=upload_id, physician=current_user).folder_path
+        except DicomUpload.DoesNotExist:
+            return JsonResponse({"error": "Upload not found"}, status=404)
+
     if not os.path.exists(folder_path):
         return JsonResponse({"error": f"Folder path does not exist: {folder_path}"}, status=400)
 
-    # Create an output folder (you can rename or restructure as needed)
-    timestamp_str = timezone.now().strftime("%Y%m%d_%H%M%S")
-    output_folder = f"{folder_path}_segmented_{timestamp_str}"
-    os.makedirs(output_folder, exist_ok=True)
-
-    # Iterate over all .dcm files and segment
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.dcm'):
-            dicom_filepath = os.path.join(folder_path, filename)
-            ds = pydicom.dcmread(dicom_filepath)
-
-            # Convert to HU and segment
-            image_hu = convert_to_hu(ds)
-            segmented_image = segment_bone_hu(image_hu, lower_hu=lower_threshold, upper_hu=upper_threshold)
-            segmented_raw = hu_to_original_scale(segmented_image, ds)
-            ds.PixelData = segmented_raw.tobytes()
-            # Save the new DICOM in the output folder
-            output_path = os.path.join(output_folder, filename)
-            ds.save_as(output_path)
+    # Admitted by estimated peak memory (admission.py); auto thresholds
+    # stream the series when its decoded volume does not fit.
+    from .admission import STREAMING, describe, segmentation_options
+    try:
+        memory = segmentation_options(folder_path, auto=AUTO in (lower_threshold, upper_threshold))
+    except (FileNotFoundError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    suggestion = None
+    from .volume_cache import cached_hu_volume, load_hu_volume
+    try:
+        with task(BATCH, current_user.id, memory=memory) as admitted:
+            hu_volume = None
+            if AUTO in (lower_threshold, upper_threshold):
+                from .auto_threshold import suggest_for_series
+                try:
+                    suggestion = suggest_for_series(folder_path, roi, streaming=admitted[0] == STREAMING)
+                except (FileNotFoundError, ValueError) as e:
+                    return JsonResponse({"error": f"Cannot suggest thresholds: {e}"}, status=400)
+                if lower_threshold == AUTO:
+                    lower_threshold = suggestion["lower_threshold"]
+                if upper_threshold == AUTO:
+                    upper_threshold = suggestion["upper_threshold"]
+                if admitted[0] != STREAMING:
+                    # Decoded into the volume cache by suggest_for_series.
+                    hu_volume = load_hu_volume(folder_path)
+
+            # Identical data + parameters resolve to the stored output (artifact_store.py)
+            from .artifact_store import segment_cached
+            output_folder, histogram_path, content_key, reused = segment_cached(
+                folder_path, lower_threshold, upper_threshold, roi=roi,
+                hu_volume=hu_volume or cached_hu_volume(folder_path))
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except OverBudget as e:
+        return over_budget_response(e)
+    except ValueError as e:
+        return JsonResponse({"error": f"Cannot segment series: {e}"}, status=400)
 
     # Create a SegmentationRecord
     seg_record = SegmentationRecord.objects.create(
@@ -190,22 +217,26 @@ def segment_images(request):
         folder_path=folder_path,
         output_folder_path=output_folder,
         lower_threshold=lower_threshold,
-        upper_threshold=upper_threshold
+        upper_threshold=upper_threshold,
+        histogram_path=histogram_path,
+        roi=roi,
+        content_key=content_key
     )
 
     return JsonResponse({
         "message": "Segmentation completed successfully",
         "output_folder": output_folder,
-        "segmentation_id": seg_record.id
+        "segmentation_id": seg_record.id,
+        "roi": roi,
+        "lower_threshold": lower_threshold,
+        "upper_threshold": upper_threshold,
+        "threshold_suggestion": suggestion,
+        "content_key": content_key,
+        "reused": reused,
+        "memory": describe(admitted)
     }, status=200)
 
 
-def hu_to_original_scale(segmented_hu, dicom_data):
-    slope = dicom_data.RescaleSlope
-    intercept = dicom_data.RescaleIntercept
-    pixel_original  = (segmented_hu - intercept) / slope
-    return pixel_original.astype(np.uint16) 
-
 ############################
 # Fetch Recent Scans
 ############################
@@ -234,6 +265,7 @@ def get_scans(request):
 
     # Fetch all segmentations for this physician
     segmentations = SegmentationRecord.objects.filter(physician=current_user).order_by('-created_at')
+    from .thumbnails import thumbnail_urls
 
     results = []
     for seg in segmentations:
@@ -246,6 +278,8 @@ def get_scans(request):
             "upper_threshold": seg.upper_threshold,
             "created_at": seg.created_at.isoformat(),
             "three_d_model_path": seg.three_d_model_path,  # NEW
+            "roi": seg.roi,
+            "thumbnails": thumbnail_urls(seg.output_folder_path, settings.MEDIA_ROOT, settings.MEDIA_URL),
         })
 
     return JsonResponse({"segmentations": results}, status=200)
@@ -343,6 +377,7 @@ def get_scan(request, segmentation_id):
     except SegmentationRecord.DoesNotExist:
         return JsonResponse({"error": "Scan not found"}, status=404)
 
+    from .thumbnails import thumbnail_urls
     scan_data = {
         "segmentation_id": scan.id,
         "patient_email": scan.patient_email,
@@ -351,6 +386,8 @@ def get_scan(request, segmentation_id):
         "upper_threshold": scan.upper_threshold,
         "lower_threshold": scan.lower_threshold,
         "three_d_model_path": scan.three_d_model_path,
+        "roi": scan.roi,
+        "thumbnails": thumbnail_urls(scan.output_folder_path, settings.MEDIA_ROOT, settings.MEDIA_URL),
     }
 
     return JsonResponse(scan_data, status=200)
@@ -385,6 +422,7 @@ def wado_rs_frame(request, seg_id, filename, frame_number):
     if not os.path.exists(dicom_path):
         raise Http404("DICOM file not found: " + filename)
 
+    import pydicom
     ds = pydicom.dcmread(dicom_path)
 
     # If single-frame or missing NumberOfFrames, just return the full file as is
@@ -398,7 +436,19 @@ def wado_rs_frame(request, seg_id, filename, frame_number):
     if frame_number < 1 or frame_number > total_frames:
         raise Http404(f"Requested frame {frame_number} out of range (1..{total_frames})")
 
-    pixel_array = ds.pixel_array  # This loads all frames. If large, watch out for memory usage
+    # Decoding loads all frames; the shared volume cache keeps one decoded
+    # copy for all workers while the study is being scrolled through.
+    from .shared_cache import cache_key, shared_volumes
+    shared = shared_volumes()
+    try:
+        with task(INTERACTIVE, current_user.id):
+            if shared is not None:
+                key = cache_key("frames", os.path.abspath(dicom_path), os.path.getmtime(dicom_path))
+                pixel_array, _ = shared.get_or_load(key, lambda: (ds.pixel_array, {}))
+            else:
+                pixel_array = ds.pixel_array
+    except SchedulerBusy as e:
+        return busy_response(e)
     selected_frame_data = pixel_array[frame_number - 1]  # zero-based index
 
     single_frame_ds = ds.copy()  # Make a copy so we don't mutate the original
@@ -415,12 +465,17 @@ def wado_rs_frame(request, seg_id, filename, frame_number):
     return HttpResponse(buffer, content_type="application/dicom")
 
 @csrf_exempt
+@profiled
 def resegment_images(request, segmentation_id):
     """
     Re-segment an existing scan (identified by segmentation_id) with new thresholds.
     - Will delete the old segmentation record and output folder, 
       then re-run segmentation and create a NEW record.
-    - Expects JSON body with "lower_threshold", "upper_threshold".
+    - Expects JSON body with "lower_threshold", "upper_threshold" (ints or
+      "auto", see segment_images) and optionally "roi" (see segment_images);
+      the old record's ROI is kept when "roi" is not given, "roi": null
+      segments the whole series.
+    - Admitted by estimated peak memory like segment_images.
     """
     if request.method != "POST":
         return JsonResponse({"error": "POST method required"}, status=405)
@@ -429,39 +484,72 @@ def resegment_images(request, segmentation_id):
         return JsonResponse({"error": error_msg}, status=401)
     if current_user.userprofile.role.lower() != "physician":
         return JsonResponse({"error": "Only physicians can perform segmentation."}, status=403)
+    from .auto_threshold import AUTO, parse_threshold
     try:
         data = json.loads(request.body)
-        lower_threshold = int(data["lower_threshold"])
-        upper_threshold = int(data["upper_threshold"])
-    except (KeyError, json.JSONDecodeError, ValueError):
+        lower_threshold = parse_threshold(data["lower_threshold"])
+        upper_threshold = parse_threshold(data["upper_threshold"])
+    except (KeyError, json.JSONDecodeError, ValueError, TypeError):
         return JsonResponse({"error": "Missing or invalid thresholds"}, status=400)
+    from .roi import parse_roi
+    try:
+        new_roi = parse_roi(data.get("roi"))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid roi: {e}"}, status=400)
     try:
         old_record = SegmentationRecord.objects.get(id=segmentation_id)
     except SegmentationRecord.DoesNotExist:
         return JsonResponse({"error": "Segmentation record not found"}, status=404)
 
     old_output_folder = old_record.output_folder_path
-    if os.path.exists(old_output_folder):
-        shutil.rmtree(old_output_folder) 
-
     folder_path = old_record.folder_path
     patient_email = old_record.patient_email
+    roi = new_roi if "roi" in data else old_record.roi
 
-    timestamp_str = timezone.now().strftime("%Y%m%d_%H%M%S")
-    new_output_folder = f"{folder_path}_segmented_{timestamp_str}"
-    os.makedirs(new_output_folder, exist_ok=True)
-
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.dcm'):
-            dicom_filepath = os.path.join(folder_path, filename)
-            ds = pydicom.dcmread(dicom_filepath)
-
-            image_hu = convert_to_hu(ds)
-            segmented_image = segment_bone_hu(image_hu, lower_hu=lower_threshold, upper_hu=upper_threshold)
-            ds.PixelData = segmented_image.astype(np.int16).tobytes()
-
-            output_path = os.path.join(new_output_folder, filename)
-            ds.save_as(output_path)
+    # Same region as before: the stored histograms already cover it.
+    from_histograms = (roi == old_record.roi and old_record.histogram_path
+                       and os.path.exists(old_record.histogram_path))
+    from .admission import STREAMING, describe, segmentation_options
+    try:
+        memory = segmentation_options(folder_path,
+                                      auto=AUTO in (lower_threshold, upper_threshold) and not from_histograms)
+    except (FileNotFoundError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    suggestion = None
+    from .artifact_store import remove_segmentation, segment_cached
+    from .volume_cache import cached_hu_volume, load_hu_volume
+    try:
+        with task(BATCH, current_user.id, memory=memory) as admitted:
+            hu_volume = None
+            if AUTO in (lower_threshold, upper_threshold):
+                from .auto_threshold import suggest_for_series, suggest_from_histogram_file
+                try:
+                    if from_histograms:
+                        suggestion = suggest_from_histogram_file(old_record.histogram_path)
+                    else:
+                        suggestion = suggest_for_series(folder_path, roi, streaming=admitted[0] == STREAMING)
+                except (FileNotFoundError, ValueError) as e:
+                    return JsonResponse({"error": f"Cannot suggest thresholds: {e}"}, status=400)
+                if lower_threshold == AUTO:
+                    lower_threshold = suggestion["lower_threshold"]
+                if upper_threshold == AUTO:
+                    upper_threshold = suggestion["upper_threshold"]
+                if not from_histograms and admitted[0] != STREAMING:
+                    # Decoded into the volume cache by suggest_for_series.
+                    hu_volume = load_hu_volume(folder_path)
+
+            # A study that was previewed or resegmented recently is still decoded
+            # in the shared volume cache.
+            new_output_folder, histogram_path, content_key, reused = segment_cached(
+                folder_path, lower_threshold, upper_threshold, roi=roi,
+                hu_volume=hu_volume or cached_hu_volume(folder_path))
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except OverBudget as e:
+        return over_budget_response(e)
+    except ValueError as e:
+        return JsonResponse({"error": f"Cannot segment series: {e}"}, status=400)
 
     new_record = SegmentationRecord.objects.create(
         physician=current_user,
@@ -469,12 +557,562 @@ def resegment_images(request, segmentation_id):
         folder_path=folder_path,
         output_folder_path=new_output_folder,
         lower_threshold=lower_threshold,
-        upper_threshold=upper_threshold
+        upper_threshold=upper_threshold,
+        histogram_path=histogram_path,
+        roi=roi,
+        content_key=content_key
     )
 
+    old_content_key = old_record.content_key
     old_record.delete()
 
+    # Stored outputs may be shared with other records: only the last one
+    # using a key removes it.
+    if old_output_folder and old_output_folder != new_output_folder and os.path.exists(old_output_folder):
+        if not old_content_key:
+            shutil.rmtree(old_output_folder)
+        elif not SegmentationRecord.objects.filter(content_key=old_content_key).exists():
+            remove_segmentation(old_output_folder)
+
     return JsonResponse({
         "message": "Re-segmentation completed successfully",
-        "new_segmentation_id": new_record.id
-    }, status=200)
\ No newline at end of file
+        "new_segmentation_id": new_record.id,
+        "lower_threshold": lower_threshold,
+        "upper_threshold": upper_threshold,
+        "threshold_suggestion": suggestion,
+        "content_key": content_key,
+        "reused": reused,
+        "memory": describe(admitted)
+    }, status=200)
+
+
+@csrf_exempt
+def threshold_stats(request, segmentation_id):
+    """
+    GET /threshold-stats/<segmentation_id>/?lower_threshold=300&upper_threshold=2000
+
+    Predicts voxel count, bone volume (mm³) and per-slice coverage for a
+    candidate threshold pair from the HU histograms stored at segmentation
+    time. No pixel data is read.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    try:
+        lower_threshold = int(request.GET["lower_threshold"])
+        upper_threshold = int(request.GET["upper_threshold"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Missing or invalid thresholds"}, status=400)
+
+    try:
+        seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation not found"}, status=404)
+
+    if not seg.histogram_path or not os.path.exists(seg.histogram_path):
+        return JsonResponse({"error": "Histograms not available for this segmentation"}, status=404)
+
+    from .histograms import predict_threshold_stats
+    stats = predict_threshold_stats(seg.histogram_path, lower_threshold, upper_threshold)
+    stats["segmentation_id"] = seg.id
+    return JsonResponse(stats, status=200)
+
+
+@csrf_exempt
+def suggest_thresholds(request):
+    """
+    GET /suggest-thresholds/?segmentation_id=<id>
+        /suggest-thresholds/?upload_id=<id>
+        /suggest-thresholds/?folder_path=<path>
+
+    Suggests lower/upper thresholds from the HU histogram (multi-Otsu, see
+    auto_threshold.py). For a segmentation the stored histograms are used
+    and no pixel data is read; the predicted voxel count and bone volume
+    are included. For an upload or folder the series is decoded into the
+    volume cache; a following /segment-images/ reuses it from the shared
+    cache (see shared_cache.py) when that is enabled.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    from .auto_threshold import suggest_for_series, suggest_from_histogram_file
+    try:
+        segmentation_id = int(request.GET["segmentation_id"]) if "segmentation_id" in request.GET else None
+        upload_id = int(request.GET["upload_id"]) if "upload_id" in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid segmentation_id or upload_id"}, status=400)
+
+    try:
+        if segmentation_id is not None:
+            try:
+                seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+            except SegmentationRecord.DoesNotExist:
+                return JsonResponse({"error": "Segmentation not found"}, status=404)
+            if not seg.histogram_path or not os.path.exists(seg.histogram_path):
+                return JsonResponse({"error": "Histograms not available for this segmentation"}, status=404)
+            from .histograms import predict_threshold_stats
+            suggestion = suggest_from_histogram_file(seg.histogram_path)
+            stats = predict_threshold_stats(seg.histogram_path, suggestion["lower_threshold"],
+                                            suggestion["upper_threshold"])
+            suggestion.update(segmentation_id=seg.id, voxel_count=stats["voxel_count"],
+                              bone_volume_mm3=stats["bone_volume_mm3"])
+            return JsonResponse(suggestion, status=200)
+
+        if upload_id is not None:
+            try:
+                folder_path = DicomUpload.objects.get(id=upload_id, physician=current_user).folder_path
+            except DicomUpload.DoesNotExist:
+                return JsonResponse({"error": "Upload not found"}, status=404)
+        elif "folder_path" in request.GET:
+            folder_path = request.GET["folder_path"]
+        else:
+            return JsonResponse({"error": "segmentation_id, upload_id or folder_path required"}, status=400)
+        if not os.path.isdir(folder_path):
+            return JsonResponse({"error": f"Folder path does not exist: {folder_path}"}, status=400)
+        with task(INTERACTIVE, current_user.id):
+            suggestion = suggest_for_series(folder_path)
+        return JsonResponse(suggestion, status=200)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except (FileNotFoundError, ValueError) as e:
+        return JsonResponse({"error": f"Cannot suggest thresholds: {e}"}, status=400)
+
+
+@csrf_exempt
+def bone_measurements(request, segmentation_id):
+    """
+    GET /measurements/<segmentation_id>/?per_bone=true&separate_touching=false
+        &split_distance=10&min_bone_voxels=500&closing_radius=...&opening_radius=...
+        &fill_holes=true&min_speck_voxels=...
+
+    Volume, surface area, centroid, principal axes, bounding box and
+    per-slice area of the segmented bone, computed from the voxel mask
+    without meshing (see measurements.py). With per_bone (default: on when
+    the record has a per-bone reconstruction) the same measurements are
+    returned for every bone, cleaned and labeled as in per-bone
+    reconstruction with the same options and defaults.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    try:
+        seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation not found"}, status=404)
+
+    if not seg.output_folder_path or not os.path.isdir(seg.output_folder_path):
+        return JsonResponse({"error": "Output folder does not exist on server"}, status=404)
+
+    from .measurements import measure_segmentation
+    from .reconstruction import LABEL_OPTIONS, parse_bone_options, parse_flag, parse_mesh_options
+
+    try:
+        bone_options = None
+        if parse_flag(request.GET, "per_bone", seg.bone_meshes.exists()):
+            options = {**parse_mesh_options(request.GET)[1], **parse_bone_options(request.GET)}
+            bone_options = {name: options[name] for name in LABEL_OPTIONS}
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid options: {e}"}, status=400)
+
+    try:
+        with task(INTERACTIVE, current_user.id):
+            result = measure_segmentation(seg.output_folder_path, bone_options)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except FileNotFoundError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    return JsonResponse({"segmentation_id": seg.id, **result}, status=200)
+
+
+@csrf_exempt
+def preview_slice(request, segmentation_id):
+    """
+    GET /preview-slice/<segmentation_id>/?slice_index=30&lower_threshold=300&upper_threshold=2000
+    Optional: window_center, window_width (display window in HU).
+
+    Returns a PNG of one source slice with the voxels inside the threshold
+    range overlaid. Served from the cached HU volume of the record's source
+    series, or from its chunked copy (only the chunks of that slice are
+    read), so nothing is written per request.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    from .artifact_store import source_volume_of
+    from .preview import render_threshold_preview, PREVIEW_WINDOW_CENTER, PREVIEW_WINDOW_WIDTH
+    from .volume_cache import open_volume
+
+    try:
+        slice_index = int(request.GET["slice_index"])
+        lower_threshold = int(request.GET["lower_threshold"])
+        upper_threshold = int(request.GET["upper_threshold"])
+        window_center = float(request.GET.get("window_center", PREVIEW_WINDOW_CENTER))
+        window_width = float(request.GET.get("window_width", PREVIEW_WINDOW_WIDTH))
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Missing or invalid fields"}, status=400)
+
+    try:
+        seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation not found"}, status=404)
+
+    if not os.path.isdir(seg.folder_path):
+        return JsonResponse({"error": f"Folder path does not exist: {seg.folder_path}"}, status=404)
+
+    chunks_path = source_volume_of(seg.output_folder_path) if seg.output_folder_path else None
+    try:
+        with task(INTERACTIVE, current_user.id):
+            volume, _ = open_volume(seg.folder_path, chunks_path=chunks_path)
+            if slice_index < 0 or slice_index >= volume.shape[0]:
+                return JsonResponse({"error": f"slice_index out of range (0..{volume.shape[0] - 1})"},
+                                    status=400)
+            png = render_threshold_preview(volume[slice_index], lower_threshold, upper_threshold,
+                                           window_center=window_center, window_width=window_width)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except FileNotFoundError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    response = HttpResponse(png, content_type="image/png")
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@csrf_exempt
+def mpr_slice(request, segmentation_id):
+    """
+    GET /mpr/<segmentation_id>/?plane=coronal&index=256
+    GET /mpr/<segmentation_id>/?plane=oblique&normal=1,1,0&center=120,80,90
+    Optional: source=segmented|source (default segmented), window_center,
+    window_width, size (longest side in pixels).
+
+    Returns a PNG of an axial, coronal, sagittal or oblique plane resampled
+    with square pixels (see mpr.py). 'index' is the slice, row or column
+    for the orthogonal planes; 'center' (default: volume center) and
+    'normal' are (z, y, x) in mm for oblique ones. The plane geometry is in
+    the X-Pixel-Spacing and X-MPR-* headers.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    from .mpr import PLANES, orthogonal_plane, reformat, volume_center
+    from .preview import PREVIEW_WINDOW_CENTER, PREVIEW_WINDOW_WIDTH, encode_png, window_gray
+    from .artifact_store import source_volume_of
+    from .volume_cache import open_volume
+
+    plane = request.GET.get("plane", "").lower()
+    source = request.GET.get("source", "segmented").lower()
+    if plane not in PLANES:
+        return JsonResponse({"error": f"plane must be one of {list(PLANES)}"}, status=400)
+    if source not in ("segmented", "source"):
+        return JsonResponse({"error": "source must be 'segmented' or 'source'"}, status=400)
+
+    def vector(name):
+        values = [float(v) for v in request.GET[name].split(",")]
+        if len(values) != 3:
+            raise ValueError(name)
+        return values
+
+    try:
+        window_center = float(request.GET.get("window_center", PREVIEW_WINDOW_CENTER))
+        window_width = float(request.GET.get("window_width", PREVIEW_WINDOW_WIDTH))
+        size = int(request.GET["size"]) if "size" in request.GET else None
+        index = int(request.GET["index"]) if plane != "oblique" else None
+        normal = vector("normal") if plane == "oblique" else None
+        center = vector("center") if plane == "oblique" and "center" in request.GET else None
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Missing or invalid fields"}, status=400)
+    if size is not None and size < 2:
+        return JsonResponse({"error": "size must be at least 2"}, status=400)
+
+    try:
+        seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation not found"}, status=404)
+
+    folder = seg.output_folder_path if source == "segmented" else seg.folder_path
+    if not folder or not os.path.isdir(folder):
+        return JsonResponse({"error": f"Folder path does not exist: {folder}"}, status=404)
+
+    chunks_path = None
+    if source == "source" and seg.output_folder_path:
+        chunks_path = source_volume_of(seg.output_folder_path)
+    try:
+        with task(INTERACTIVE, current_user.id):
+            volume, spacing = open_volume(folder, chunks_path=chunks_path)
+            if plane == "oblique":
+                center = center if center is not None else volume_center(volume.shape, spacing)
+            else:
+                center, normal = orthogonal_plane(plane, index, volume.shape, spacing)
+            # Outside the volume: air for the source, background for the segmentation.
+            fill = -1024 if source == "source" else 0
+            image, geometry = reformat(volume, spacing, center, normal, size=size, fill=fill)
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except FileNotFoundError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = HttpResponse(encode_png(window_gray(image, window_center, window_width)), content_type="image/png")
+    response["Cache-Control"] = "no-store"
+    response["X-Pixel-Spacing"] = "\\".join(f"{v:.6g}" for v in geometry["pixel_spacing_mm"])
+    for key, header in (("origin_mm", "X-MPR-Origin"), ("row_direction", "X-MPR-Row-Direction"),
+                        ("column_direction", "X-MPR-Column-Direction")):
+        response[header] = ",".join(f"{v:.6g}" for v in geometry[key])
+    return response
+
+
+@csrf_exempt
+def upload_dicoms(request):
+    """
+    POST /upload-dicoms/
+    Body: multipart/form-data with one or more DICOM and/or ZIP file parts,
+    or a raw ZIP body (Content-Type: application/zip).
+
+    Streams the study to MEDIA_ROOT/uploads/<id>/ without buffering it in
+    memory, hashing every file and indexing its header as it arrives (see
+    uploads.py). Returns the upload_id to pass to /segment-images/, or a 413
+    over the UPLOAD_* limits.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can upload studies."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    from django.http.multipartparser import MultiPartParserError
+    from .uploads import UPLOADS_SUBDIR, ZIP_CONTENT_TYPES, StreamingUploadHandler, UploadIngest, UploadTooLarge
+
+    timestamp_str = timezone.now().strftime("%Y%m%d_%H%M%S_%f")
+    folder_path = os.path.join(settings.MEDIA_ROOT, UPLOADS_SUBDIR, f"{current_user.id}_{timestamp_str}")
+    os.makedirs(folder_path)
+    ingest = UploadIngest(folder_path)
+
+    content_type = request.content_type or ""
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if content_length > ingest.max_bytes:
+            raise UploadTooLarge(f"Upload is larger than {ingest.max_bytes} bytes")
+        if content_type == "multipart/form-data":
+            request.upload_handlers = [StreamingUploadHandler(ingest, request)]
+            request.FILES  # parses the body, feeding every file part to the handler
+        elif content_type in ZIP_CONTENT_TYPES:
+            ingest.add_stream(request.read, "upload.zip")
+        else:
+            shutil.rmtree(folder_path)
+            return JsonResponse({"error": "Expected multipart/form-data or application/zip"}, status=415)
+    except UploadTooLarge as e:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        return JsonResponse({"error": str(e)}, status=413)
+    except (MultiPartParserError, OSError, ValueError) as e:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        return JsonResponse({"error": f"Upload failed: {e}"}, status=400)
+
+    if not ingest.entries:
+        shutil.rmtree(folder_path)
+        return JsonResponse({"error": "No DICOM files in upload"}, status=400)
+
+    ingest.write_index()
+    # Identical files of earlier uploads are stored once (artifact_store.py).
+    from .artifact_store import dedupe_files
+    dedupe_files(folder_path, {entry["filename"]: entry["sha256"] for entry in ingest.entries})
+    upload = DicomUpload.objects.create(
+        physician=current_user,
+        folder_path=folder_path,
+        file_count=len(ingest.entries),
+        total_bytes=ingest.total_bytes,
+        content_hash=ingest.content_hash(),
+    )
+
+    return JsonResponse({
+        "message": "Upload completed",
+        "upload_id": upload.id,
+        "folder_path": folder_path,
+        "file_count": upload.file_count,
+        "skipped_files": ingest.skipped,
+        "total_bytes": upload.total_bytes,
+        "content_hash": upload.content_hash,
+        "series": ingest.series(),
+    }, status=201)
+
+
+@csrf_exempt
+def export_segmentation(request, segmentation_id):
+    """
+    GET /export/<segmentation_id>/?compression=deflate
+
+    Streams a ZIP of the segmented series (dicom/), its STL and any per-bone
+    STLs (bones/). The archive is built while it is sent (see export.py):
+    no temporary file, constant memory. compression is "deflate" (default)
+    or "stored".
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+
+    try:
+        if current_user.userprofile.role.lower() != "physician":
+            return JsonResponse({"error": "Only physicians can view scans."}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"error": "User profile not found"}, status=404)
+
+    from .export import COMPRESSION, DEFAULT_COMPRESSION, segmentation_entries, stream_zip
+    compression = request.GET.get("compression", DEFAULT_COMPRESSION)
+    if compression not in COMPRESSION:
+        return JsonResponse({"error": f"compression must be one of {list(COMPRESSION)}"}, status=400)
+
+    try:
+        seg = SegmentationRecord.objects.get(id=segmentation_id, physician=current_user)
+    except SegmentationRecord.DoesNotExist:
+        return JsonResponse({"error": "Segmentation not found"}, status=404)
+
+    if not seg.output_folder_path or not os.path.isdir(seg.output_folder_path):
+        return JsonResponse({"error": "Output folder does not exist on server"}, status=404)
+
+    entries = segmentation_entries(seg, settings.MEDIA_ROOT, settings.MEDIA_URL)
+    response = StreamingHttpResponse(stream_zip(entries, compression), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="segmentation_{seg.id}.zip"'
+    return response
+
+
+def _profile_data(artifact):
+    return {
+        "profile_id": artifact.id,
+        "view": artifact.view,
+        "segmentation_id": artifact.segmentation_id,
+        "status_code": artifact.status_code,
+        "wall_time_s": artifact.wall_time_s,
+        "peak_memory_bytes": artifact.peak_memory_bytes,
+        "sampled": artifact.sampled,
+        "created_at": artifact.created_at.isoformat(),
+    }
+
+
+def _visible_profiles(user):
+    """
+    Admins see every profile, physicians those of their own requests and
+    segmentations.
+    """
+    if user.is_staff or user.is_superuser:
+        return ProfileArtifact.objects.all()
+    return ProfileArtifact.objects.filter(user=user) | ProfileArtifact.objects.filter(segmentation__physician=user)
+
+
+@csrf_exempt
+def list_profiles(request, segmentation_id):
+    """
+    GET /profiles/<segmentation_id>/
+    Profiles recorded for a segmentation (see profiling.py), newest first.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+    if not can_profile(current_user):
+        return JsonResponse({"error": "Only physicians and admins can view profiles."}, status=403)
+
+    profiles = _visible_profiles(current_user).filter(segmentation_id=segmentation_id)
+    return JsonResponse({
+        "segmentation_id": segmentation_id,
+        "profiles": [_profile_data(artifact) for artifact in profiles],
+    }, status=200)
+
+
+@csrf_exempt
+def download_profile(request, profile_id):
+    """
+    GET /profile-artifact/<profile_id>/
+    The profile's ZIP: profile.prof (cProfile stats) and summary.json.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    current_user, error_msg = decode_jwt_token(request)
+    if current_user is None:
+        return JsonResponse({"error": error_msg}, status=401)
+    if not can_profile(current_user):
+        return JsonResponse({"error": "Only physicians and admins can view profiles."}, status=403)
+
+    artifact = _visible_profiles(current_user).filter(id=profile_id).first()
+    if artifact is None:
+        return JsonResponse({"error": "Profile not found"}, status=404)
+    if not os.path.exists(artifact.path):
+        return JsonResponse({"error": "Profile file does not exist on server"}, status=404)
+
+    return FileResponse(open(artifact.path, "rb"), as_attachment=True,
+                        filename=os.path.basename(artifact.path), content_type="application/zip")
+
+
+def prometheus_metrics(request):
+    """
+    GET /metrics
+    Pipeline stage timings, I/O bytes, cache hits and per-view request
+    metrics of this process, in Prometheus text format (see metrics.py).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=405)
+
+    from .metrics import render
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,106 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pydicom
+
+from . import metrics
+from .chunked_volume import VOLUME_CHUNKS_DIRNAME, open_chunked_volume
+from .histograms import get_voxel_spacing
+from .imaging import check_slice_shape, convert_to_hu, list_series_files
+from .scheduler import checkpoint
+from .shared_cache import cache_key, shared_volumes
+
+# Number of decoded HU volumes kept per process when the shared cache is off.
+HU_VOLUME_CACHE_SIZE = 4
+
+
+def _decode_hu_volume(folder_path):
+    slice_files = list_series_files(folder_path)
+    if not slice_files:
+        raise FileNotFoundError(f"No DICOM files found in {folder_path}")
+
+    volume = None
+    spacing = (1.0, 1.0, 1.0)
+    with metrics.stage("volume_load"):
+        for i, filename in enumerate(slice_files):
+            checkpoint()
+            path = os.path.join(folder_path, filename)
+            ds = pydicom.dcmread(path)
+            metrics.add_bytes("read", "dicom", os.path.getsize(path))
+            image_hu = convert_to_hu(ds)
+            check_slice_shape(filename, image_hu.shape, None if volume is None else volume.shape[1:])
+            if volume is None:
+                volume = np.empty((len(slice_files),) + image_hu.shape, dtype=np.int16)
+                spacing = get_voxel_spacing(ds)
+            volume[i] = image_hu
+    volume.flags.writeable = False
+    return volume, slice_files, spacing
+
+
+@lru_cache(maxsize=HU_VOLUME_CACHE_SIZE)
+def _load_hu_volume(folder_path, mtime):
+    return _decode_hu_volume(folder_path)
+
+
+def _shared_hu_volume(shared, folder_path, mtime):
+    def load():
+        volume, slice_files, spacing = _decode_hu_volume(folder_path)
+        return volume, {"slice_files": slice_files, "spacing": list(spacing)}
+
+    volume, meta = shared.get_or_load(cache_key("hu_volume", folder_path, mtime), load)
+    return volume, meta["slice_files"], tuple(meta["spacing"])
+
+
+def load_hu_volume(folder_path, process_cache=True):
+    """
+    Loads a series as a read-only int16 HU volume (slices, rows, cols).
+    Cached and invalidated when the folder changes: in the cache shared by
+    all workers (see shared_cache.py) when it is enabled, else per process
+    unless 'process_cache' is False.
+    Returns (volume, slice_files, spacing).
+    """
+    folder_path = os.path.abspath(folder_path)
+    mtime = os.path.getmtime(folder_path)
+    shared = shared_volumes()
+    if shared is not None:
+        return _shared_hu_volume(shared, folder_path, mtime)
+    if not process_cache:
+        return _decode_hu_volume(folder_path)
+    return _load_hu_volume(folder_path, mtime)
+
+
+def cached_hu_volume(folder_path):
+    """
+    (volume, slice_files, spacing) if the series is already in the shared
+    cache, else None. Never reads the series.
+    """
+    shared = shared_volumes()
+    if shared is None:
+        return None
+    folder_path = os.path.abspath(folder_path)
+    found = shared.peek(cache_key("hu_volume", folder_path, os.path.getmtime(folder_path)))
+    if found is None:
+        return None
+    volume, meta = found
+    return volume, meta["slice_files"], tuple(meta["spacing"])
+
+
+def open_volume(folder_path, chunks_path=None):
+    """
+    The HU volume of a series for reading a plane or a box of it: the
+    shared cache's copy when the series is already there, else its chunked
+    copy ('chunks_path', by default <folder>/volume.chunks; see
+    chunked_volume.py), which decodes only the chunks read, else the whole
+    series from load_hu_volume().
+    Returns (volume, spacing); 'volume' is an array or a ChunkedVolume,
+    indexed the same way.
+    """
+    cached = cached_hu_volume(folder_path)
+    if cached is not None:
+        return cached[0], cached[2]
+    chunked = open_chunked_volume(chunks_path or os.path.join(folder_path, VOLUME_CHUNKS_DIRNAME))
+    if chunked is not None:
+        return chunked, chunked.spacing
+    volume, _, spacing = load_hu_volume(folder_path)
+    return volume, spacing
@@ -11,7 +11,6 @@ import os
 import pydicom
 import numpy as np
 from skimage.measure import marching_cubes
-import matplotlib.pyplot as plt
 from scipy.ndimage import binary_closing, gaussian_filter
 
 
@@ -44,17 +43,19 @@ def load_segmented_slices(folder_path):
     return datasets
 
 
-def reconstruct_3d(folder_path, iso_level=0.5, save_stl=None):
+def reconstruct_3d(folder_path, iso_level=0.5, save_stl=None, show=False):
     """
     1) Reads your 'segmented' DICOM slices (where outside bone=0, inside bone>0).
     2) Binarizes them to {0,1}.
     3) Applies marching cubes to get a 3D mesh.
     4) (Optional) Saves to STL if 'save_stl' is provided.
+    5) (Optional) Opens the trimesh viewer if 'show' is True (blocks until closed).
+    Returns (number of vertices, number of faces).
     """
     datasets = load_segmented_slices(folder_path)
     if not datasets:
         print("No datasets found.")
-        return
+        return 0, 0
 
     # Gather volume shape
     first_ds = datasets[0]
@@ -96,14 +97,17 @@ def reconstruct_3d(folder_path, iso_level=0.5, save_stl=None):
         mesh = trimesh.Trimesh(vertices=verts, faces=faces, vertex_normals=norms)
         filter_taubin(mesh, lamb=0.3, nu=-0.32, iterations=3)
         mesh.export(save_stl)
-        mesh.show()
+        if show:
+            mesh.show()
         print(f"Saved STL: {save_stl}")
     elif save_stl:
         print("Install trimesh if you want STL export.")
 
+    return len(verts), len(faces)
+
 def main():
     segmented_folder = "Ankle_Segmented"  # your segmented output
-    reconstruct_3d(segmented_folder, iso_level=0.5, save_stl="my_bone_model.stl")
+    reconstruct_3d(segmented_folder, iso_level=0.5, save_stl="my_bone_model.stl", show=True)
 
 if __name__ == "__main__":
     main()
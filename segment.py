@@ -8,7 +8,6 @@ Created on Fri Jan 17 07:59:05 2025
 import pydicom
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
 
 def convert_to_hu(dicom_data):
     image = dicom_data.pixel_array.astype(np.float64)
@@ -38,6 +37,8 @@ def load_dicom(filepath):
     return image_hu
 
 def main():
+    import matplotlib.pyplot as plt
+
     filepath = "DICOM_IMAGES/Ankle/VHFCT1mm-Ankle (30).dcm"  # Update with your DICOM file path
     dicom_image_hu = load_dicom(filepath)
     bone_image = segment_bone_hu(dicom_image_hu)
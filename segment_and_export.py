@@ -1,9 +1,23 @@
 import os
+import importlib.util
 import pydicom
 import numpy as np
 import cv2
 import uuid
-import matplotlib.pyplot as plt
+
+# Shared series writer from the server package (pydicom only, no Django).
+DICOM_WRITER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "bone-segmentation-server", "boneServer", "boneServer", "dicom_writer.py")
+
+def load_series_writer():
+    """
+    SeriesWriter from the server's dicom_writer.py, loaded from its file so
+    importing this module leaves sys.path alone.
+    """
+    spec = importlib.util.spec_from_file_location("dicom_writer", DICOM_WRITER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.SeriesWriter
 
 def convert_to_hu(dicom_data):
     """
@@ -13,9 +27,7 @@ def convert_to_hu(dicom_data):
     image = dicom_data.pixel_array.astype(np.float64)
     intercept = dicom_data.RescaleIntercept
     slope = dicom_data.RescaleSlope
-    print("Slope", slope)
-    print("Intercept", intercept)
-    
+
     if slope != 1:
         image = slope * image
     image += intercept
@@ -50,12 +62,38 @@ def hu_to_original_scale(segmented_hu, dicom_data):
 
     return pixel_original.astype(np.int16)
 
+def show_slice_preview(hu_image, segmented_hu, bone_mask):
+    """
+    Shows original HU, segmented HU and mask side by side (blocks until closed).
+    matplotlib is only imported here so headless runs never load it.
+    """
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(15,5))
+    plt.subplot(1,3,1)
+    plt.title("Original HU")
+    plt.imshow(hu_image, cmap='gray')
+    plt.axis('off')
+
+    plt.subplot(1,3,2)
+    plt.title("Segmented HU")
+    plt.imshow(segmented_hu, cmap='gray')
+    plt.axis('off')
+
+    plt.subplot(1,3,3)
+    plt.title("Binary Mask")
+    plt.imshow(bone_mask, cmap='gray')
+    plt.axis('off')
+    plt.show()
+
 def process_and_save_slices(input_folder, output_folder,
-                            lower_hu, upper_hu):
+                            lower_hu, upper_hu, preview_index=None):
     """
     1. Load all DICOM files from `input_folder`.
     2. Segment bones by HU threshold.
     3. Save to `output_folder` with updated pixel data.
+    4. (Optional) Show the slice at `preview_index` with matplotlib.
+    Returns (number of slices, number of voxels) written.
     """
     os.makedirs(output_folder, exist_ok=True)
     dicom_files = [
@@ -70,6 +108,8 @@ def process_and_save_slices(input_folder, output_folder,
     dicom_files.sort(key=get_instance_number)
 
     new_series_uid = pydicom.uid.generate_uid()
+    num_voxels = 0
+    writer = load_series_writer()()
 
     for i, dcm_path in enumerate(dicom_files):
         ds = pydicom.dcmread(dcm_path)
@@ -80,25 +120,11 @@ def process_and_save_slices(input_folder, output_folder,
                                                   lower_hu=lower_hu,
                                                   upper_hu=upper_hu)
 
-        if i == 30:
-            plt.figure(figsize=(15,5))
-            plt.subplot(1,3,1)
-            plt.title("Original HU")
-            plt.imshow(hu_image, cmap='gray')
-            plt.axis('off')
-            
-            plt.subplot(1,3,2)
-            plt.title("Segmented HU")
-            plt.imshow(segmented_hu, cmap='gray')
-            plt.axis('off')
-
-            plt.subplot(1,3,3)
-            plt.title("Binary Mask")
-            plt.imshow(bone_mask, cmap='gray')
-            plt.axis('off')
-            plt.show()
+        if i == preview_index:
+            show_slice_preview(hu_image, segmented_hu, bone_mask)
 
         segmented_raw = hu_to_original_scale(segmented_hu, ds)
+        num_voxels += segmented_raw.size
 
         ds.PixelData = segmented_raw.tobytes()
 
@@ -113,9 +139,10 @@ def process_and_save_slices(input_folder, output_folder,
             ds.ImageType = "\\".join(new_image_type)
 
         output_filename = os.path.join(output_folder, f"segmented_{i+1:03d}.dcm")
-        ds.save_as(output_filename)
+        writer.write(ds, output_filename)
 
     print(f"All segmented slices saved to: {output_folder}")
+    return len(dicom_files), num_voxels
 
 def main():
     input_folder = "DICOM_IMAGES/CBCT_36_MALE"
@@ -125,7 +152,8 @@ def main():
         input_folder, 
         output_folder,
         lower_hu=150,
-        upper_hu=5000
+        upper_hu=5000,
+        preview_index=30
     )
 
 if __name__ == "__main__":
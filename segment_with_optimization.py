@@ -8,7 +8,6 @@ Created on Fri Jan 17 07:59:05 2025
 import pydicom
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
 
 def convert_to_hu(dicom_data):
     """
@@ -50,6 +49,8 @@ def load_dicom(filepath):
     return image_hu
 
 def main():
+    import matplotlib.pyplot as plt
+
     filepath = "DICOM_IMAGES/Ankle/VHFCT1mm-Ankle (30).dcm"
     dicom_image_hu = load_dicom(filepath)
     bone_image, bone_mask = segment_bone_hu(dicom_image_hu, lower_hu=200, upper_hu=2000)